@@ -0,0 +1,64 @@
+# Simulación de escrituras en events_* para un sensor ruidoso alrededor del umbral
+# (sin Redis ni MySQL).
+#   cd /opt/auralis-rule-engine && venv/bin/python -m src.bench_hysteresis --noise 2 --hysteresis 3 --persistence 30
+#
+# Compara el conteo de INSERT/UPDATE de resolución (aperturas y cierres) de la regla sin
+# estabilidad contra la misma regla con histéresis y persistencia, usando incident_state.
+
+import argparse
+import math
+import random
+
+from .incident_state import transition
+from .rule_compiler import compile_rules
+
+
+def compile_rule(hysteresis, persistence):
+    sensors = {1: {'id': 1, 'name': 's1', 'min_value': 0, 'max_value': 100}}
+    policies_by_id = {1: {'id': 1, 'alert_mode': 'ABS', 'alert_high': 80.0, 'warn_high': 70.0,
+                          'hysteresis': hysteresis, 'persistence_seconds': persistence}}
+    rules = {1: {'id': 1, 'name': 'alta', 'severity': 'CRITICAL'}}
+    nodes = [{'id': 1, 'rule_id': 1, 'parent_id': None, 'node_type': 'COND', 'logical_operator': None,
+              'condition_id': 1, 'condition_name': 'c1', 'source_sensor_id': 1, 'metric_to_evaluate': 'VALUE',
+              'threshold_type': 'POLICY', 'operator': '>', 'threshold_config': None, 'linked_policy_id': 1}]
+    return compile_rules(rules, nodes, sensors, policies_by_id)[1]
+
+
+def readings(n, period, noise, seed=1):
+    """Una lectura por segundo: oscilación lenta que cruza el umbral 80 más ruido gaussiano."""
+    rnd = random.Random(seed)
+    for t in range(n):
+        yield float(t), 80.0 + 6.0 * math.sin(2 * math.pi * t / period) + rnd.gauss(0.0, noise)
+
+
+def simulate(rule, samples):
+    counts = {'CREATE': 0, 'UPDATE': 0, 'RESOLVE': 0}
+    incident = None
+    for ts, value in samples:
+        incident, action = transition(incident, rule, {1: value}, ts)
+        if action:
+            counts[action] += 1
+            if action == 'CREATE':
+                incident['status'] = 'FIRING'
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escrituras de eventos con y sin histéresis/persistencia")
+    parser.add_argument('--readings', type=int, default=86400)
+    parser.add_argument('--period', type=int, default=3600)
+    parser.add_argument('--noise', type=float, default=2.0)
+    parser.add_argument('--hysteresis', type=float, default=3.0)
+    parser.add_argument('--persistence', type=int, default=30)
+    args = parser.parse_args()
+
+    samples = list(readings(args.readings, args.period, args.noise))
+    for label, rule in (("sin estabilidad", compile_rule(None, None)),
+                        (f"h={args.hysteresis:g} p={args.persistence}s", compile_rule(args.hysteresis, args.persistence))):
+        c = simulate(rule, samples)
+        print(f"{label:>18} | aperturas {c['CREATE']:6} | cierres {c['RESOLVE']:6} | "
+              f"UPDATE {c['UPDATE']:6} | INSERT+cierre {c['CREATE'] + c['RESOLVE']:6}")
+
+
+if __name__ == '__main__':
+    main()
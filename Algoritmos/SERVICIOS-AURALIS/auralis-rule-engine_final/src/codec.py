@@ -0,0 +1,50 @@
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:  # opcional: solo con QUEUE_CODEC=msgpack
+    msgpack = None
+
+# Codificación de los mensajes de la cola de reglas (TopicManager/subscriber -> RuleWorker).
+# El worker detecta el formato por el primer byte, así productores con distintos
+# QUEUE_CODEC pueden convivir en la misma cola durante un despliegue.
+#   json    : {"sensor_id": ..., "value": ..., "topic": ..., "timestamp": ...}  (primer byte '{')
+#   msgpack : [sensor_id, value, timestamp, topic]                              (0x94, fixarray de 4)
+#   struct  : '<BIdd' = 0xE1, sensor_id, value, timestamp (21 bytes, sin tópico)
+PACKED = struct.Struct('<BIdd')
+PACKED_MAGIC = 0xE1
+MSGPACK_ARRAY4 = 0x94
+
+CODECS = ('json', 'msgpack', 'struct')
+
+
+def get_encoder(name):
+    """Devuelve encode(sensor_id, value, timestamp, topic) -> str | bytes."""
+    name = (name or 'json').lower()
+    if name == 'struct':
+        return lambda sensor_id, value, ts, topic: PACKED.pack(PACKED_MAGIC, sensor_id, value, ts)
+    if name == 'msgpack':
+        if msgpack is None:
+            raise RuntimeError("QUEUE_CODEC=msgpack requiere el paquete 'msgpack' (pip install msgpack)")
+        return lambda sensor_id, value, ts, topic: msgpack.packb([sensor_id, value, ts, topic])
+    if name != 'json':
+        raise ValueError(f"QUEUE_CODEC desconocido: '{name}'. Opciones: {', '.join(CODECS)}")
+    return lambda sensor_id, value, ts, topic: json.dumps(
+        {'sensor_id': sensor_id, 'value': value, 'topic': topic, 'timestamp': ts})
+
+
+def decode(data):
+    """Mensaje de la cola (str o bytes, cualquier codec) -> dict con sensor_id, value, timestamp, topic."""
+    if isinstance(data, str):
+        return json.loads(data)
+    first = data[0] if data else None
+    if first == PACKED_MAGIC and len(data) == PACKED.size:
+        _, sensor_id, value, ts = PACKED.unpack(data)
+        return {'sensor_id': sensor_id, 'value': value, 'timestamp': ts, 'topic': None}
+    if first == MSGPACK_ARRAY4:
+        if msgpack is None:
+            raise ValueError("Mensaje msgpack en la cola pero el paquete 'msgpack' no está instalado")
+        sensor_id, value, ts, topic = msgpack.unpackb(data)
+        return {'sensor_id': sensor_id, 'value': value, 'timestamp': ts, 'topic': topic}
+    return json.loads(data)
@@ -9,6 +9,11 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 DB_PORT = int(os.getenv('DB_PORT', 3306))
+# Pool de conexiones compartido por la sincronización y la escritura de eventos
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
 
 MQTT_BROKER_HOST = os.getenv('MQTT_BROKER_HOST')
 MQTT_BROKER_PORT = int(os.getenv('MQTT_BROKER_PORT', 1883))
@@ -21,8 +26,57 @@ REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 REDIS_DB = int(os.getenv('REDIS_DB', 0))
 REDIS_QUEUE_NAME = 'auralis_rule_engine_queue'
+# Encolado por lotes desde TopicManager: pipeline con LPUSH multi-valor por tamaño o tiempo
+ENQUEUE_BATCH_SIZE = max(1, int(os.getenv('ENQUEUE_BATCH_SIZE', 500)))
+ENQUEUE_FLUSH_MS = max(1, int(os.getenv('ENQUEUE_FLUSH_MS', 50)))
+ENQUEUE_MAX_BUFFER = int(os.getenv('ENQUEUE_MAX_BUFFER', 100000))
+# Codificación de los mensajes de la cola: json | msgpack | struct (el worker acepta los tres)
+QUEUE_CODEC = os.getenv('QUEUE_CODEC', 'json').lower()
+QUEUE_STATS_INTERVAL = int(os.getenv('QUEUE_STATS_INTERVAL', 60))
+
+# Transporte de la cola: list (LPUSH/BRPOP) | stream (Redis Streams con grupo de consumidores)
+QUEUE_TRANSPORT = os.getenv('QUEUE_TRANSPORT', 'list').lower()
+STREAM_PREFIX = os.getenv('STREAM_PREFIX', 'auralis_rule_engine_stream')
+STREAM_PARTITIONS = int(os.getenv('STREAM_PARTITIONS', 8))
+STREAM_GROUP = os.getenv('STREAM_GROUP', 'rule-workers')
+STREAM_MAXLEN = int(os.getenv('STREAM_MAXLEN', 1000000))  # por partición (aproximado)
+STREAM_CLAIM_IDLE_MS = int(os.getenv('STREAM_CLAIM_IDLE_MS', 60000))
+STREAM_CLAIM_INTERVAL = int(os.getenv('STREAM_CLAIM_INTERVAL', 30))
+# Ids confirmados que recuerda cada worker para descartar reentregas de entradas ya evaluadas
+STREAM_ACKED_MEMORY = max(1, int(os.getenv('STREAM_ACKED_MEMORY', 10000)))
+# Worker i de N: consume las particiones p con p % N == i % N (i puede ser el %i de systemd)
+RULE_WORKER_INDEX = int(os.getenv('RULE_WORKER_INDEX', 0))
+RULE_WORKER_COUNT = int(os.getenv('RULE_WORKER_COUNT', 1))
+# Hash con el último valor por sensor (entradas de reglas multi-sensor, compartido entre workers)
+LATEST_VALUES_KEY = os.getenv('LATEST_VALUES_KEY', 'auralis:latest_values')
+WORKER_BATCH_SIZE = max(1, int(os.getenv('WORKER_BATCH_SIZE', 100)))
+# Ventana en la que los UPDATE de un mismo evento activo se agrupan en una sola sentencia
+# (0 = solo dentro de cada lote). Ante una caída se pierden a lo sumo los conteos de esa ventana.
+EVENT_UPDATE_COALESCE_MS = int(os.getenv('EVENT_UPDATE_COALESCE_MS', 1000))
+# Estabilidad de incidentes (AlertPolicy.hysteresis / persistence_seconds); la persistencia
+# por defecto aplica a las reglas cuyas condiciones no la definen
+EVAL_USE_HYSTERESIS = os.getenv('EVAL_USE_HYSTERESIS', 'true').lower() in ('1', 'true', 'yes', 'on')
+EVAL_PERSISTENCE_DEFAULT = int(os.getenv('EVAL_PERSISTENCE_DEFAULT', 0))
+# Métricas de ventana (ROC, AVG, MIN, MAX): ventana por defecto (threshold_config['window_seconds']
+# la cambia por condición) y lecturas máximas guardadas por ventana
+METRIC_WINDOW_DEFAULT = int(os.getenv('METRIC_WINDOW_DEFAULT', 60))
+RING_BUFFER_SIZE = int(os.getenv('RING_BUFFER_SIZE', 256))
+
+# Tópico de lotes por estación: /<Estacion>/<BATCH_TOPIC_LEVEL>/
+BATCH_TOPIC_LEVEL = os.getenv('BATCH_TOPIC_LEVEL', '_batch')
+# Suscripción por estación ('<prefijo>/#' y '/<prefijo>/#') en vez de un tópico por sensor
+MQTT_WILDCARD_SUBSCRIPTIONS = os.getenv('MQTT_WILDCARD_SUBSCRIPTIONS', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+# Ingesta unificada: el subscriber alimenta REDIS_QUEUE_NAME y TopicManager no debe correr
+UNIFIED_INGEST = os.getenv('UNIFIED_INGEST', 'false').lower() in ('1', 'true', 'yes', 'on')
 
 SYNC_INTERVAL_TOPICS = int(os.getenv('SYNC_INTERVAL_TOPICS', 60))
+SYNC_FULL_RECONCILE_TOPICS = int(os.getenv('SYNC_FULL_RECONCILE_TOPICS', 600))
 SYNC_INTERVAL_RULES = int(os.getenv('SYNC_INTERVAL_RULES', 60)) # Reducido para pruebas más rápidas
+# Change-feed publicado por Django (CoreApps/rulesengine/signals.py); SYNC_INTERVAL_* pasa a ser
+# el intervalo de verificación de la marca COUNT/MAX(updated_at) y de la reconciliación completa
+CONFIG_CHANGES_CHANNEL = os.getenv('CONFIG_CHANGES_CHANNEL', 'auralis:config_changes')
+# Espera máxima por mensajes; acota también la demora en aplicar un cambio de configuración
+WORKER_BLOCK_MS = int(os.getenv('WORKER_BLOCK_MS', 1000))
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 TZ_NAME = os.getenv('TZ_NAME', 'UTC')
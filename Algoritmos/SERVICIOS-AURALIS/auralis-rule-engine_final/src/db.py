@@ -1,3 +1,6 @@
+import time
+import logging
+import threading
 import pymysql
 from . import config
 
@@ -14,3 +17,120 @@ def get_db_connection():
     except pymysql.MySQLError as e:
         print(f"Error al conectar a la base de datos: {e}")
         return None
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones persistentes (evita el handshake TCP + auth por consulta).
+      - como máximo `size` conexiones abiertas; acquire() espera hasta `timeout` segundos
+        por una libre y devuelve None si no hay (mismo contrato que get_db_connection);
+      - las conexiones van en autocommit: un SELECT no deja abierto un snapshot REPEATABLE
+        READ en una conexión reutilizada; las escrituras abren su transacción con begin();
+      - chequeo de salud: ping si la conexión estuvo ociosa más de `ping_interval`, y se
+        recicla al superar `recycle` segundos de vida (wait_timeout del servidor);
+      - release() descarta la conexión si quedó cerrada por un error.
+    """
+    def __init__(self, size, timeout, ping_interval, recycle, connect=None):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.recycle = recycle
+        self._connect = connect or self._new_connection
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._idle = []       # [(conexión, creada_en, usada_en)] LIFO: la más reciente primero
+        self._created = {}    # id(conexión) -> creada_en, para las que están en uso
+
+    @staticmethod
+    def _new_connection():
+        return pymysql.connect(
+            host=config.DB_HOST,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_NAME,
+            port=config.DB_PORT,
+            cursorclass=pymysql.cursors.DictCursor,
+            autocommit=True,
+        )
+
+    def _healthy(self, conn, created, used, now):
+        if now - created > self.recycle:
+            return False
+        if now - used > self.ping_interval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            logging.error(f"Pool de BD agotado: {self.size} conexiones en uso durante {self.timeout}s.")
+            return None
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                break
+            conn, created, used = item
+            if self._healthy(conn, created, used, now):
+                with self._lock:
+                    self._created[id(conn)] = created
+                return conn
+            self._close(conn)
+        try:
+            conn = self._connect()
+        except pymysql.MySQLError as e:
+            self._slots.release()
+            logging.error(f"Error al conectar a la base de datos: {e}")
+            return None
+        with self._lock:
+            self._created[id(conn)] = now
+        return conn
+
+    def release(self, conn):
+        if conn is None:
+            return
+        with self._lock:
+            created = self._created.pop(id(conn), None)
+        if created is None:
+            return  # no pertenece al pool o ya fue devuelta
+        if conn.open:
+            with self._lock:
+                self._idle.append((conn, created, time.monotonic()))
+        else:
+            self._close(conn)
+        self._slots.release()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self._close(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(config.DB_POOL_SIZE, config.DB_POOL_TIMEOUT,
+                                   config.DB_POOL_PING_INTERVAL, config.DB_POOL_RECYCLE)
+        return _pool
+
+def acquire():
+    """Conexión del pool (o None); devolverla siempre con release() en un finally."""
+    return get_pool().acquire()
+
+def release(connection):
+    get_pool().release(connection)
@@ -0,0 +1,53 @@
+# Máquina de estados por (regla, sensor primario) con antirrebote e histéresis.
+#
+# El estado es el mismo dict que se guarda en Redis bajo incident:rule:{id}:sensor:{sid},
+# de tamaño fijo:
+#   None                                           -> sin incidente
+#   {'status': 'ARMED', 'since': ts}               -> condición cumplida, esperando persistencia
+#   {'status': 'FIRING', 'event_id', 'table'}      -> incidente abierto (fila en events_*)
+#   {... 'FIRING' ..., 'clear_since': ts}          -> fuera de la banda de histéresis, esperando
+#                                                     persistencia para resolver
+# Solo ARMED -> FIRING (CREATE), FIRING -> FIRING (UPDATE) y FIRING -> None (RESOLVE) escriben
+# en la BD: una lectura ruidosa alrededor del umbral ya no abre y cierra incidentes.
+#
+# clear_since se agrega/quita sobre el mismo dict: un CREATE del mismo lote lo completa con
+# event_id/table después (insert_event) y las acciones posteriores deben ver esos campos.
+
+ARMED = 'ARMED'
+FIRING = 'FIRING'
+# Estado transitorio entre el CREATE y el INSERT (insert_event lo completa con FIRING)
+PENDING = 'PENDING'
+
+
+def is_open(incident):
+    return bool(incident) and incident.get('status') != ARMED
+
+
+def transition(incident, rule, values, ts):
+    """
+    Aplica una lectura a una regla. Devuelve (nuevo estado, acción) con acción en
+    None | 'CREATE' | 'UPDATE' | 'RESOLVE'.
+    """
+    persistence = rule.persistence
+    if is_open(incident):
+        if rule.hold(values):
+            incident.pop('clear_since', None)
+            return incident, 'UPDATE'
+        if persistence <= 0:
+            return None, 'RESOLVE'
+        clear_since = incident.get('clear_since')
+        if clear_since is None:
+            incident['clear_since'] = ts
+            return incident, None
+        if ts - clear_since >= persistence:
+            return None, 'RESOLVE'
+        return incident, None
+
+    if not rule.evaluate(values):
+        return None, None  # también descarta un ARMED que no llegó a persistir
+    if persistence > 0:
+        if incident is None:
+            return {'status': ARMED, 'since': ts}, None
+        if ts - incident['since'] < persistence:
+            return incident, None
+    return {'status': PENDING}, 'CREATE'
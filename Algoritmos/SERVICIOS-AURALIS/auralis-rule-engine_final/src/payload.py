@@ -0,0 +1,80 @@
+import json
+import struct
+from datetime import datetime
+
+# Mismo formato de lote que auralis-subscriber (payload.py):
+# tópico /<Estacion>/<BATCH_TOPIC_LEVEL>/ con lecturas (sensor_key, ts, valor).
+# Empaquetado: cabecera '<BH' (0xB1, cantidad) y por lectura
+#   longitud de clave (1 byte) + nombre utf-8 | 0 + '<I' id de sensor, luego '<dd' (epoch, valor)
+BATCH_MAGIC = 0xB1
+BATCH_HEADER = struct.Struct('<BH')
+BATCH_ID = struct.Struct('<I')
+BATCH_VALUES = struct.Struct('<dd')
+TS_KEYS = ('ts', 'timestamp', 't')
+
+
+def to_epoch(raw):
+    """Epoch en segundos desde epoch s/ms o ISO 8601 (sin zona = hora del sistema)."""
+    if raw is None or isinstance(raw, bool):
+        return None
+    if isinstance(raw, (int, float)):
+        ts = float(raw)
+        return ts / 1000.0 if ts > 1e11 else ts
+    if isinstance(raw, str):
+        try:
+            return datetime.fromisoformat(raw.strip().replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def to_value(raw):
+    """Valor de una lectura JSON (número o texto numérico); ValueError con listas u objetos."""
+    if isinstance(raw, bool) or not isinstance(raw, (int, float, str)):
+        raise ValueError(f"Valor no numérico: {raw!r}")
+    return float(raw)
+
+
+def parse_batch(payload):
+    """Devuelve [(clave, epoch | None, valor), ...]; clave = nombre del sensor (str) o id (int)."""
+    if payload[:1] == bytes((BATCH_MAGIC,)):
+        try:
+            _, count = BATCH_HEADER.unpack_from(payload, 0)
+            off = BATCH_HEADER.size
+            out = []
+            for _ in range(count):
+                klen = payload[off]
+                off += 1
+                if klen:
+                    key = payload[off:off + klen].decode('utf-8')
+                    off += klen
+                else:
+                    key = BATCH_ID.unpack_from(payload, off)[0]
+                    off += BATCH_ID.size
+                ts, value = BATCH_VALUES.unpack_from(payload, off)
+                off += BATCH_VALUES.size
+                out.append((key, ts if ts > 0 else None, value))
+            return out
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Lote empaquetado truncado: {e}")
+
+    data = json.loads(payload.decode('utf-8'))
+    if not isinstance(data, list):
+        raise ValueError("El lote JSON debe ser una lista")
+    out = []
+    for item in data:
+        if isinstance(item, dict):
+            key = item.get('sensor', item.get('id'))
+            raw_ts = next((item[k] for k in TS_KEYS if k in item), None)
+            value = item.get('value')
+        elif isinstance(item, (list, tuple)) and len(item) == 3:
+            key, raw_ts, value = item
+        else:
+            raise ValueError(f"Lectura de lote inválida: {item!r}")
+        if key is None or value is None:
+            raise ValueError(f"Lectura de lote incompleta: {item!r}")
+        if isinstance(key, bool) or not isinstance(key, (int, str)):
+            raise ValueError(f"Clave de sensor inválida: {item!r}")
+        out.append((key, to_epoch(raw_ts), to_value(value)))
+    return out
+
@@ -0,0 +1,105 @@
+from array import array
+from collections import deque
+
+# Ventana deslizante por (sensor, segundos) para las métricas de Condition distintas de VALUE.
+# Los pares (ts, valor) viven en dos array('d') de tamaño fijo usados como anillo; cada lectura
+# actualiza en O(1) amortizado:
+#   - la suma corriente (AVG),
+#   - dos colas monótonas (MIN / MAX de la ventana),
+#   - el extremo más antiguo para ROC = (último - primero) / (t_último - t_primero) en valor/segundo.
+# Si la ventana tiene más lecturas que `capacity`, se descartan las más antiguas (la ventana
+# efectiva se acorta). Lecturas con ts anterior a la última se ignoran; una lectura repetida
+# (mismo ts y valor) sí se cuenta: las reentregas del transporte se descartan por id de entrada
+# en StreamTransport, antes de llegar aquí.
+
+METRICS = ('ROC', 'AVG', 'MIN', 'MAX')
+
+
+class RingWindow:
+    __slots__ = ('window', 'capacity', 'ts', 'values', 'head', 'count', 'seq', 'total', 'min_q', 'max_q')
+
+    def __init__(self, window_seconds, capacity=256):
+        self.window = float(window_seconds)
+        self.capacity = max(2, int(capacity))
+        self.ts = array('d', bytes(8 * self.capacity))
+        self.values = array('d', bytes(8 * self.capacity))
+        self.head = 0       # posición de la lectura más antigua
+        self.count = 0
+        self.seq = 0        # número de secuencia de la próxima lectura
+        self.total = 0.0
+        # (seq, valor): min_q creciente y max_q decreciente; el frente es el extremo de la ventana
+        self.min_q = deque()
+        self.max_q = deque()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def last_ts(self):
+        return self.ts[(self.head + self.count - 1) % self.capacity] if self.count else None
+
+    def push(self, ts, value):
+        """Agrega una lectura; devuelve False si es anterior a la última (se ignora)."""
+        if self.count and ts < self.last_ts:
+            return False
+        if self.count == self.capacity:
+            self._evict()
+        i = (self.head + self.count) % self.capacity
+        self.ts[i] = ts
+        self.values[i] = value
+        self.count += 1
+        self.total += value
+
+        while self.min_q and self.min_q[-1][1] >= value:
+            self.min_q.pop()
+        self.min_q.append((self.seq, value))
+        while self.max_q and self.max_q[-1][1] <= value:
+            self.max_q.pop()
+        self.max_q.append((self.seq, value))
+        self.seq += 1
+
+        horizon = ts - self.window
+        while self.ts[self.head] < horizon:
+            self._evict()
+        return True
+
+    def copy(self):
+        """Copia independiente (el worker actualiza copias y las publica solo tras el COMMIT)."""
+        clone = RingWindow.__new__(RingWindow)
+        for name in ('window', 'capacity', 'head', 'count', 'seq', 'total'):
+            setattr(clone, name, getattr(self, name))
+        clone.ts = array('d', self.ts)
+        clone.values = array('d', self.values)
+        clone.min_q = deque(self.min_q)
+        clone.max_q = deque(self.max_q)
+        return clone
+
+    def _evict(self):
+        oldest = self.seq - self.count
+        self.total -= self.values[self.head]
+        if self.min_q[0][0] == oldest:
+            self.min_q.popleft()
+        if self.max_q[0][0] == oldest:
+            self.max_q.popleft()
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+        if not self.count:
+            self.total = 0.0  # sin deriva de punto flotante acumulada
+
+    def metric(self, name):
+        """Valor de la métrica sobre la ventana actual, o None si no hay datos suficientes."""
+        if not self.count:
+            return None
+        if name == 'AVG':
+            return self.total / self.count
+        if name == 'MIN':
+            return self.min_q[0][1]
+        if name == 'MAX':
+            return self.max_q[0][1]
+        if name == 'ROC':
+            last = (self.head + self.count - 1) % self.capacity
+            dt = self.ts[last] - self.ts[self.head]
+            if self.count < 2 or dt <= 0:
+                return None
+            return (self.values[last] - self.values[self.head]) / dt
+        raise ValueError(f"Métrica desconocida: {name}")
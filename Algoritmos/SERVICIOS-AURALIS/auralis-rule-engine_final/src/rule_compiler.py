@@ -0,0 +1,335 @@
+import json
+import logging
+import operator
+
+# Compila cada Rule y su árbol de RuleNode (COND / OP AND|OR) en un evaluador de Python
+# (closures anidadas) una sola vez por sincronización:
+#   - los umbrales (STATIC desde threshold_config, POLICY desde la política vinculada o, sin
+#     ella, desde la política efectiva del sensor) se resuelven y convierten a float al
+#     compilar, no por mensaje;
+#   - el operador se traduce a una función de `operator`;
+#   - AND/OR cortocircuitan en el orden de los nodos;
+#   - el evaluador recibe un dict sensor_id -> último valor, así una regla con varios
+#     sensores se reevalúa cada vez que cambia cualquiera de sus entradas.
+# Varias raíces en una misma regla se combinan con OR (antes cada raíz se evaluaba por separado).
+#
+# Cada regla trae dos evaluadores: `evaluate` (abrir incidente) y `hold` (mantenerlo abierto),
+# este último con el umbral desplazado por la histéresis de la condición (AlertPolicy.hysteresis
+# o threshold_config['hysteresis']): con '>' el incidente sigue activo mientras v > umbral - h.
+# `persistence` (segundos) es el mayor persistence_seconds de sus condiciones; lo aplica
+# incident_state al abrir y al cerrar.
+#
+# Entradas: VALUE usa la clave sensor_id; las métricas de ventana (ROC, AVG, MIN, MAX) usan
+# la clave "sensor_id:MÉTRICA:segundos" (threshold_config['window_seconds'] o la ventana por
+# defecto), que el worker calcula con ring_buffer.RingWindow y publica junto a los últimos valores.
+# BETWEEN / NOT_BETWEEN usan una banda [min, max]: threshold_config {'min', 'max'} o, con POLICY,
+# las bandas baja/alta de la severidad (la baja solo si enable_low_thresholds).
+
+COMPARATORS = {'>': operator.gt, '<': operator.lt, '==': operator.eq}
+BAND_OPERATORS = ('BETWEEN', 'NOT_BETWEEN')
+WINDOW_METRICS = ('ROC', 'AVG', 'MIN', 'MAX')
+THRESHOLD_KEY_BY_SEVERITY = {'CRITICAL': 'alert_high', 'WARNING': 'warn_high'}
+BAND_KEYS_BY_SEVERITY = {'CRITICAL': ('alert_low', 'alert_high'), 'WARNING': ('warn_low', 'warn_high')}
+DEFAULT_OPTIONS = {'use_hysteresis': True, 'default_persistence': 0, 'default_window': 60}
+
+
+def input_key(sensor_id, metric, window):
+    """Clave de la entrada en el dict de valores (y campo en LATEST_VALUES_KEY)."""
+    if metric in WINDOW_METRICS:
+        return f"{sensor_id}:{metric}:{int(window)}"
+    return sensor_id
+
+
+def parse_input_key(key):
+    """(sensor_id, métrica, segundos) de una clave de métrica de ventana."""
+    sensor_id, metric, window = key.split(':')
+    return int(sensor_id), metric, int(window)
+
+
+def sensor_of(key):
+    return parse_input_key(key)[0] if isinstance(key, str) else key
+
+
+def _never(values):
+    return False
+
+
+class CompiledRule:
+    __slots__ = ('id', 'name', 'severity', 'evaluate', 'sensors', 'primary_sensor_id', 'description', 'policies',
+                 'hold', 'persistence', 'inputs', 'windows')
+
+    def __init__(self, rule_id, name, severity, evaluate, sensors, primary_sensor_id, description, policies=frozenset(),
+                 hold=None, persistence=0, inputs=None):
+        self.id = rule_id
+        self.name = name
+        self.severity = severity
+        self.evaluate = evaluate
+        # Evaluador con histéresis para un incidente ya abierto (sin histéresis = evaluate)
+        self.hold = hold or evaluate
+        self.persistence = persistence
+        # Sensores de entrada (la regla se reevalúa cuando llega cualquiera de ellos)
+        self.sensors = sensors
+        # Sensor de la primera condición: identifica el incidente y el evento (sensor_id)
+        self.primary_sensor_id = primary_sensor_id
+        self.description = description
+        # Políticas de las que depende (para recompilar la regla si cambia una política)
+        self.policies = policies
+        # Claves que lee evaluate (sensor_id y "sensor_id:MÉTRICA:segundos") y ventanas que requieren
+        self.inputs = frozenset(inputs) if inputs is not None else sensors
+        self.windows = frozenset(parse_input_key(k) for k in self.inputs if isinstance(k, str))
+
+
+def _span(sensor_info):
+    smin = float(sensor_info.get('min_value') or 0.0)
+    smax = float(sensor_info.get('max_value') or 1.0)
+    return smin, max(0.0, smax - smin)
+
+
+def calculate_absolute_threshold(policy, sensor_info, threshold_key):
+    v = policy.get(threshold_key)
+    if v is None: return None
+    if policy['alert_mode'] == 'ABS': return float(v)
+
+    smin, span = _span(sensor_info)
+    return smin + float(v) * span
+
+
+def threshold_config(condition):
+    config_data = condition['threshold_config']
+    if isinstance(config_data, str):
+        try:
+            config_data = json.loads(config_data) if config_data else {}
+        except json.JSONDecodeError:
+            logging.error(f"Error al decodificar JSON de threshold_config: {config_data}")
+            config_data = {}
+    return config_data if isinstance(config_data, dict) else {}
+
+
+def _as_float(value, default=0.0):
+    try:
+        return float(value) if value is not None else default
+    except (ValueError, TypeError):
+        return default
+
+
+def policy_for(condition, sensor_info, policies_by_id):
+    """Política vinculada a la condición o, si no tiene, la efectiva del sensor (precedencia de Django)."""
+    if condition['linked_policy_id']:
+        return policies_by_id.get(condition['linked_policy_id'])
+    return (sensor_info or {}).get('effective_policy')
+
+
+def resolve_stability(condition, sensor_info, policies_by_id):
+    """(histéresis absoluta, segundos de persistencia) de una condición; (0.0, None) si no tiene."""
+    if condition['threshold_type'] == 'STATIC':
+        config_data = threshold_config(condition)
+        persistence = config_data.get('persistence_seconds')
+        return max(0.0, _as_float(config_data.get('hysteresis'))), (int(_as_float(persistence)) if persistence is not None else None)
+
+    policy = policy_for(condition, sensor_info, policies_by_id)
+    if not policy:
+        return 0.0, None
+    hysteresis = max(0.0, _as_float(policy.get('hysteresis')))
+    if hysteresis and policy['alert_mode'] != 'ABS' and sensor_info:
+        hysteresis *= _span(sensor_info)[1]  # REL: fracción del rango, igual que los umbrales
+    return hysteresis, policy.get('persistence_seconds')
+
+
+def resolve_band(condition, severity, sensor_info, policies_by_id):
+    """Banda absoluta (min, max) de BETWEEN/NOT_BETWEEN; un extremo ausente queda abierto (±inf)."""
+    low = high = None
+    if condition['threshold_type'] == 'STATIC':
+        config_data = threshold_config(condition)
+        low, high = config_data.get('min'), config_data.get('max')
+    elif condition['threshold_type'] == 'POLICY':
+        policy = policy_for(condition, sensor_info, policies_by_id)
+        if policy:
+            low_key, high_key = BAND_KEYS_BY_SEVERITY.get(severity, ('alert_low', 'alert_high'))
+            high = calculate_absolute_threshold(policy, sensor_info, high_key)
+            if policy.get('enable_low_thresholds'):
+                low = calculate_absolute_threshold(policy, sensor_info, low_key)
+
+    if low is None and high is None: return None
+    try:
+        low = float(low) if low is not None else float('-inf')
+        high = float(high) if high is not None else float('inf')
+    except (ValueError, TypeError):
+        logging.warning(f"Banda no numérica en la condición {condition['condition_id']}: {low}..{high}")
+        return None
+    return (low, high) if low <= high else None
+
+
+def resolve_threshold(condition, severity, sensor_info, policies_by_id):
+    """Umbral absoluto de una condición (float) o None si no se puede determinar."""
+    threshold = None
+    if condition['threshold_type'] == 'STATIC':
+        threshold = threshold_config(condition).get('value')
+
+    elif condition['threshold_type'] == 'POLICY':
+        policy = policy_for(condition, sensor_info, policies_by_id)
+        if policy:
+            threshold_key = THRESHOLD_KEY_BY_SEVERITY.get(severity, 'alert_high')
+            threshold = calculate_absolute_threshold(policy, sensor_info, threshold_key)
+
+    if threshold is None: return None
+    try:
+        return float(threshold)
+    except (ValueError, TypeError):
+        logging.warning(f"Umbral no numérico en la condición {condition['condition_id']}: {threshold}")
+        return None
+
+
+def _band(key, op, low, high):
+    if op == 'BETWEEN':
+        def evaluate(values, _k=key, _lo=low, _hi=high):
+            v = values.get(_k)
+            return v is not None and _lo <= v <= _hi
+    else:
+        def evaluate(values, _k=key, _lo=low, _hi=high):
+            v = values.get(_k)
+            return v is not None and (v < _lo or v > _hi)
+    return evaluate
+
+
+def _comparison(sensor_id, cmp, threshold):
+    def evaluate(values, _sid=sensor_id, _cmp=cmp, _t=threshold):
+        v = values.get(_sid)
+        return v is not None and _cmp(v, _t)
+    return evaluate
+
+
+def _hold_comparison(sensor_id, op, threshold, hysteresis):
+    """Variante relajada para mantener abierto un incidente: la banda de salida es más ancha."""
+    if op == '>':
+        return _comparison(sensor_id, operator.gt, threshold - hysteresis)
+    if op == '<':
+        return _comparison(sensor_id, operator.lt, threshold + hysteresis)
+
+    def evaluate(values, _sid=sensor_id, _t=threshold, _h=hysteresis):
+        v = values.get(_sid)
+        return v is not None and abs(v - _t) <= _h
+    return evaluate
+
+
+def compile_condition(node, severity, sensors, policies_by_id, options=DEFAULT_OPTIONS):
+    """Devuelve (evaluador, evaluador con histéresis, descripción, [clave de entrada], persistencia)."""
+    sensor_id = node['source_sensor_id']
+    sensor_info = sensors.get(sensor_id)
+    op = node['operator']
+    metric = node.get('metric_to_evaluate') or 'VALUE'
+    if metric != 'VALUE' and metric not in WINDOW_METRICS:
+        return _never, _never, f"{node['condition_name']}: métrica {metric} no soportada", [sensor_id], None
+    window = options['default_window']
+    if metric != 'VALUE':
+        window = _as_float(threshold_config(node).get('window_seconds'), window) or window
+    key = input_key(sensor_id, metric, window)
+    label = sensor_info['name'] if sensor_info else sensor_id
+    if metric != 'VALUE':
+        label = f"{metric}({label}, {int(window)}s)"
+
+    if op in BAND_OPERATORS:
+        band = resolve_band(node, severity, sensor_info, policies_by_id) if sensor_info else None
+        if band is None:
+            return _never, _never, f"{node['condition_name']}: sin banda", [key], None
+        low, high = band
+        evaluate = _band(key, op, low, high)
+        description = f"{label} {op} [{low:g}, {high:g}]"
+    else:
+        cmp = COMPARATORS.get(op)
+        threshold = resolve_threshold(node, severity, sensor_info, policies_by_id) if sensor_info else None
+        if cmp is None or threshold is None:
+            return _never, _never, f"{node['condition_name']}: sin umbral", [key], None
+        evaluate = _comparison(key, cmp, threshold)
+        description = f"{label} {op} {threshold}"
+
+    hysteresis, persistence = resolve_stability(node, sensor_info, policies_by_id)
+    if not (options['use_hysteresis'] and hysteresis > 0):
+        return evaluate, evaluate, description, [key], persistence
+    if op == 'BETWEEN':
+        hold = _band(key, op, low - hysteresis, high + hysteresis)
+    elif op == 'NOT_BETWEEN':
+        # La banda interior no puede invertirse: el incidente nunca se cerraría
+        mid = (low + high) / 2
+        hold = _band(key, op, min(low + hysteresis, mid), max(high - hysteresis, mid))
+    else:
+        hold = _hold_comparison(key, op, threshold, hysteresis)
+    return evaluate, hold, description + f" (±{hysteresis:g})", [key], persistence
+
+
+def compile_node(node, children, severity, sensors, policies_by_id, options=DEFAULT_OPTIONS):
+    if node['node_type'] == 'COND':
+        if node['condition_id'] is None:
+            return _never, _never, "condición vacía", [], None
+        return compile_condition(node, severity, sensors, policies_by_id, options)
+
+    compiled = [compile_node(child, children, severity, sensors, policies_by_id, options)
+                for child in children.get(node['id'], ())]
+    return combine(node['logical_operator'], compiled)
+
+
+def _join(logical_operator, fns):
+    if len(fns) == 1:
+        return fns[0]
+    if logical_operator == 'AND':
+        def evaluate(values, _fns=fns):
+            for fn in _fns:
+                if not fn(values):
+                    return False
+            return True
+    else:
+        def evaluate(values, _fns=fns):
+            for fn in _fns:
+                if fn(values):
+                    return True
+            return False
+    return evaluate
+
+
+def combine(logical_operator, compiled):
+    if not compiled:
+        return _never, _never, "operador sin hijos", [], None
+    inputs = [sid for *_, sids, _ in compiled for sid in sids]
+    persistences = [p for *_, p in compiled if p is not None]
+    persistence = max(persistences) if persistences else None
+    if len(compiled) == 1:
+        return compiled[0][0], compiled[0][1], compiled[0][2], inputs, persistence
+
+    evaluate = _join(logical_operator, tuple(c[0] for c in compiled))
+    hold = _join(logical_operator, tuple(c[1] for c in compiled))
+    joiner = ' AND ' if logical_operator == 'AND' else ' OR '
+    description = '(' + joiner.join(c[2] for c in compiled) + ')'
+    return evaluate, hold, description, inputs, persistence
+
+
+def compile_rules(rules, nodes, sensors, policies_by_id, **options):
+    """
+    rules: {rule_id: {'id', 'name', 'severity'}} (reglas activas)
+    nodes: filas de rulesengine_rulenode con los campos de su condición (LEFT JOIN)
+    options: use_hysteresis, default_persistence (segundos para las reglas cuyas condiciones
+             no la definen) y default_window (segundos de las métricas de ventana); ver DEFAULT_OPTIONS
+    Devuelve {rule_id: CompiledRule}; las reglas sin condiciones evaluables se omiten.
+    """
+    options = dict(DEFAULT_OPTIONS, **options)
+    nodes_by_rule = {}
+    for node in nodes:
+        nodes_by_rule.setdefault(node['rule_id'], []).append(node)
+
+    compiled = {}
+    for rule_id, rule in rules.items():
+        children = {}
+        for node in sorted(nodes_by_rule.get(rule_id, ()), key=lambda n: n['id']):
+            children.setdefault(node['parent_id'], []).append(node)
+        roots = [compile_node(root, children, rule['severity'], sensors, policies_by_id, options)
+                 for root in children.get(None, ())]
+        evaluate, hold, description, inputs, persistence = combine('OR', roots)
+        if evaluate is _never or not inputs:
+            continue
+        policies = frozenset(n['linked_policy_id'] for n in nodes_by_rule[rule_id]
+                             if n['node_type'] == 'COND' and n.get('linked_policy_id'))
+        compiled[rule_id] = CompiledRule(
+            rule_id, rule['name'], rule['severity'], evaluate,
+            frozenset(sensor_of(k) for k in inputs), sensor_of(inputs[0]), description, policies,
+            hold, int(persistence if persistence is not None else options['default_persistence']),
+            inputs,
+        )
+    return compiled
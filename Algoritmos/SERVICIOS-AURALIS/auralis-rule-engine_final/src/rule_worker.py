@@ -8,16 +8,105 @@ import os
 from datetime import datetime
 import pytz
 from . import config, db
+from .codec import decode
+from .transport import make_transport
+from .rule_compiler import compile_rules, input_key
+from .incident_state import transition
+from .ring_buffer import RingWindow
 
 WORKER_ID = f"worker-{os.getpid()}"
 log_level = getattr(logging, config.LOG_LEVEL, logging.INFO)
 logging.basicConfig(level=log_level, format=f'%(asctime)s - %(levelname)s - [{WORKER_ID}] - %(message)s')
 
+# La política efectiva (precedencia ya resuelta por Django en sensorhub_sensoreffectivepolicy)
+# se usa en las condiciones POLICY sin política vinculada
+SENSORS_SQL = """
+    SELECT s.id, s.name, s.min_value, s.max_value, 
+           st.id as station_id, st.company_id, s.sensor_type_id,
+           ep.policy_id AS ep_policy_id, ep.warn_low AS ep_warn_low, ep.alert_low AS ep_alert_low,
+           ep.warn_high AS ep_warn_high, ep.alert_high AS ep_alert_high,
+           ep.enable_low_thresholds AS ep_enable_low_thresholds, ep.hysteresis AS ep_hysteresis,
+           ep.persistence_seconds AS ep_persistence_seconds
+    FROM sensorhub_sensor s
+    JOIN sensorhub_station st ON s.station_id = st.id
+    LEFT JOIN sensorhub_sensoreffectivepolicy ep ON ep.sensor_id = s.id
+    WHERE s.is_active = TRUE"""
+
+RULES_SQL = "SELECT id, name, severity FROM rulesengine_rule WHERE is_active = TRUE"
+
+RULE_NODES_SQL = """
+    SELECT rn.id, rn.rule_id, rn.parent_id, rn.node_type, rn.logical_operator,
+           c.id as condition_id, c.name as condition_name, c.source_sensor_id,
+           c.metric_to_evaluate, c.threshold_type, c.operator, c.threshold_config,
+           c.linked_policy_id
+    FROM rulesengine_rulenode rn
+    JOIN rulesengine_rule r ON r.id = rn.rule_id
+    LEFT JOIN rulesengine_condition c ON rn.condition_id = c.id
+    WHERE r.is_active = TRUE"""
+
+# Marca barata por tabla: filas + última edición (RuleNode no tiene updated_at: filas + id máximo)
+CONFIG_WATERMARK_SQL = """
+    SELECT (SELECT CONCAT(COUNT(*), '|', COALESCE(MAX(updated_at), '')) FROM sensorhub_sensor) AS sensors,
+           (SELECT CONCAT(COUNT(*), '|', COALESCE(MAX(updated_at), '')) FROM sensorhub_alertpolicy) AS policies,
+           (SELECT CONCAT(COUNT(*), '|', COALESCE(MAX(updated_at), '')) FROM rulesengine_rule) AS rules,
+           (SELECT CONCAT(COUNT(*), '|', COALESCE(MAX(updated_at), '')) FROM rulesengine_condition) AS conditions,
+           (SELECT CONCAT(COUNT(*), '|', COALESCE(MAX(id), 0)) FROM rulesengine_rulenode) AS nodes,
+           (SELECT CONCAT(COUNT(*), '|', COALESCE(MAX(updated_at), '')) FROM sensorhub_sensoreffectivepolicy) AS effective"""
+
+COMPILE_OPTIONS = {
+    'use_hysteresis': config.EVAL_USE_HYSTERESIS,
+    'default_persistence': config.EVAL_PERSISTENCE_DEFAULT,
+    'default_window': config.METRIC_WINDOW_DEFAULT,
+}
+
+def sensor_row(row):
+    """Fila de SENSORS_SQL -> info del sensor con 'effective_policy' como dict de política ABS (o None)."""
+    ep = {k[3:]: row.pop(k) for k in list(row) if k.startswith('ep_')}
+    row['effective_policy'] = dict(ep, id=ep['policy_id'], alert_mode='ABS') if ep['policy_id'] else None
+    return row
+
+def policies_by_scope(policies_by_id):
+    by_scope = {}
+    for policy in policies_by_id.values():
+        by_scope.setdefault(policy['scope'], []).append(policy)
+    return by_scope
+
+def build_dispatch_index(rules):
+    """
+    Índice de despacho: sensor_id -> [reglas compiladas que lo usan como entrada], para que
+    cada lectura solo recorra las reglas que dependen de su sensor (O(reglas del sensor), no O(reglas)).
+    """
+    rules_by_sensor = {}
+    for rule in rules.values():
+        for sensor_id in rule.sensors:
+            rules_by_sensor.setdefault(sensor_id, []).append(rule)
+    return rules_by_sensor
+
+def build_window_index(rules):
+    """sensor_id -> {segundos de ventana: {métricas}} que piden las reglas (ROC, AVG, MIN, MAX)."""
+    windows_by_sensor = {}
+    for rule in rules.values():
+        for sensor_id, metric, window in rule.windows:
+            windows_by_sensor.setdefault(sensor_id, {}).setdefault(window, set()).add(metric)
+    return windows_by_sensor
+
 class RuleWorker:
     def __init__(self):
         self.redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
+        # La cola puede traer mensajes binarios (QUEUE_CODEC=msgpack|struct): cliente sin decodificar
+        self.queue_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
+        self.transport = make_transport(self.queue_client)
         self.cache = {}
         self.last_sync_time = 0
+        self.watermark = None
+        self.pubsub = None
+        # UPDATE de eventos acumulados: (tabla, event_id) -> {'last', 'count', 'peak', 'since'}
+        self.pending_updates = {}
+        # Ventanas deslizantes en memoria: (sensor_id, segundos) -> RingWindow
+        self.windows = {}
+        # Lote ya persistido en MySQL: escritura de estado en Redis pendiente y entradas sin confirmar
+        self.pending_state = None
+        self.committed = []
         try:
             self.local_tz = pytz.timezone(config.TZ_NAME)
             logging.info(f"Zona horaria configurada: {config.TZ_NAME}")
@@ -26,221 +115,486 @@ class RuleWorker:
             self.local_tz = pytz.utc
 
     def sync_configuration(self):
+        """
+        Carga completa al arrancar; después solo deltas:
+          - los cambios publicados por Django en CONFIG_CHANGES_CHANNEL se aplican en el
+            siguiente ciclo (recarga solo las filas afectadas y recompila solo esas reglas);
+          - cada SYNC_INTERVAL_RULES se compara una marca barata (COUNT/MAX(updated_at) por
+            tabla) y solo si cambió sin aviso (p. ej. mensaje perdido) se recarga todo.
+        """
+        if not self.cache:
+            self.subscribe_config_changes()
+            self.full_reload()
+            return
+
+        changes = self.drain_config_changes()
+        if changes:
+            self.apply_config_changes(changes)
+
         if time.time() - self.last_sync_time < config.SYNC_INTERVAL_RULES:
             return
+        self.last_sync_time = time.time()
+        connection = db.acquire()
+        if not connection: return
+        try:
+            with connection.cursor() as cursor:
+                watermark = self.config_watermark(cursor)
+        except Exception as e:
+            logging.error(f"No se pudo leer la marca de configuración: {e}")
+            return
+        finally:
+            db.release(connection)
+        if watermark != self.watermark:
+            logging.info("La configuración cambió sin aviso en el canal. Recargando todo.")
+            self.full_reload()
+
+    def subscribe_config_changes(self):
+        try:
+            self.pubsub = self.redis_client.pubsub()
+            self.pubsub.subscribe(config.CONFIG_CHANGES_CHANNEL)
+        except redis.exceptions.RedisError as e:
+            self.pubsub = None
+            logging.warning(f"Sin change-feed de configuración ({e}). Solo sincronización periódica.")
+
+    def drain_config_changes(self):
+        """Junta todos los avisos pendientes en un solo delta: {modelo: {ids}} + 'rule_ids'."""
+        if self.pubsub is None:
+            return {}
+        changes = {}
+        while True:
+            message = self.pubsub.get_message()
+            if message is None:
+                break
+            if message['type'] != 'message':
+                continue  # confirmaciones de (re)suscripción
+            try:
+                data = json.loads(message['data'])
+            except (TypeError, ValueError):
+                continue
+            changes.setdefault(data.get('model'), set()).add(data.get('id'))
+            if data.get('sensor_ids'):
+                # Política efectiva recalculada: basta con recargar esos sensores
+                changes.setdefault('sensor', set()).update(data['sensor_ids'])
+            changes.setdefault('rule_ids', set()).update(data.get('rule_ids') or ())
+        return changes
+
+    @staticmethod
+    def config_watermark(cursor):
+        cursor.execute(CONFIG_WATERMARK_SQL)
+        return tuple(cursor.fetchone().values())
+
+    def full_reload(self):
         logging.info("Sincronizando configuración de alertas desde la base de datos...")
-        connection = db.get_db_connection()
+        connection = db.acquire()
         if not connection: return
 
         new_cache = {'sensors': {}, 'rules': {}, 'policies': {}}
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT s.id, s.name, s.min_value, s.max_value, 
-                           st.id as station_id, st.company_id, s.sensor_type_id
-                    FROM sensorhub_sensor s
-                    JOIN sensorhub_station st ON s.station_id = st.id
-                    WHERE s.is_active = TRUE
-                """)
+                # La marca se lee primero: un cambio concurrente quedará por encima de ella
+                watermark = self.config_watermark(cursor)
+                cursor.execute(SENSORS_SQL)
                 for row in cursor.fetchall():
-                    new_cache['sensors'][row['id']] = row
+                    new_cache['sensors'][row['id']] = sensor_row(row)
 
                 cursor.execute("SELECT * FROM sensorhub_alertpolicy WHERE bands_active = TRUE")
-                for row in cursor.fetchall():
-                    scope = row['scope']
-                    if scope not in new_cache['policies']:
-                        new_cache['policies'][scope] = []
-                    new_cache['policies'][scope].append(row)
-
-                cursor.execute("""
-                    SELECT r.id as rule_id, r.name as rule_name, r.severity,
-                           c.id as condition_id, c.name as condition_name, c.source_sensor_id, 
-                           c.threshold_type, c.operator, c.threshold_config, c.linked_policy_id
-                    FROM rulesengine_rule r
-                    JOIN rulesengine_rulenode rn ON r.id = rn.rule_id
-                    JOIN rulesengine_condition c ON rn.condition_id = c.id
-                    WHERE r.is_active = TRUE AND rn.node_type = 'COND' AND rn.parent_id IS NULL
-                """)
-                for row in cursor.fetchall():
-                    rule_id = row['rule_id']
-                    if rule_id not in new_cache['rules']:
-                        new_cache['rules'][rule_id] = {
-                            'id': rule_id, 'name': row['rule_name'], 'severity': row['severity'],
-                            'conditions': {}
-                        }
-                    sensor_id = row['source_sensor_id']
-                    new_cache['rules'][rule_id]['conditions'][sensor_id] = row
-            
+                new_cache['policies_by_id'] = {row['id']: row for row in cursor.fetchall()}
+                new_cache['policies'] = policies_by_scope(new_cache['policies_by_id'])
+
+                cursor.execute(RULES_SQL)
+                rules = {row['id']: row for row in cursor.fetchall()}
+
+                # Árbol completo (OP y COND a cualquier profundidad), no solo las condiciones raíz
+                cursor.execute(RULE_NODES_SQL)
+                nodes = cursor.fetchall()
+
+            new_cache['rules'] = compile_rules(rules, nodes, new_cache['sensors'], new_cache['policies_by_id'],
+                                **COMPILE_OPTIONS)
+            new_cache['rules_by_sensor'] = build_dispatch_index(new_cache['rules'])
+            new_cache['windows_by_sensor'] = build_window_index(new_cache['rules'])
             self.cache = new_cache
+            self.watermark = watermark
             self.last_sync_time = time.time()
-            logging.info(f"Sincronización completada. Sensores: {len(self.cache['sensors'])}, Reglas: {len(self.cache['rules'])}")
+            logging.info(f"Sincronización completada. Sensores: {len(self.cache['sensors'])}, Reglas: {len(self.cache['rules'])} compiladas de {len(rules)}")
         except Exception as e:
             logging.exception(f"Error durante la sincronización de reglas: {e}")
         finally:
-            connection.close()
+            db.release(connection)
+
+    def apply_config_changes(self, changes):
+        """Recarga solo las filas cambiadas y recompila solo las reglas afectadas."""
+        cache = self.cache
+        sensor_ids = changes.get('sensor', set())
+        policy_ids = changes.get('alertpolicy', set())
+        rule_ids = set(changes.get('rule_ids', ())) | changes.get('rule', set())
+        for sensor_id in sensor_ids:
+            rule_ids.update(rule.id for rule in cache['rules_by_sensor'].get(sensor_id, ()))
+        if policy_ids:
+            rule_ids.update(rule.id for rule in cache['rules'].values() if rule.policies & policy_ids)
+
+        connection = db.acquire()
+        if not connection: return
+        try:
+            with connection.cursor() as cursor:
+                watermark = self.config_watermark(cursor)
+                if sensor_ids:
+                    cursor.execute(SENSORS_SQL + " AND s.id IN %s", (tuple(sensor_ids),))
+                    rows = {row['id']: sensor_row(row) for row in cursor.fetchall()}
+                    for sensor_id in sensor_ids:
+                        if sensor_id in rows:
+                            cache['sensors'][sensor_id] = rows[sensor_id]
+                        else:
+                            cache['sensors'].pop(sensor_id, None)  # borrado o desactivado
+                if policy_ids:
+                    cursor.execute("SELECT * FROM sensorhub_alertpolicy WHERE bands_active = TRUE AND id IN %s", (tuple(policy_ids),))
+                    rows = {row['id']: row for row in cursor.fetchall()}
+                    for policy_id in policy_ids:
+                        if policy_id in rows:
+                            cache['policies_by_id'][policy_id] = rows[policy_id]
+                        else:
+                            cache['policies_by_id'].pop(policy_id, None)
+                    cache['policies'] = policies_by_scope(cache['policies_by_id'])
+                rules, nodes = {}, []
+                if rule_ids:
+                    cursor.execute(RULES_SQL + " AND id IN %s", (tuple(rule_ids),))
+                    rules = {row['id']: row for row in cursor.fetchall()}
+                    cursor.execute(RULE_NODES_SQL + " AND rn.rule_id IN %s", (tuple(rule_ids),))
+                    nodes = cursor.fetchall()
+
+            compiled = compile_rules(rules, nodes, cache['sensors'], cache['policies_by_id'],
+                                    **COMPILE_OPTIONS)
+            for rule_id in rule_ids:
+                cache['rules'].pop(rule_id, None)
+            cache['rules'].update(compiled)
+            cache['rules_by_sensor'] = build_dispatch_index(cache['rules'])
+            cache['windows_by_sensor'] = build_window_index(cache['rules'])
+            self.watermark = watermark
+            logging.info(f"Cambios de configuración aplicados: {len(sensor_ids)} sensores, {len(policy_ids)} políticas, {len(rule_ids)} reglas recompiladas.")
+        except Exception as e:
+            logging.exception(f"Error aplicando cambios de configuración: {e}. Se hará una recarga completa.")
+            self.watermark = None
+        finally:
+            db.release(connection)
 
     def evaluate(self, message):
-        sensor_id = message['sensor_id']
-        value = message['value']
-        logging.debug(f"Procesando: Sensor ID {sensor_id}, Valor {value}")
-        sensor_info = self.cache['sensors'].get(sensor_id)
-        if not sensor_info: return
-
-        for rule in self.cache.get('rules', {}).values():
-            condition = rule.get('conditions', {}).get(sensor_id)
-            if condition:
-                self.process_incident(rule, condition, sensor_info, value)
-
-    def process_incident(self, rule, condition, sensor_info, value):
-        redis_key = f"incident:rule:{rule['id']}:sensor:{sensor_info['id']}"
-        is_triggered, threshold_info = self.check_condition(rule, condition, sensor_info, value)
-        active_incident_json = self.redis_client.get(redis_key)
-        
-        if is_triggered:
-            if not active_incident_json:
-                logging.info(f"NUEVO INCIDENTE: Regla '{rule['name']}' para sensor '{sensor_info['name']}'. Valor: {value} {threshold_info}")
-                self.manage_event_db('CREATE', rule=rule, sensor_id=sensor_info['id'], value=value, redis_key=redis_key)
-            else:
-                logging.debug(f"INCIDENTE ACTIVO: Regla '{rule['name']}'. Valor: {value}")
-                self.manage_event_db('UPDATE', value=value, active_incident_json=active_incident_json)
-        else:
-            if active_incident_json:
-                logging.info(f"INCIDENTE RESUELTO: Regla '{rule['name']}' para sensor '{sensor_info['name']}'. Valor: {value}")
-                self.manage_event_db('RESOLVE', value=value, active_incident_json=active_incident_json, redis_key=redis_key)
-
-    def check_condition(self, rule, condition, sensor_info, value):
-        threshold = None
-        threshold_key_map = { 'CRITICAL': 'alert_high', 'WARNING': 'warn_high' }
-        
-        if condition['threshold_type'] == 'STATIC':
-            config_data = condition['threshold_config']
-            if isinstance(config_data, str):
-                try:
-                    config_data = json.loads(config_data) if config_data else {}
-                except json.JSONDecodeError:
-                    logging.error(f"Error al decodificar JSON de threshold_config: {config_data}")
-                    config_data = {}
-            threshold = config_data.get('value')
+        if self.evaluate_batch([message]):
+            self.write_state()
 
-        elif condition['threshold_type'] == 'POLICY' and condition['linked_policy_id']:
-            policy = self.find_policy_by_id(condition['linked_policy_id'])
-            if policy:
-                threshold_key = threshold_key_map.get(rule['severity'], 'alert_high')
-                threshold = self.calculate_absolute_threshold(policy, sensor_info, threshold_key)
+    def evaluate_batch(self, messages):
+        """
+        Evalúa un lote de mensajes con un número fijo de viajes de red:
+          1. despacha cada lectura solo a las reglas compiladas que dependen de su sensor,
+          1b. actualiza copias de las ventanas (RingWindow) de los sensores con métricas
+             ROC/AVG/MIN/MAX,
+          2. en un pipeline: MGET del estado de los incidentes y HMGET de los últimos valores
+             guardados de todas las entradas de esas reglas (también las que trae el lote: una
+             lectura temprana debe ver el valor previo de una entrada que llega más adelante),
+          3. reevalúa cada regla en orden de llegada, superponiendo cada lectura del lote a esos
+             valores a medida que se evalúa,
+             pasando por la máquina de estados de incident_state (persistencia e histéresis),
+          4. escribe todos los eventos en una única transacción MySQL,
+          5. tras el COMMIT publica las ventanas actualizadas y deja en self.pending_state
+             los SET/DEL de estado y el HSET de los valores nuevos del lote; write_state() los
+             aplica en un solo pipeline de Redis.
+        Los últimos valores viven en Redis (LATEST_VALUES_KEY) porque las entradas de una
+        regla multi-sensor pueden llegar a workers distintos.
+        Devuelve False si la transacción falló: ni las ventanas ni Redis cambiaron, así que el
+        worker puede reintentar el mismo lote sin contar dos veces sus lecturas. Con True el
+        lote ya está persistido y no se debe reevaluar: si Redis falla después, run() reintenta
+        solo write_state() y la confirmación en el transporte (finish_batch).
+        """
+        rules_by_sensor = self.cache.get('rules_by_sensor', {})
+        readings = []
+        for message in messages:
+            sensor_id = message['sensor_id']
+            if sensor_id not in rules_by_sensor: continue
+            ts = message.get('timestamp')
+            try:
+                readings.append((sensor_id, float(message['value']), float(ts) if ts is not None else time.time()))
+            except (ValueError, TypeError):
+                logging.warning(f"Valor no numérico del sensor {sensor_id}: {message['value']}")
+        if not readings:
+            return True
 
-        if threshold is None: return False, ""
+        touched = {}
+        batch_values = {}
+        derived = []
+        staged = {}
+        for sensor_id, value, ts in readings:
+            batch_values[sensor_id] = value
+            metrics = self.update_windows(sensor_id, value, ts, staged)
+            derived.append(metrics)
+            batch_values.update((k, v) for k, v in metrics.items() if v is not None)
+            for rule in rules_by_sensor[sensor_id]:
+                touched[rule.id] = rule
+        inputs = list({key for rule in touched.values() for key in rule.inputs})
+        keys = {rule_id: f"incident:rule:{rule_id}:sensor:{rule.primary_sensor_id}" for rule_id, rule in touched.items()}
 
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.mget(list(keys.values()))
+        pipe.hmget(config.LATEST_VALUES_KEY, inputs)
+        results = pipe.execute()
+        initial = dict(zip(keys.values(), results[0]))
+        state = {k: (json.loads(v) if v else None) for k, v in initial.items()}
+        latest = {key: float(v) for key, v in zip(inputs, results[1]) if v is not None}
+
+        # Transiciones en memoria -> lista de acciones en orden
+        sensors = self.cache['sensors']
+        actions = []
+        for (sensor_id, value, ts), metrics in zip(readings, derived):
+            latest[sensor_id] = value
+            latest.update(metrics)
+            for rule in rules_by_sensor[sensor_id]:
+                redis_key = keys[rule.id]
+                incident, action = transition(state[redis_key], rule, latest, ts)
+                if action is None:
+                    state[redis_key] = incident
+                    continue
+                primary = rule.primary_sensor_id
+                primary_value = latest.get(primary, value)
+                primary_name = sensors.get(primary, {}).get('name', primary)
+                if action == 'CREATE':
+                    logging.info(f"NUEVO INCIDENTE: Regla '{rule.name}' para sensor '{primary_name}'. Valor: {primary_value} {rule.description}")
+                elif action == 'UPDATE':
+                    logging.debug(f"INCIDENTE ACTIVO: Regla '{rule.name}'. Valor: {primary_value}")
+                else:
+                    logging.info(f"INCIDENTE RESUELTO: Regla '{rule.name}' para sensor '{primary_name}'. Valor: {primary_value}")
+                # RESOLVE necesita el incidente abierto (event_id/table), no el nuevo estado vacío
+                actions.append((action, redis_key, incident or state[redis_key], rule, primary, primary_value))
+                state[redis_key] = incident
+
+        if actions and not self.write_events(actions):
+            return False
+        self.windows.update(staged)
+
+        changed, deleted = {}, []
+        for redis_key, incident in state.items():
+            if incident:
+                data = json.dumps(incident)
+                if data != initial[redis_key]:
+                    changed[redis_key] = data
+            elif initial[redis_key]:
+                deleted.append(redis_key)
+        self.pending_state = (changed, deleted, batch_values)
+        return True
+
+    def write_state(self):
+        """Aplica el estado de incidentes y los últimos valores del lote persistido (idempotente)."""
+        if self.pending_state is None:
+            return
+        changed, deleted, latest_values = self.pending_state
+        pipe = self.redis_client.pipeline(transaction=False)
+        if changed:
+            pipe.mset(changed)
+        if deleted:
+            pipe.delete(*deleted)
+        pipe.hset(config.LATEST_VALUES_KEY, mapping=latest_values)
+        pipe.execute()
+        self.pending_state = None
+
+    def finish_batch(self):
+        """Cierra el lote persistido: estado en Redis y luego confirmación en el transporte."""
+        self.write_state()
+        if self.committed:
+            self.transport.ack(self.committed)
+            self.committed = []
+
+    def update_windows(self, sensor_id, value, ts, staged):
+        """
+        Agrega la lectura a las ventanas del sensor; devuelve {clave de métrica: valor o None}.
+        Trabaja sobre copias guardadas en `staged` ((sensor_id, segundos) -> RingWindow) que
+        evaluate_batch publica en self.windows solo si el lote se persiste.
+        """
+        metrics = {}
+        for window, names in self.cache.get('windows_by_sensor', {}).get(sensor_id, {}).items():
+            key = (sensor_id, window)
+            ring = staged.get(key)
+            if ring is None:
+                current = self.windows.get(key)
+                ring = current.copy() if current is not None else RingWindow(window, config.RING_BUFFER_SIZE)
+                staged[key] = ring
+            ring.push(ts, value)
+            for name in names:
+                metrics[input_key(sensor_id, name, window)] = ring.metric(name)
+        return metrics
+
+    def write_events(self, actions):
+        """
+        Ejecuta todas las acciones del lote (CREATE/UPDATE/RESOLVE) en una sola transacción.
+        Un CREATE completa su dict de incidente con event_id/table, así un UPDATE o RESOLVE
+        posterior del mismo lote ya apunta al evento recién insertado.
+        Los UPDATE no se escriben uno por uno: se acumulan por evento (último valor, cantidad,
+        pico) durante EVENT_UPDATE_COALESCE_MS y salen como una sola sentencia; un RESOLVE
+        del mismo evento absorbe lo acumulado.
+        """
+        now = time.monotonic()
+        if all(action == 'UPDATE' for action, *_ in actions):
+            # Caso típico de un incidente sostenido: solo se acumula, sin ir a la BD
+            for _, _, incident, _, _, value in actions:
+                self.accumulate_update(self.pending_updates, incident, value, now)
+            self.flush_pending_updates()
+            return True
+        # Se trabaja sobre una copia: si la transacción falla el lote se reintenta sin duplicar conteos
+        pending = {key: dict(acc) for key, acc in self.pending_updates.items()}
+        connection = db.acquire()
+        if not connection: return False
         try:
-            threshold = float(threshold)
-            value = float(value)
-        except (ValueError, TypeError):
-            logging.warning(f"No se pudo convertir el valor o el umbral a número. Valor: {value}, Umbral: {threshold}")
-            return False, ""
-
-        op = condition['operator']
-        triggered = False
-        if op == '>' and value > threshold: triggered = True
-        elif op == '<' and value < threshold: triggered = True
-        elif op == '==' and value == threshold: triggered = True
-        
-        return triggered, f"(Umbral: {op} {threshold})"
-
-    def find_policy_by_id(self, policy_id):
-        for scope_policies in self.cache.get('policies', {}).values():
-            for policy in scope_policies:
-                if policy['id'] == policy_id:
-                    return policy
-        return None
-
-    def calculate_absolute_threshold(self, policy, sensor_info, threshold_key):
-        v = policy.get(threshold_key)
-        if v is None: return None
-        if policy['alert_mode'] == 'ABS': return float(v)
-        
-        smin = float(sensor_info.get('min_value') or 0.0)
-        smax = float(sensor_info.get('max_value') or 1.0)
-        span = max(0.0, smax - smin)
-        return smin + float(v) * span
-
-    def manage_event_db(self, action, **kwargs):
-        connection = db.get_db_connection()
-        if not connection: return
-        try:
+            connection.begin()
             with connection.cursor() as cursor:
                 local_now = datetime.now(self.local_tz)
+                for action, redis_key, incident, rule, sensor_id, value in actions:
+                    if action == 'CREATE':
+                        self.insert_event(cursor, incident, rule, sensor_id, value, local_now)
+                    elif action == 'UPDATE':
+                        self.accumulate_update(pending, incident, value, now)
+                    elif action == 'RESOLVE':
+                        acc = pending.pop((incident['table'], incident['event_id']), None)
+                        if acc:
+                            query = f"UPDATE {incident['table']} SET is_active = FALSE, resolved_at = %s, `last_value` = %s, update_count = update_count + %s, peak_value = GREATEST(peak_value, %s) WHERE id = %s"
+                            cursor.execute(query, (local_now, value, acc['count'], acc['peak'], incident['event_id']))
+                        else:
+                            query = f"UPDATE {incident['table']} SET is_active = FALSE, resolved_at = %s, `last_value` = %s WHERE id = %s"
+                            cursor.execute(query, (local_now, value, incident['event_id']))
+                self.write_due_updates(cursor, pending, now)
+            connection.commit()
+            self.pending_updates = pending
+            return True
+        except Exception as e:
+            logging.exception(f"Error gestionando {len(actions)} eventos en la BD: {e}")
+            try:
+                connection.rollback()
+            except Exception:
+                pass  # conexión caída: release() la descarta
+            return False
+        finally:
+            db.release(connection)
 
-                if action == 'CREATE':
-                    rule = kwargs['rule']
-                    severity = rule['severity']
-                    table_name = "events_alarm" if severity == 'CRITICAL' else "events_warning"
-                    
-                    if table_name == "events_alarm":
-                        query = f"""
-                            INSERT INTO {table_name} 
-                            (sensor_id, rule_id, started_at, triggering_value, peak_value, `last_value`, description, is_active, update_count, severity, notified)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, TRUE, 1, %s, FALSE)
-                        """
-                        # Asignamos una severidad por defecto si no viene en la regla
-                        alarm_severity = rule.get('severity', 'CRITICAL')
-                        params = (
-                            kwargs['sensor_id'], rule['id'], local_now, kwargs['value'], kwargs['value'], kwargs['value'],
-                            f"Incidente iniciado por la regla '{rule['name']}'.", alarm_severity
-                        )
-                    else: # events_warning
-                        # --- INICIO DE LA CORRECCIÓN ---
-                        query = f"""
-                            INSERT INTO {table_name}
-                            (sensor_id, rule_id, started_at, triggering_value, peak_value, `last_value`, description, is_active, update_count, acknowledged)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, TRUE, 1, FALSE)
-                        """
-                        params = (
-                            kwargs['sensor_id'], rule['id'], local_now, kwargs['value'], kwargs['value'], kwargs['value'],
-                            f"Incidente iniciado por la regla '{rule['name']}'."
-                        )
-                        # --- FIN DE LA CORRECCIÓN ---
-
-                    cursor.execute(query, params)
-                    event_id = cursor.lastrowid
-                    
-                    incident_data = json.dumps({'status': 'FIRING', 'event_id': event_id, 'table': table_name})
-                    self.redis_client.set(kwargs['redis_key'], incident_data)
-                    logging.info(f"Creado nuevo incidente ID {event_id} en tabla {table_name}.")
+    @staticmethod
+    def accumulate_update(pending, incident, value, now):
+        key = (incident['table'], incident['event_id'])
+        acc = pending.get(key)
+        if acc is None:
+            pending[key] = {'last': value, 'count': 1, 'peak': value, 'since': now}
+        else:
+            acc['last'] = value
+            acc['count'] += 1
+            acc['peak'] = max(acc['peak'], value)
 
-                elif action == 'UPDATE':
-                    active_incident = json.loads(kwargs['active_incident_json'])
-                    event_id, table_name, value = active_incident['event_id'], active_incident['table'], kwargs['value']
-                    query = f"UPDATE {table_name} SET `last_value` = %s, update_count = update_count + 1, peak_value = GREATEST(peak_value, %s) WHERE id = %s"
-                    cursor.execute(query, (value, value, event_id))
-
-                elif action == 'RESOLVE':
-                    active_incident = json.loads(kwargs['active_incident_json'])
-                    event_id, table_name, value = active_incident['event_id'], active_incident['table'], kwargs['value']
-                    query = f"UPDATE {table_name} SET is_active = FALSE, resolved_at = %s, `last_value` = %s WHERE id = %s"
-                    cursor.execute(query, (local_now, value, event_id))
-                    self.redis_client.delete(kwargs['redis_key'])
-            
+    @staticmethod
+    def write_due_updates(cursor, pending, now, force=False):
+        """Escribe (y quita de `pending`) los UPDATE acumulados cuya ventana ya venció."""
+        window = config.EVENT_UPDATE_COALESCE_MS / 1000.0
+        for key in [k for k, acc in pending.items() if force or now - acc['since'] >= window]:
+            table, event_id = key
+            acc = pending.pop(key)
+            query = f"UPDATE {table} SET `last_value` = %s, update_count = update_count + %s, peak_value = GREATEST(peak_value, %s) WHERE id = %s"
+            cursor.execute(query, (acc['last'], acc['count'], acc['peak'], event_id))
+
+    def flush_pending_updates(self, force=False):
+        """Vacía la ventana de UPDATE aunque no lleguen más acciones (bucle principal / apagado)."""
+        if not self.pending_updates:
+            return
+        now = time.monotonic()
+        window = config.EVENT_UPDATE_COALESCE_MS / 1000.0
+        if not force and all(now - acc['since'] < window for acc in self.pending_updates.values()):
+            return
+        pending = {key: dict(acc) for key, acc in self.pending_updates.items()}
+        connection = db.acquire()
+        if not connection: return
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                self.write_due_updates(cursor, pending, now, force)
             connection.commit()
+            self.pending_updates = pending
         except Exception as e:
-            logging.exception(f"Error gestionando evento en la BD: {e}")
-            connection.rollback()
+            logging.exception(f"Error escribiendo actualizaciones de eventos acumuladas: {e}")
+            try:
+                connection.rollback()
+            except Exception:
+                pass
         finally:
-            connection.close()
+            db.release(connection)
+
+    def insert_event(self, cursor, incident, rule, sensor_id, value, local_now):
+        severity = rule.severity
+        table_name = "events_alarm" if severity == 'CRITICAL' else "events_warning"
+
+        if table_name == "events_alarm":
+            query = f"""
+                INSERT INTO {table_name} 
+                (sensor_id, rule_id, started_at, triggering_value, peak_value, `last_value`, description, is_active, update_count, severity, notified)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, TRUE, 1, %s, FALSE)
+            """
+            # Asignamos una severidad por defecto si no viene en la regla
+            alarm_severity = rule.severity or 'CRITICAL'
+            params = (
+                sensor_id, rule.id, local_now, value, value, value,
+                f"Incidente iniciado por la regla '{rule.name}'.", alarm_severity
+            )
+        else: # events_warning
+            query = f"""
+                INSERT INTO {table_name}
+                (sensor_id, rule_id, started_at, triggering_value, peak_value, `last_value`, description, is_active, update_count, acknowledged)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, TRUE, 1, FALSE)
+            """
+            params = (
+                sensor_id, rule.id, local_now, value, value, value,
+                f"Incidente iniciado por la regla '{rule.name}'."
+            )
+
+        cursor.execute(query, params)
+        incident.update({'status': 'FIRING', 'event_id': cursor.lastrowid, 'table': table_name})
+        logging.info(f"Creado nuevo incidente ID {cursor.lastrowid} en tabla {table_name}.")
 
     def run(self):
         logging.info("Iniciando worker del motor de reglas...")
+        entries = []
+        retry_delay = 0
         while True:
             try:
+                # Un lote ya persistido se cierra antes de leer otro: el siguiente lee ese estado
+                self.finish_batch()
                 self.sync_configuration()
-                message_json = self.redis_client.brpop(config.REDIS_QUEUE_NAME, timeout=5)
-                if message_json:
-                    _, message_data = message_json
-                    message = json.loads(message_data)
-                    self.evaluate(message)
+                self.flush_pending_updates()
+                entries = self.transport.read(config.WORKER_BATCH_SIZE, block_ms=config.WORKER_BLOCK_MS)
+                if not entries:
+                    continue
+                messages = []
+                for _, entry_id, message_data in entries:
+                    if message_data is None:
+                        continue  # entrada recortada del stream: solo se confirma
+                    try:
+                        messages.append(decode(message_data))
+                    except Exception as e:
+                        logging.error(f"Mensaje {entry_id} ilegible, se descarta: {e}")
+                # Confirmar solo si el lote se evaluó y persistió; si no, se relee el mismo lote
+                # antes que las entradas nuevas (un sensor no avanza sobre lecturas sin evaluar).
+                # Persistido, el lote ya no se reevalúa: si Redis falla, solo se repite finish_batch
+                if self.evaluate_batch(messages):
+                    self.committed, entries = entries, []
+                    retry_delay = 0
+                    self.finish_batch()
+                else:
+                    self.transport.retry(entries)
+                    retry_delay = min(max(0.5, retry_delay * 2), 5)
+                    logging.warning(f"Lote de {len(entries)} mensajes sin persistir. Reintento en {retry_delay}s.")
+                    time.sleep(retry_delay)
             except redis.exceptions.ConnectionError as e:
                 logging.error(f"Error de conexión con Redis: {e}. Reintentando...")
+                self.transport.retry(entries)
                 time.sleep(5)
+            except KeyboardInterrupt:
+                try:
+                    self.finish_batch()
+                except redis.exceptions.RedisError as e:
+                    logging.error(f"No se pudo cerrar el último lote en Redis: {e}")
+                self.flush_pending_updates(force=True)
+                db.get_pool().close_all()
+                raise
             except Exception as e:
                 logging.exception(f"Error inesperado en el bucle principal del worker: {e}")
+                self.transport.retry(entries)
                 time.sleep(5)
 
 if __name__ == '__main__':
@@ -3,8 +3,14 @@ import redis
 import time
 import json
 import logging
-from threading import Thread, Event
+from threading import Thread, Event, Lock
 from . import config, db
+from .codec import get_encoder
+from .transport import make_transport
+from .payload import parse_batch
+from .topic_router import TopicRouter
+
+SENSOR_TOPICS_SQL = "SELECT id, mqtt_topic, station_id, is_active, updated_at FROM sensorhub_sensor WHERE TRUE"
 
 log_level = getattr(logging, config.LOG_LEVEL, logging.INFO)
 logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - [TopicManager] - %(message)s')
@@ -13,50 +19,216 @@ class TopicManager:
     def __init__(self):
         self.mqtt_client = mqtt.Client(client_id=config.MQTT_CLIENT_ID_MANAGER)
         self.redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
-        self.topic_map = {}
+        self.router = TopicRouter(config.BATCH_TOPIC_LEVEL)
+        self.subscribed_topics = set()
         self.stop_event = Event()
+        # Sensores conocidos y marca de updated_at para leer solo deltas
+        self.sensor_rows = {}
+        self.sensors_watermark = None
+        self.last_full_sync = 0.0
+        self.changed_sensor_ids = set()
+        self.sync_lock = Lock()
+        self.sync_wake = Event()
+        # on_connect (hilo de paho) y SyncThread pueden sincronizar a la vez
+        self.topics_lock = Lock()
+
+        # Buffer local: on_message solo agrega (sensor_id, valor, ts, tópico, recibido_en);
+        # el hilo de flush lo envía a Redis con un pipeline de LPUSH multi-valor.
+        self.encode = get_encoder(config.QUEUE_CODEC)
+        self.transport = make_transport(self.redis_client)
+        self.buffer = []
+        self.buffer_lock = Lock()
+        self.flush_wake = Event()
+        # Métricas: latencia de cola = recepción MQTT -> LPUSH confirmado
+        self.pushed = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logging.info("Conectado exitosamente al broker MQTT.")
-            self.sync_topics()
+            # Sesión nueva: hay que reenviar todas las suscripciones
+            self.subscribed_topics = set()
+            self.sync_topics(force=True)
         else:
             logging.error(f"Fallo al conectar al broker MQTT, código: {rc}")
 
     def on_message(self, client, userdata, msg):
+        router = self.router
+        sensor_id = router.resolve(msg.topic)
+        if sensor_id is None:
+            parent = router.batch_parent(msg.topic)
+            if parent is not None:
+                self.on_batch_message(msg, router, parent)
+            return
         try:
             topic = msg.topic
             payload = msg.payload.decode('utf-8')
             logging.debug(f"Mensaje recibido en {topic} -> {payload}")
-            sensor_id = self.topic_map.get(topic)
             if sensor_id:
-                message_data = {
-                    'sensor_id': sensor_id,
-                    'value': float(payload),
-                    'topic': topic,
-                    'timestamp': time.time()
-                }
-                self.redis_client.lpush(config.REDIS_QUEUE_NAME, json.dumps(message_data))
+                self.buffer_readings([(sensor_id, float(payload), time.time(), topic, time.monotonic())])
         except (ValueError, UnicodeDecodeError) as e:
             logging.error(f"Error al procesar mensaje de {msg.topic}: {e}")
         except Exception as e:
             logging.error(f"Error inesperado en on_message: {e}")
 
-    def sync_topics(self):
-        logging.info("Iniciando sincronización de tópicos...")
-        connection = db.get_db_connection()
+    def on_batch_message(self, msg, router, parent):
+        """Lote de una estación: se decodifica en una pasada y se encola con un solo LPUSH."""
+        try:
+            readings = parse_batch(msg.payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            logging.error(f"Error al procesar lote de {msg.topic}: {e}")
+            return
+
+        now = time.time()
+        received = time.monotonic()
+        items = []
+        for key, ts, value in readings:
+            sensor_id = router.resolve_in_batch(parent, key)
+            if sensor_id:
+                items.append((sensor_id, value, ts if ts is not None else now, msg.topic, received))
+        if items:
+            self.buffer_readings(items)
+
+    def buffer_readings(self, items):
+        """Agrega lecturas al buffer local sin tocar Redis (no bloquea el hilo de red de paho)."""
+        with self.buffer_lock:
+            self.buffer.extend(items)
+            overflow = len(self.buffer) - config.ENQUEUE_MAX_BUFFER
+            if overflow > 0:
+                # Redis no da abasto: se descartan las lecturas más antiguas
+                del self.buffer[:overflow]
+                self.dropped += overflow
+            size = len(self.buffer)
+        if size >= config.ENQUEUE_BATCH_SIZE:
+            self.flush_wake.set()
+
+    def flush_buffer(self):
+        """Envía el buffer en un pipeline (LIST: LPUSH multi-valor por bloque; STREAM: XADD por lectura)."""
+        with self.buffer_lock:
+            items, self.buffer = self.buffer, []
+        if not items:
+            return True
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            self.transport.publish(pipe, [(sid, self.encode(sid, value, ts, topic)) for sid, value, ts, topic, _ in items])
+            pipe.execute()
+        except Exception as e:
+            self.failed_flushes += 1
+            logging.error(f"Error encolando {len(items)} lecturas en Redis: {e}")
+            with self.buffer_lock:
+                # Reintentar en el próximo flush conservando el orden
+                self.buffer[:0] = items
+                overflow = len(self.buffer) - config.ENQUEUE_MAX_BUFFER
+                if overflow > 0:
+                    del self.buffer[:overflow]
+                    self.dropped += overflow
+            return False
+
+        pushed_at = time.monotonic()
+        for item in items:
+            latency = pushed_at - item[4]
+            self.latency_sum += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+        self.latency_count += len(items)
+        self.pushed += len(items)
+        return True
+
+    def log_queue_metrics(self):
+        avg_ms = (self.latency_sum / self.latency_count * 1000) if self.latency_count else 0.0
+        logging.info(
+            f"Cola de reglas: encoladas={self.pushed}, buffer={len(self.buffer)}, descartadas={self.dropped}, "
+            f"flush fallidos={self.failed_flushes}, latencia MQTT->LPUSH media={avg_ms:.1f} ms máx={self.latency_max * 1000:.1f} ms"
+        )
+        # Ventana nueva para la latencia
+        self.latency_sum, self.latency_max, self.latency_count = 0.0, 0.0, 0
+
+    def flush_loop(self):
+        interval = config.ENQUEUE_FLUSH_MS / 1000.0
+        last_stats = time.monotonic()
+        while not self.stop_event.is_set():
+            self.flush_wake.wait(interval)
+            self.flush_wake.clear()
+            if not self.flush_buffer():
+                self.stop_event.wait(1)
+            if time.monotonic() - last_stats >= config.QUEUE_STATS_INTERVAL:
+                self.log_queue_metrics()
+                last_stats = time.monotonic()
+        self.flush_buffer()
+
+    def load_sensor_changes(self, cursor):
+        """
+        Actualiza self.sensor_rows. Lectura completa al inicio y cada SYNC_FULL_RECONCILE_TOPICS
+        (cubre bajas físicas sin aviso); si no, solo los sensores con updated_at >= la última
+        marca más los avisados por el change-feed. Devuelve True si cambió algo.
+        """
+        with self.sync_lock:
+            changed_ids, self.changed_sensor_ids = self.changed_sensor_ids, set()
+        now = time.monotonic()
+        if self.sensors_watermark is None or now - self.last_full_sync >= config.SYNC_FULL_RECONCILE_TOPICS:
+            # La marca se lee antes que los datos: una edición concurrente quedará en el próximo delta
+            cursor.execute("SELECT MAX(updated_at) AS ts FROM sensorhub_sensor")
+            watermark = cursor.fetchone()['ts']
+            cursor.execute(SENSOR_TOPICS_SQL + " AND is_active = TRUE AND mqtt_topic IS NOT NULL AND mqtt_topic != ''")
+            rows = {row['id']: row for row in cursor.fetchall()}
+            changed = rows.keys() != self.sensor_rows.keys() or any(
+                self.sensor_rows[sid]['mqtt_topic'] != row['mqtt_topic'] or self.sensor_rows[sid]['station_id'] != row['station_id']
+                for sid, row in rows.items())
+            self.sensor_rows = rows
+            self.sensors_watermark = watermark
+            self.last_full_sync = now
+            return changed
+
+        if changed_ids:
+            cursor.execute(SENSOR_TOPICS_SQL + " AND (updated_at >= %s OR id IN %s)", (self.sensors_watermark, tuple(changed_ids)))
+        else:
+            cursor.execute(SENSOR_TOPICS_SQL + " AND updated_at >= %s", (self.sensors_watermark,))
+        rows = cursor.fetchall()
+        changed = False
+        for row in rows:
+            changed_ids.discard(row['id'])
+            old = self.sensor_rows.get(row['id'])
+            if row['is_active'] and row['mqtt_topic']:
+                if not old or old['mqtt_topic'] != row['mqtt_topic'] or old['station_id'] != row['station_id']:
+                    self.sensor_rows[row['id']] = row
+                    changed = True
+            elif old:
+                del self.sensor_rows[row['id']]
+                changed = True
+            if row['updated_at'] is not None and (self.sensors_watermark is None or row['updated_at'] > self.sensors_watermark):
+                self.sensors_watermark = row['updated_at']
+        # Avisados que ya no existen: borrados
+        for sensor_id in changed_ids:
+            if self.sensor_rows.pop(sensor_id, None) is not None:
+                changed = True
+        return changed
+
+    def sync_topics(self, force=False):
+        with self.topics_lock:
+            self._sync_topics(force)
+
+    def _sync_topics(self, force):
+        logging.debug("Iniciando sincronización de tópicos...")
+        connection = db.acquire()
         if not connection: return
         try:
             with connection.cursor() as cursor:
-                query = "SELECT id, mqtt_topic FROM sensorhub_sensor WHERE mqtt_topic IS NOT NULL AND mqtt_topic != '' AND is_active = TRUE"
-                cursor.execute(query)
-                results = cursor.fetchall()
+                changed = self.load_sensor_changes(cursor)
         finally:
-            connection.close()
+            db.release(connection)
+        if not changed and not force:
+            return
 
-        new_topic_map = {row['mqtt_topic']: row['id'] for row in results}
-        current_topics = set(self.topic_map.keys())
-        new_topics = set(new_topic_map.keys())
+        router = TopicRouter.build(self.sensor_rows.values(), config.BATCH_TOPIC_LEVEL)
+        if config.MQTT_WILDCARD_SUBSCRIPTIONS:
+            new_topics = set(router.wildcard_subscriptions)
+        else:
+            new_topics = set(router.exact_subscriptions)
+        current_topics = self.subscribed_topics
         topics_to_subscribe = new_topics - current_topics
         topics_to_unsubscribe = current_topics - new_topics
 
@@ -69,15 +241,47 @@ class TopicManager:
             logging.info(f"Desuscribiendo de {len(topics_to_unsubscribe)} tópicos obsoletos.")
             self.mqtt_client.unsubscribe(list(topics_to_unsubscribe))
 
-        self.topic_map = new_topic_map
-        logging.info(f"Sincronización completada. {len(self.topic_map)} tópicos activos.")
+        self.router = router
+        self.subscribed_topics = new_topics
+        logging.info(f"Sincronización completada. {len(router.by_topic)} tópicos de sensor, {len(new_topics)} suscripciones.")
+
+    def config_listener(self):
+        """Escucha el change-feed de Django: un cambio de sensor dispara la sincronización al instante."""
+        while not self.stop_event.is_set():
+            try:
+                pubsub = self.redis_client.pubsub()
+                pubsub.subscribe(config.CONFIG_CHANGES_CHANNEL)
+                for message in pubsub.listen():
+                    if message['type'] == 'subscribe':
+                        # (Re)conexión: lo publicado mientras tanto se perdió, forzar lectura completa
+                        self.last_full_sync = 0.0
+                        self.sync_wake.set()
+                        continue
+                    if message['type'] != 'message':
+                        continue
+                    data = json.loads(message['data'])
+                    if data.get('model') == 'sensor':
+                        with self.sync_lock:
+                            self.changed_sensor_ids.add(data['id'])
+                        self.sync_wake.set()
+            except Exception as e:
+                logging.error(f"Change-feed de configuración no disponible: {e}. Reintentando en 5s.")
+                self.stop_event.wait(5)
 
     def sync_loop(self):
         while not self.stop_event.is_set():
-            self.sync_topics()
-            self.stop_event.wait(config.SYNC_INTERVAL_TOPICS)
+            try:
+                self.sync_topics()
+            except Exception as e:
+                logging.exception(f"Error sincronizando tópicos: {e}")
+            self.sync_wake.wait(config.SYNC_INTERVAL_TOPICS)
+            self.sync_wake.clear()
 
     def run(self):
+        if config.UNIFIED_INGEST:
+            # Evita encolar cada lectura dos veces (subscriber + TopicManager)
+            logging.warning("UNIFIED_INGEST activo: el subscriber alimenta la cola de reglas. TopicManager no se inicia.")
+            return
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
         if config.MQTT_USERNAME and config.MQTT_PASSWORD:
@@ -92,7 +296,17 @@ class TopicManager:
         sync_thread = Thread(target=self.sync_loop)
         sync_thread.daemon = True
         sync_thread.start()
-        self.mqtt_client.loop_forever()
+        config_thread = Thread(target=self.config_listener, name="ConfigListener")
+        config_thread.daemon = True
+        config_thread.start()
+        flush_thread = Thread(target=self.flush_loop, name="FlushThread")
+        flush_thread.daemon = True
+        flush_thread.start()
+        try:
+            self.mqtt_client.loop_forever()
+        finally:
+            self.stop_event.set()
+            flush_thread.join(timeout=5)
 
 if __name__ == '__main__':
     manager = TopicManager()
@@ -0,0 +1,103 @@
+# Mismo enrutado que auralis-subscriber (router.py): hash sobre el tópico normalizado
+# y suscripciones por estación con comodines, en lugar de un SUBSCRIBE por sensor.
+
+TOPIC_WILDCARDS = ('{}/#', '/{}/#')  # cubre las variantes con y sin slash inicial/final
+
+
+def normalize(topic):
+    """'/Sacha53/Motor_Current/' y 'Sacha53/Motor_Current' -> 'Sacha53/Motor_Current'"""
+    return topic.strip('/')
+
+
+def common_parent(norm_topics):
+    parents = [t.split('/')[:-1] for t in norm_topics]
+    common = parents[0]
+    for levels in parents[1:]:
+        n = 0
+        for a, b in zip(common, levels):
+            if a != b:
+                break
+            n += 1
+        common = common[:n]
+        if not common:
+            break
+    return '/'.join(common)
+
+
+def minimal_prefixes(prefixes):
+    """Descarta prefijos contenidos en otro más corto (evita suscripciones solapadas)."""
+    kept = set()
+    for p in sorted(prefixes, key=lambda x: x.count('/')):
+        levels = p.split('/')
+        if not any('/'.join(levels[:i]) in kept for i in range(1, len(levels))):
+            kept.add(p)
+    return kept
+
+
+def batch_topic_for(sensor_topic, level):
+    """'/Sacha53/Motor_Current/' -> '/Sacha53/_batch/'"""
+    parts = sensor_topic.split('/')
+    for i in range(len(parts) - 1, -1, -1):
+        if parts[i]:
+            parts[i] = level
+            break
+    return '/'.join(parts)
+
+
+class TopicRouter:
+    """
+    Resuelve tópico -> sensor_id y calcula las suscripciones:
+    dos comodines por estación ('<prefijo>/#', '/<prefijo>/#'), donde el prefijo es el
+    padre común de los tópicos de sus sensores; los sensores sin padre común van exactos.
+    """
+    def __init__(self, batch_level='_batch'):
+        self.batch_level = batch_level
+        self.by_topic = {}
+        self.sensor_ids = set()
+        self.wildcard_subscriptions = set()
+        self.exact_subscriptions = set()
+
+    @classmethod
+    def build(cls, rows, batch_level='_batch'):
+        """rows: dicts con 'id', 'mqtt_topic' y 'station_id'"""
+        router = cls(batch_level)
+        by_station = {}
+        raw_by_norm = {}
+        for row in rows:
+            norm = normalize(row['mqtt_topic'] or '')
+            if not norm:
+                continue
+            router.by_topic[norm] = row['id']
+            router.sensor_ids.add(row['id'])
+            raw_by_norm[norm] = row['mqtt_topic']
+            by_station.setdefault(row['station_id'], []).append(norm)
+
+        candidates, loose = set(), []
+        for norm_topics in by_station.values():
+            prefix = common_parent(norm_topics)
+            if prefix:
+                candidates.add(prefix)
+            else:
+                loose.extend(norm_topics)
+
+        for p in minimal_prefixes(candidates):
+            router.wildcard_subscriptions.update(w.format(p) for w in TOPIC_WILDCARDS)
+        for norm in loose:
+            router.wildcard_subscriptions.add(raw_by_norm[norm])
+            router.wildcard_subscriptions.add(batch_topic_for(raw_by_norm[norm], batch_level))
+
+        router.exact_subscriptions = set(raw_by_norm.values())
+        router.exact_subscriptions.update(batch_topic_for(t, batch_level) for t in raw_by_norm.values())
+        return router
+
+    def resolve(self, topic):
+        return self.by_topic.get(normalize(topic))
+
+    def batch_parent(self, topic):
+        parent, _, level = normalize(topic).rpartition('/')
+        return parent if level == self.batch_level else None
+
+    def resolve_in_batch(self, parent, key):
+        if isinstance(key, int):
+            return key if key in self.sensor_ids else None
+        return self.by_topic.get(f"{parent}/{key}" if parent else str(key))
@@ -0,0 +1,183 @@
+import time
+import logging
+import redis
+from . import config
+
+# Transporte de la cola de reglas entre productores (TopicManager / subscriber) y RuleWorker.
+#   list   : una LIST con LPUSH/BRPOP (comportamiento original; un mensaje se pierde si el
+#            worker muere tras sacarlo y varios workers pueden desordenar un mismo sensor).
+#   stream : N streams particionados por sensor_id % N con un grupo de consumidores.
+#            Cada partición la consume un único worker (partición % RULE_WORKER_COUNT ==
+#            RULE_WORKER_INDEX % RULE_WORKER_COUNT), así se conserva el orden por sensor;
+#            los mensajes se confirman con XACK después de evaluarlos y los pendientes de
+#            un consumidor caído se recuperan con XAUTOCLAIM (Redis >= 6.2).
+# Si un lote no se pudo evaluar, el worker llama a retry(): la siguiente lectura devuelve ese
+# mismo lote antes que cualquier entrada nueva (stream: se relee la PEL propia desde el id 0;
+# list: el lote queda en memoria, ya que BRPOP/RPOP lo sacaron de la cola).
+# Las reentregas se descartan por id de entrada: el stream recuerda los últimos ids confirmados
+# (STREAM_ACKED_MEMORY) y, si vuelven a leerse, solo los confirma de nuevo sin devolverlos. En
+# LIST no hay ids ni reentregas: un mensaje sale de la cola una sola vez.
+
+FIELD = 'd'
+
+
+class ListTransport:
+    def __init__(self, client):
+        self.client = client
+        self.queue_name = config.REDIS_QUEUE_NAME
+        self._retry = []
+
+    def publish(self, pipe, items):
+        """items: [(sensor_id, mensaje codificado)] en orden de llegada; se agrega al pipeline."""
+        for i in range(0, len(items), config.ENQUEUE_BATCH_SIZE):
+            chunk = items[i:i + config.ENQUEUE_BATCH_SIZE]
+            pipe.lpush(self.queue_name, *[data for _, data in chunk])
+
+    def read(self, count, block_ms):
+        """Devuelve [(origen, id, datos)]; en LIST no hay confirmación, id es None."""
+        if self._retry:
+            return self._retry
+        first = self.client.brpop(self.queue_name, timeout=max(1, block_ms // 1000))
+        if not first:
+            return []
+        out = [(self.queue_name, None, first[1])]
+        if count > 1:
+            rest = self.client.rpop(self.queue_name, count - 1)
+            out.extend((self.queue_name, None, data) for data in rest or [])
+        return out
+
+    def ack(self, entries):
+        self._retry = []
+
+    def retry(self, entries):
+        self._retry = list(entries)
+
+
+class StreamTransport:
+    def __init__(self, client, worker_index=None, worker_count=None):
+        self.client = client
+        self.partitions = max(1, config.STREAM_PARTITIONS)
+        self.streams = [f"{config.STREAM_PREFIX}:{p}" for p in range(self.partitions)]
+        self.group = config.STREAM_GROUP
+        index = config.RULE_WORKER_INDEX if worker_index is None else worker_index
+        count = max(1, config.RULE_WORKER_COUNT if worker_count is None else worker_count)
+        # Nombre de consumidor estable: al reiniciar, el worker recupera sus propios pendientes
+        self.consumer = f"worker-{index}"
+        self.owned = [s for p, s in enumerate(self.streams) if p % count == index % count]
+        self._recovering = {}
+        # (stream, id) confirmados recientemente, en orden de confirmación (dict acotado)
+        self._acked = {}
+        self._last_claim = 0.0
+        self._groups_ready = False
+
+    def stream_for(self, sensor_id):
+        return self.streams[int(sensor_id) % self.partitions]
+
+    def publish(self, pipe, items):
+        for sensor_id, data in items:
+            pipe.xadd(self.stream_for(sensor_id), {FIELD: data},
+                      maxlen=config.STREAM_MAXLEN, approximate=True)
+
+    def ensure_groups(self):
+        for stream in self.owned:
+            try:
+                self.client.xgroup_create(stream, self.group, id='0', mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+        # Primero se releen los pendientes propios (entregados y sin XACK antes de un reinicio)
+        self.rewind()
+        self._groups_ready = True
+        logging.info(f"Streams: consumidor {self.consumer} del grupo '{self.group}', particiones {self.owned}")
+
+    def read(self, count, block_ms):
+        """Devuelve [(stream, id, datos)]; datos es None si la entrada ya fue recortada (solo confirmar)."""
+        if not self._groups_ready:
+            self.ensure_groups()
+
+        if self._recovering:
+            reply = self.client.xreadgroup(self.group, self.consumer, dict(self._recovering), count=count)
+            entries = self._flatten(reply)
+            seen = {stream for stream, _, _ in entries}
+            for stream in list(self._recovering):
+                if stream not in seen:
+                    del self._recovering[stream]
+            for stream, entry_id, _ in entries:
+                self._recovering[stream] = entry_id
+            if entries:
+                return self._unseen(entries)
+
+        if time.monotonic() - self._last_claim >= config.STREAM_CLAIM_INTERVAL:
+            self._last_claim = time.monotonic()
+            claimed = self.reclaim(count)
+            if claimed:
+                return self._unseen(claimed)
+
+        reply = self.client.xreadgroup(self.group, self.consumer, {s: '>' for s in self.owned},
+                                       count=count, block=block_ms)
+        return self._unseen(self._flatten(reply))
+
+    def rewind(self):
+        self._recovering = {s: '0' for s in self.owned}
+
+    def retry(self, entries):
+        """El lote quedó sin XACK: se relee la PEL propia antes de pedir entradas nuevas ('>')."""
+        if entries:
+            self.rewind()
+
+    def reclaim(self, count):
+        """Toma los mensajes de sus particiones que otro consumidor dejó sin confirmar."""
+        out = []
+        for stream in self.owned:
+            result = self.client.xautoclaim(stream, self.group, self.consumer,
+                                            min_idle_time=config.STREAM_CLAIM_IDLE_MS,
+                                            start_id='0-0', count=count)
+            out.extend(self._flatten([(stream, result[1])]))
+        if out:
+            logging.warning(f"Streams: {len(out)} mensajes pendientes reclamados por {self.consumer}.")
+        return out
+
+    def ack(self, entries):
+        by_stream = {}
+        for stream, entry_id, _ in entries:
+            by_stream.setdefault(stream, []).append(entry_id)
+        if not by_stream:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for stream, ids in by_stream.items():
+            pipe.xack(stream, self.group, *ids)
+        pipe.execute()
+        for stream, entry_id, _ in entries:
+            self._acked[(stream, entry_id)] = None
+        while len(self._acked) > config.STREAM_ACKED_MEMORY:
+            del self._acked[next(iter(self._acked))]
+
+    def _unseen(self, entries):
+        """Quita las reentregas de entradas ya confirmadas (y las vuelve a confirmar)."""
+        seen = [entry for entry in entries if (entry[0], entry[1]) in self._acked]
+        if not seen:
+            return entries
+        logging.warning(f"Streams: {len(seen)} entradas ya evaluadas se reentregaron; se descartan.")
+        self.ack(seen)
+        return [entry for entry in entries if (entry[0], entry[1]) not in self._acked]
+
+    @staticmethod
+    def _flatten(reply):
+        out = []
+        for stream, messages in reply or []:
+            if isinstance(stream, bytes):
+                stream = stream.decode()
+            for entry_id, fields in messages:
+                if isinstance(entry_id, bytes):
+                    entry_id = entry_id.decode()
+                data = (fields or {}).get(FIELD.encode()) or (fields or {}).get(FIELD)
+                out.append((stream, entry_id, data))
+        return out
+
+
+def make_transport(client, **kwargs):
+    if config.QUEUE_TRANSPORT == 'stream':
+        return StreamTransport(client, **kwargs)
+    if config.QUEUE_TRANSPORT != 'list':
+        logging.warning(f"QUEUE_TRANSPORT desconocido '{config.QUEUE_TRANSPORT}'. Usando 'list'.")
+    return ListTransport(client)
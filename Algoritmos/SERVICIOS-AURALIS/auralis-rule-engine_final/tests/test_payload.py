@@ -0,0 +1,23 @@
+# Pruebas de decodificación de lotes por estación (sin broker ni Redis).
+# Desde /opt/auralis-rule-engine: venv/bin/python -m unittest discover tests
+
+import json
+import unittest
+
+from src.payload import parse_batch
+
+
+class ParseBatchTests(unittest.TestCase):
+    def test_json_batch(self):
+        self.assertEqual(parse_batch(b'[["Motor_Current", null, 21.3], {"id": 12, "value": "4"}]'),
+                         [('Motor_Current', None, 21.3), (12, None, 4.0)])
+
+    def test_bad_element_types_raise_value_error(self):
+        # on_batch_message solo atrapa ValueError: un TypeError detendría el bucle de paho
+        for item in (['s', None, [1]], ['s', None, {}], [[1], None, 2.0], {'sensor': {}, 'value': 1}, 7):
+            with self.assertRaises(ValueError):
+                parse_batch(json.dumps([item]).encode())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# Pruebas del lote de RuleWorker sin MySQL: Redis en memoria (fakeredis) y write_events simulado.
+# Desde /opt/auralis-rule-engine: venv/bin/python -m unittest discover tests
+
+import json
+import unittest
+from unittest import mock
+
+import redis
+
+try:
+    import fakeredis
+except ImportError:  # solo para pruebas
+    fakeredis = None
+
+from src import config
+from src.ring_buffer import RingWindow
+from src.rule_compiler import compile_rules
+from src.rule_worker import RuleWorker, build_dispatch_index, build_window_index
+from src.transport import StreamTransport
+
+SENSORS = {
+    sid: {'id': sid, 'name': f's{sid}', 'min_value': 0, 'max_value': 100, 'effective_policy': None}
+    for sid in (1, 2)
+}
+
+
+def condition(node_id, sensor_id, op, value):
+    return {'id': node_id, 'rule_id': 7, 'parent_id': 1, 'node_type': 'COND', 'logical_operator': None,
+            'condition_id': node_id, 'condition_name': f'c{node_id}', 'source_sensor_id': sensor_id,
+            'metric_to_evaluate': 'VALUE', 'threshold_type': 'STATIC', 'operator': op,
+            'threshold_config': {'value': value}, 'linked_policy_id': None}
+
+
+# Regla 7: s1 > 50 AND s2 < 10 (incidente identificado por s1)
+NODES = [
+    {'id': 1, 'rule_id': 7, 'parent_id': None, 'node_type': 'OP', 'logical_operator': 'AND',
+     'condition_id': None, 'condition_name': None, 'source_sensor_id': None, 'metric_to_evaluate': None,
+     'threshold_type': None, 'operator': None, 'threshold_config': None, 'linked_policy_id': None},
+    condition(2, 1, '>', 50),
+    condition(3, 2, '<', 10),
+]
+INCIDENT_KEY = 'incident:rule:7:sensor:1'
+
+
+@unittest.skipUnless(fakeredis, "fakeredis no instalado")
+class EvaluateBatchTests(unittest.TestCase):
+    def setUp(self):
+        rules = compile_rules({7: {'id': 7, 'name': 'r7', 'severity': 'CRITICAL'}}, NODES, SENSORS, {})
+        worker = RuleWorker.__new__(RuleWorker)
+        worker.redis_client = fakeredis.FakeRedis(decode_responses=True)
+        worker.cache = {'sensors': SENSORS, 'rules': rules, 'rules_by_sensor': build_dispatch_index(rules),
+                        'windows_by_sensor': build_window_index(rules)}
+        worker.windows = {}
+        worker.pending_updates = {}
+        worker.pending_state = None
+        worker.committed = []
+        worker.transport = mock.Mock()
+        self.actions = []
+        worker.write_events = lambda actions: self.actions.extend(actions) or True
+        self.worker = worker
+
+    def test_batch_reading_sees_stored_value_of_input_arriving_later(self):
+        redis = self.worker.redis_client
+        redis.set(INCIDENT_KEY, json.dumps({'status': 'FIRING', 'event_id': 5, 'table': 'events_alarm'}))
+        redis.hset(config.LATEST_VALUES_KEY, mapping={1: 60.0, 2: 5.0})
+
+        # s2 llega primero: debe evaluarse con el s1 guardado (60), no sin valor de s1
+        self.assertTrue(self.worker.evaluate_batch([
+            {'sensor_id': 2, 'value': 6, 'timestamp': 10.0},
+            {'sensor_id': 1, 'value': 70, 'timestamp': 11.0},
+        ]))
+        self.worker.write_state()
+
+        self.assertEqual([action for action, *_ in self.actions], ['UPDATE', 'UPDATE'])
+        self.assertEqual(json.loads(redis.get(INCIDENT_KEY))['event_id'], 5)
+        self.assertEqual(redis.hgetall(config.LATEST_VALUES_KEY), {'1': '70.0', '2': '6.0'})
+
+    def test_redis_failure_after_commit_retries_only_the_state_write(self):
+        redis_client = self.worker.redis_client
+        redis_client.hset(config.LATEST_VALUES_KEY, mapping={2: 5.0})
+        entries = [('stream:0', '1-0', b'...'), ('stream:0', '2-0', b'...')]
+
+        self.assertTrue(self.worker.evaluate_batch([{'sensor_id': 1, 'value': 70, 'timestamp': 10.0}]))
+        self.worker.committed = entries
+        with mock.patch.object(redis_client, 'pipeline', side_effect=redis.exceptions.ConnectionError):
+            with self.assertRaises(redis.exceptions.ConnectionError):
+                self.worker.finish_batch()
+        # Sin confirmar ni reevaluar: el CREATE no se repite
+        self.worker.transport.ack.assert_not_called()
+        self.assertIsNone(redis_client.get(INCIDENT_KEY))
+
+        self.worker.finish_batch()
+        self.worker.transport.ack.assert_called_once_with(entries)
+        self.assertEqual([action for action, *_ in self.actions], ['CREATE'])
+        self.assertEqual(json.loads(redis_client.get(INCIDENT_KEY))['status'], 'PENDING')
+        self.assertEqual(redis_client.hget(config.LATEST_VALUES_KEY, '1'), '70.0')
+
+
+class RingWindowTests(unittest.TestCase):
+    def test_repeated_reading_counts_and_older_one_is_ignored(self):
+        window = RingWindow(60)
+        self.assertTrue(window.push(10.0, 4.0))
+        self.assertTrue(window.push(10.0, 4.0))  # repetición real del sensor: se cuenta
+        self.assertFalse(window.push(9.0, 1.0))
+        self.assertEqual((len(window), window.total), (2, 8.0))
+
+
+@unittest.skipUnless(fakeredis, "fakeredis no instalado")
+class StreamRedeliveryTests(unittest.TestCase):
+    def test_redelivered_entry_is_dropped_by_id(self):
+        transport = StreamTransport(fakeredis.FakeRedis(), worker_index=0, worker_count=1)
+        pipe = transport.client.pipeline()
+        transport.publish(pipe, [(1, b'a'), (1, b'b')])
+        pipe.execute()
+        first = transport.read(10, block_ms=0)
+        transport.ack(first[:1])
+
+        # La primera ya se confirmó: si vuelve a llegar se descarta; la segunda sigue
+        self.assertEqual(transport._unseen(first), first[1:])
+        self.assertEqual([data for _, _, data in first], [b'a', b'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,15 +28,60 @@ class Settings:
     MQTT_KEEPALIVE: int = getenv("MQTT_KEEPALIVE", 60, int)
     MQTT_CLIENT_ID: str = getenv("MQTT_CLIENT_ID", None)
     MQTT_QOS: int = getenv("MQTT_QOS", 0, int)
+    # Suscripción por estación ('<prefijo>/#' y '/<prefijo>/#') en vez de un tópico por sensor
+    MQTT_WILDCARD_SUBSCRIPTIONS: bool = getenv("MQTT_WILDCARD_SUBSCRIPTIONS", "true").lower() in ("1","true","yes","on")
 
     # Subscriber behaviour
     SYNC_INTERVAL_SEC: int = getenv("SYNC_INTERVAL_SEC", 15, int)
+    # Between full reconciles only sensors with updated_at >= last watermark are read
+    SYNC_FULL_RECONCILE_SEC: int = getenv("SYNC_FULL_RECONCILE_SEC", 600, int)
     WRITE_BATCH_SIZE: int = getenv("WRITE_BATCH_SIZE", 200, int)
     WRITE_FLUSH_MS: int = getenv("WRITE_FLUSH_MS", 800, int)
     MAX_QUEUE: int = getenv("MAX_QUEUE", 5000, int)
+    WRITER_THREADS: int = getenv("WRITER_THREADS", 4, int)
+
+    # Bulk write strategy: executemany | multirow | loaddata
+    WRITE_STRATEGY: str = getenv("WRITE_STRATEGY", "multirow")
+    WRITE_MAX_STMT_BYTES: int = getenv("WRITE_MAX_STMT_BYTES", 1000000, int)
+    WRITE_MAX_ROWS_PER_STMT: int = getenv("WRITE_MAX_ROWS_PER_STMT", 5000, int)
+    LOAD_DATA_ENABLED: bool = getenv("LOAD_DATA_ENABLED", "false").lower() in ("1","true","yes","on")
+    LOAD_DATA_MIN_ROWS: int = getenv("LOAD_DATA_MIN_ROWS", 2000, int)
+    WRITE_STATS_INTERVAL_SEC: int = getenv("WRITE_STATS_INTERVAL_SEC", 60, int)
+    # Último valor por sensor (measurements_sensorlatest) para dashboard y mapa
+    LATEST_VALUES_ENABLED: bool = getenv("LATEST_VALUES_ENABLED", "true").lower() in ("1","true","yes","on")
+
+    # Disk spill (segment log) when MySQL is slow or down
+    SPILL_ENABLED: bool = getenv("SPILL_ENABLED", "true").lower() in ("1","true","yes","on")
+    SPILL_DIR: str = getenv("SPILL_DIR", "/opt/auralis-subscriber/spill")
+    SPILL_SEGMENT_MB: int = getenv("SPILL_SEGMENT_MB", 64, int)
+    SPILL_HIGH_WATER: float = getenv("SPILL_HIGH_WATER", 0.8, float)
+    SPILL_REPLAY_BATCH: int = getenv("SPILL_REPLAY_BATCH", 5000, int)
+    SPILL_RETRY_SEC: int = getenv("SPILL_RETRY_SEC", 5, int)
     LOG_LEVEL: str = getenv("LOG_LEVEL", "INFO")
     TZ_NAME: str = getenv("TZ_NAME", "America/Guayaquil")
 
+    # Device timestamps (JSON 'ts' / binary payload); fallback = broker receive time
+    DEVICE_TS_ENABLED: bool = getenv("DEVICE_TS_ENABLED", "true").lower() in ("1","true","yes","on")
+    DEVICE_TS_MAX_SKEW_SEC: int = getenv("DEVICE_TS_MAX_SKEW_SEC", 3600, int)
+
+    # Station-level batch topic level: /<Station>/<BATCH_TOPIC_LEVEL>/
+    BATCH_TOPIC_LEVEL: str = getenv("BATCH_TOPIC_LEVEL", "_batch")
+
+    # Unified ingest: also feed the rule engine's Redis queue (replaces its TopicManager)
+    RULE_FANOUT_ENABLED: bool = getenv("RULE_FANOUT_ENABLED", "false").lower() in ("1","true","yes","on")
+    REDIS_HOST: str = getenv("REDIS_HOST", "127.0.0.1")
+    REDIS_PORT: int = getenv("REDIS_PORT", 6379, int)
+    REDIS_DB: int = getenv("REDIS_DB", 0, int)
+    RULE_QUEUE_NAME: str = getenv("RULE_QUEUE_NAME", "auralis_rule_engine_queue")
+    RULE_FANOUT_BATCH: int = getenv("RULE_FANOUT_BATCH", 500, int)
+    RULE_FANOUT_FLUSH_MS: int = getenv("RULE_FANOUT_FLUSH_MS", 100, int)
+    RULE_FANOUT_MAX_BUFFER: int = getenv("RULE_FANOUT_MAX_BUFFER", 50000, int)
+    # list | stream (must match QUEUE_TRANSPORT / STREAM_* of the rule engine)
+    RULE_TRANSPORT: str = getenv("RULE_TRANSPORT", "list")
+    RULE_STREAM_PREFIX: str = getenv("RULE_STREAM_PREFIX", "auralis_rule_engine_stream")
+    RULE_STREAM_PARTITIONS: int = getenv("RULE_STREAM_PARTITIONS", 8, int)
+    RULE_STREAM_MAXLEN: int = getenv("RULE_STREAM_MAXLEN", 1000000, int)
+
     # Event evaluation
     EVAL_PERSISTENCE_DEFAULT: int = getenv("EVAL_PERSISTENCE_DEFAULT", 0, int)
     EVAL_USE_HYSTERESIS: bool = getenv("EVAL_USE_HYSTERESIS", "true").lower() in ("1","true","yes","on")
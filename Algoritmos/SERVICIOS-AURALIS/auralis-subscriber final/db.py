@@ -9,7 +9,8 @@ class DB:
     - Evita colisiones de protocolo ('Packet sequence number wrong') de PyMySQL
       al compartir una sola conexión entre múltiples hilos.
     """
-    def __init__(self, host: str, port: int, user: str, password: str, dbname: str):
+    def __init__(self, host: str, port: int, user: str, password: str, dbname: str,
+                 local_infile: bool = False):
         self._conn_params = dict(
             host=host,
             port=port,
@@ -19,6 +20,7 @@ class DB:
             autocommit=False,
             cursorclass=pymysql.cursors.DictCursor,
             charset="utf8mb4",
+            local_infile=local_infile,
         )
         self._local = threading.local()
 
@@ -58,6 +60,21 @@ class DB:
                 pass
             raise
 
+    def execute_batch(self, statements: Iterable[Tuple[str, Optional[Tuple[Any, ...]]]]):
+        """Ejecuta varias sentencias en una sola transacción (un commit)."""
+        conn = self._get_conn()
+        try:
+            with conn.cursor() as cur:
+                for sql, params in statements:
+                    cur.execute(sql, params)
+            self._commit(conn)
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+
     def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None):
         conn = self._get_conn()
         with conn.cursor() as cur:
@@ -1,38 +1,84 @@
 # /opt/auralis-subscriber/models.py
 
-from typing import List, Tuple
+import logging
+from typing import List, Tuple, Optional
 from dataclasses import dataclass
 from db import DB
+from writers import BulkWriter, LatestValueWriter
 
 @dataclass
 class SensorRow:
     id: int
     mqtt_topic: str
+    station_id: int = 0
 
 class Repo:
-    def __init__(self, db: DB):
+    def __init__(self, db: DB, writer: Optional[BulkWriter] = None, latest: Optional[LatestValueWriter] = None):
         self.db = db
+        self.writer = writer
+        self.latest = latest
 
     def list_active_sensors(self) -> List[SensorRow]:
         """
         Obtiene solo los campos necesarios para el subscriber:
-        el ID del sensor y su tópico MQTT.
+        el ID del sensor, su tópico MQTT y su estación (para las suscripciones por estación).
         """
         sql = """
-            SELECT id, mqtt_topic 
+            SELECT id, mqtt_topic, station_id
             FROM sensorhub_sensor 
             WHERE is_active = TRUE AND mqtt_topic IS NOT NULL AND mqtt_topic != ''
         """
         rows = self.db.execute(sql)
-        return [SensorRow(id=r["id"], mqtt_topic=r["mqtt_topic"]) for r in rows]
+        return [SensorRow(id=r["id"], mqtt_topic=r["mqtt_topic"], station_id=r["station_id"]) for r in rows]
+
+    def sensors_watermark(self):
+        """Última edición de sensorhub_sensor (updated_at); punto de partida de los deltas."""
+        rows = self.db.execute("SELECT MAX(updated_at) AS ts FROM sensorhub_sensor")
+        return rows[0]["ts"] if rows else None
+
+    def list_sensors_changed_since(self, since) -> List[Tuple[SensorRow, bool, object]]:
+        """
+        Sensores editados desde `since` (inclusive, para no perder ediciones del mismo segundo),
+        activos o no: (fila, activo_con_tópico, updated_at). Las bajas físicas no aparecen aquí;
+        las cubre la reconciliación completa periódica.
+        """
+        sql = """
+            SELECT id, mqtt_topic, station_id, is_active, updated_at
+            FROM sensorhub_sensor
+            WHERE updated_at >= %s
+        """
+        rows = self.db.execute(sql, (since,))
+        return [
+            (SensorRow(id=r["id"], mqtt_topic=r["mqtt_topic"] or "", station_id=r["station_id"]),
+             bool(r["is_active"]) and bool(r["mqtt_topic"]), r["updated_at"])
+            for r in rows
+        ]
 
     def insert_measurements(self, rows: List[Tuple[int, str, float]]):
         """
         Inserta un lote de mediciones en la base de datos.
         Esta es ahora la única función de escritura de este repositorio.
+        Si hay un BulkWriter configurado, la escritura se delega en su estrategia.
         """
         if not rows:
             return
-        # La consulta asume que el campo timestamp en la BD se llama 'measured_at'
-        sql = "INSERT INTO measurements_measurement (sensor_id, measured_at, value) VALUES (%s, %s, %s)"
-        self.db.executemany(sql, rows)
\ No newline at end of file
+        if self.writer is not None:
+            self.writer.write(rows)
+        else:
+            # La consulta asume que el campo timestamp en la BD se llama 'measured_at'
+            sql = "INSERT INTO measurements_measurement (sensor_id, measured_at, value) VALUES (%s, %s, %s)"
+            self.db.executemany(sql, rows)
+        self.update_latest(rows)
+
+    def update_latest(self, rows: List[Tuple[int, str, float]]):
+        """
+        Actualiza el último valor por sensor. Va después del INSERT y en su propia transacción:
+        un fallo aquí no debe reenviar (ni duplicar) mediciones ya guardadas, así que solo se
+        registra; el siguiente lote del sensor vuelve a dejarlo al día.
+        """
+        if self.latest is None:
+            return
+        try:
+            self.latest.write(rows)
+        except Exception as e:
+            logging.warning("No se pudo actualizar el último valor de %d sensores: %s", len(rows), e)
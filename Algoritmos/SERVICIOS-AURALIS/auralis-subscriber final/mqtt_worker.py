@@ -1,30 +1,81 @@
 # /opt/auralis-subscriber/mqtt_worker.py
 
 import time, threading, queue, logging
+from operator import itemgetter
 from typing import Dict, Tuple, List
-from datetime import datetime
 import paho.mqtt.client as mqtt
 import pytz
 
 from config import Settings
 from db import DB
 from models import Repo, SensorRow
+from writers import make_writer, LatestValueWriter
+from spill import SegmentLog
+from payload import TimestampFormatter, parse_payload, parse_batch
+from router import TopicRouter
+from rule_queue import RuleQueueFanout
 
-def local_iso_now(tz: pytz.timezone) -> str:
-    """Retorna el timestamp actual localizado en formato ISO para la BD."""
-    return datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
+class WriterShard:
+    """
+    Cola y métricas de un hilo escritor.
+    Cada sensor se asigna siempre al mismo shard (sensor_id % N), así se
+    conserva el orden por sensor aunque haya varios escritores en paralelo.
+    """
+    def __init__(self, index: int, maxsize: int, high_water: float = 1.0):
+        self.index = index
+        self.q: "queue.Queue[Tuple[int, str, float]]" = queue.Queue(maxsize=maxsize)
+        self.high_water = max(1, int(maxsize * high_water))
+        # Métricas de backpressure (enqueued/dropped/max_depth: hilo MQTT; resto: hilo escritor)
+        self.enqueued = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.max_depth = 0
+        self.written = 0
+        self.failed_batches = 0
+        self.last_flush_ms = 0.0
+
+    def log_metrics(self):
+        logging.info(
+            "Shard %d: cola=%d (máx %d/%d), encoladas=%d, escritas=%d, a disco=%d, descartadas=%d, lotes fallidos=%d, último flush %.1f ms",
+            self.index, self.q.qsize(), self.max_depth, self.q.maxsize, self.enqueued,
+            self.written, self.spilled, self.dropped, self.failed_batches, self.last_flush_ms,
+        )
 
 class SubscriberService:
     def __init__(self, settings: Settings):
         self.s = settings
-        self.db = DB(self.s.DB_HOST, self.s.DB_PORT, self.s.DB_USER, self.s.DB_PASSWORD, self.s.DB_NAME)
-        self.repo = Repo(self.db)
+        self.db = DB(self.s.DB_HOST, self.s.DB_PORT, self.s.DB_USER, self.s.DB_PASSWORD, self.s.DB_NAME,
+                     local_infile=self.s.LOAD_DATA_ENABLED or self.s.WRITE_STRATEGY.lower() == "loaddata")
+        self.writer = make_writer(self.s, self.db)
+        latest = LatestValueWriter(self.db, self.writer.stats) if self.s.LATEST_VALUES_ENABLED else None
+        self.repo = Repo(self.db, self.writer, latest)
 
-        self.topic_to_sensor: Dict[str, SensorRow] = {}
+        self.router = TopicRouter(self.s.BATCH_TOPIC_LEVEL)
         self.subscribed_topics: set[str] = set()
+        # Sensores conocidos; entre reconciliaciones completas solo se leen los editados
+        self.sensor_rows: Dict[int, SensorRow] = {}
+        self.sensors_watermark = None
+        self.last_full_sync = 0.0
+        self._sync_lock = threading.Lock()  # on_connect (hilo de paho) y SyncThread
 
-        self.measure_q: "queue.Queue[Tuple[int, str, float]]" = queue.Queue(maxsize=self.s.MAX_QUEUE)
+        # Pool de escritores: MAX_QUEUE se reparte entre los shards
+        n_writers = max(1, self.s.WRITER_THREADS)
+        self.shards: List[WriterShard] = [
+            WriterShard(i, max(1, self.s.MAX_QUEUE // n_writers), self.s.SPILL_HIGH_WATER)
+            for i in range(n_writers)
+        ]
         self.stop_event = threading.Event()
+
+        # Desborde a disco: mientras 'spilling' esté activo, todo lo nuevo va al log
+        # (así se conserva el orden) hasta que el hilo de replay lo vacíe.
+        self.spill = SegmentLog(self.s.SPILL_DIR, self.s.SPILL_SEGMENT_MB * 1024 * 1024) if self.s.SPILL_ENABLED else None
+        self.db_healthy = threading.Event()
+        self.db_healthy.set()
+        self._spill_lock = threading.Lock()
+        self.spilling = self.spill is not None and not self.spill.is_empty()
+
+        # Ingesta unificada: reenviar también a la cola del motor de reglas (reemplaza a TopicManager)
+        self.rules = RuleQueueFanout(self.s) if self.s.RULE_FANOUT_ENABLED else None
         
         try:
             self.local_tz = pytz.timezone(self.s.TZ_NAME)
@@ -32,18 +83,32 @@ class SubscriberService:
         except pytz.UnknownTimeZoneError:
             logging.error(f"Zona horaria desconocida: '{self.s.TZ_NAME}'. Usando UTC por defecto.")
             self.local_tz = pytz.utc
+        # Formateadores con caché por segundo: recepción en broker y hora del dispositivo
+        self.recv_ts = TimestampFormatter(self.local_tz)
+        self.device_ts = TimestampFormatter(self.local_tz)
         
         self.mqtt_client = mqtt.Client(client_id=self.s.MQTT_CLIENT_ID)
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
 
     def start(self):
-        # Iniciar hilos de trabajo
-        self.writer_thread = threading.Thread(target=self.writer_loop, name="WriterThread")
+        # Iniciar hilos de trabajo: un escritor por shard (cada uno con su conexión thread-local)
+        self.writer_threads = [
+            threading.Thread(target=self.writer_loop, args=(shard,), name=f"WriterThread-{shard.index}")
+            for shard in self.shards
+        ]
         self.sync_thread = threading.Thread(target=self.sync_loop, name="SyncThread")
+        self.replay_thread = threading.Thread(target=self.replay_loop, name="ReplayThread") if self.spill else None
+        self.fanout_thread = (threading.Thread(target=self.rules.run, args=(self.stop_event,), name="FanoutThread")
+                              if self.rules else None)
 
-        self.writer_thread.start()
+        for t in self.writer_threads:
+            t.start()
         self.sync_thread.start()
+        if self.replay_thread:
+            self.replay_thread.start()
+        if self.fanout_thread:
+            self.fanout_thread.start()
 
         # Conectar al broker MQTT
         if self.s.MQTT_USERNAME:
@@ -61,57 +126,246 @@ class SubscriberService:
         logging.info("Deteniendo servicios...")
         self.mqtt_client.loop_stop()
         self.mqtt_client.disconnect()
-        self.writer_thread.join(timeout=2)
+        for t in self.writer_threads:
+            t.join(timeout=2)
         self.sync_thread.join(timeout=2)
+        if self.replay_thread:
+            self.replay_thread.join(timeout=2)
+        if self.fanout_thread:
+            self.fanout_thread.join(timeout=2)
+        if self.spill:
+            self.spill.close()
         self.db.close_thread()
         logging.info("Servicios detenidos.")
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logging.info("Conectado al broker MQTT.")
-            self.sync_mqtt_subscriptions()
+            # Sesión nueva: el broker no conserva suscripciones, hay que reenviarlas todas
+            self.subscribed_topics = set()
+            self.sync_mqtt_subscriptions(force=True)
         else:
             logging.error("Fallo al conectar a MQTT, código: %s", rc)
 
     def on_message(self, client, userdata, msg):
+        router = self.router
+        sensor_id = router.resolve(msg.topic)
+        if sensor_id is None:
+            parent = router.batch_parent(msg.topic)
+            if parent is not None:
+                self.on_batch_message(msg, router, parent)
+            return
         try:
-            sensor = self.topic_to_sensor.get(msg.topic)
-            if not sensor:
-                return
-            
-            value = float(msg.payload.decode())
-            iso_ts = local_iso_now(self.local_tz)
+            value, device_epoch = parse_payload(msg.payload, self.local_tz)
+            iso_ts = self.measured_at(device_epoch)
 
-            # Poner la medición en la cola para el writer
-            self.measure_q.put((sensor.id, iso_ts, value))
+            # Poner la medición en la cola del shard de este sensor
+            self.enqueue((sensor_id, iso_ts, value), msg.topic)
+            if self.rules is not None:
+                self.rules.offer(sensor_id, value, device_epoch or time.time(), msg.topic)
 
         except (ValueError, UnicodeDecodeError) as e:
             logging.warning("No se pudo decodificar el mensaje de %s: %s", msg.topic, e)
-        except queue.Full:
-            logging.error("Cola de mediciones llena. Descartando dato de %s", msg.topic)
 
-    def sync_mqtt_subscriptions(self):
+    def on_batch_message(self, msg, router: TopicRouter, parent: str):
+        """Lote de una estación: se decodifica en una pasada y se encola como bloque."""
         try:
-            sensors = self.repo.list_active_sensors()
-            self.topic_to_sensor = {s.mqtt_topic: s for s in sensors if s.mqtt_topic}
-            
-            new_topics = set(self.topic_to_sensor.keys())
+            readings = parse_batch(msg.payload, self.local_tz)
+        except (ValueError, UnicodeDecodeError) as e:
+            logging.warning("No se pudo decodificar el lote de %s: %s", msg.topic, e)
+            return
+
+        items: List[Tuple[int, str, float]] = []
+        rule_items = []
+        now = time.time()
+        unknown = 0
+        for key, device_epoch, value in readings:
+            sensor_id = router.resolve_in_batch(parent, key)
+            if sensor_id is None:
+                unknown += 1
+                continue
+            items.append((sensor_id, self.measured_at(device_epoch), value))
+            rule_items.append((sensor_id, value, device_epoch or now, msg.topic))
+        if unknown:
+            logging.debug("Lote de %s: %d lecturas de sensores desconocidos.", msg.topic, unknown)
+        self.enqueue_many(items, msg.topic)
+        if self.rules is not None and rule_items:
+            self.rules.offer_many(rule_items)
+
+    def measured_at(self, device_epoch) -> str:
+        """
+        Usa la hora del dispositivo si viene en el payload y está dentro de
+        DEVICE_TS_MAX_SKEW_SEC; si no, la hora de recepción en el broker.
+        """
+        now = time.time()
+        if (device_epoch is not None and self.s.DEVICE_TS_ENABLED
+                and abs(now - device_epoch) <= self.s.DEVICE_TS_MAX_SKEW_SEC):
+            return self.device_ts.format(device_epoch)
+        return self.recv_ts.format(now)
+
+    def shard_for(self, sensor_id: int) -> WriterShard:
+        return self.shards[sensor_id % len(self.shards)]
+
+    def enqueue(self, item: Tuple[int, str, float], topic: str = ""):
+        """
+        Encola sin bloquear el hilo de red de paho.
+        Si la cola pasa la marca de desborde o la BD está fallando, va al log en disco;
+        sin log de desborde, un shard lleno descarta el dato.
+        """
+        shard = self.shard_for(item[0])
+        # Chequeo sin lock: con la BD sana y la cola bajo la marca no se toma _spill_lock
+        if self.spill is not None and self._must_spill(shard.q.qsize() >= shard.high_water):
+            with self._spill_lock:
+                # Se repite con el lock: el replay pudo terminar de vaciar el log entre tanto
+                if self._must_spill(shard.q.qsize() >= shard.high_water):
+                    self._start_spilling("cola del shard %d sobre la marca de desborde" % shard.index)
+                    self.spill.append([item])
+                    shard.spilled += 1
+                    return
+        try:
+            shard.q.put_nowait(item)
+        except queue.Full:
+            shard.dropped += 1
+            logging.error("Cola de mediciones llena (shard %d). Descartando dato de %s", shard.index, topic)
+            return
+        shard.enqueued += 1
+        depth = shard.q.qsize()
+        if depth > shard.max_depth:
+            shard.max_depth = depth
+
+    def enqueue_many(self, items: List[Tuple[int, str, float]], topic: str = ""):
+        """Encola un bloque de lecturas (un lote MQTT) con una sola decisión de desborde."""
+        if not items:
+            return
+        if self.spill is not None and self._must_spill(self._any_over_high_water()):
+            with self._spill_lock:
+                if self._must_spill(self._any_over_high_water()):
+                    self._start_spilling("lote de %s sobre la marca de desborde" % topic)
+                    self.spill.append(items)
+                    for item in items:
+                        self.shard_for(item[0]).spilled += 1
+                    return
+        for item in items:
+            self.enqueue(item, topic)
+
+    def _must_spill(self, over_high_water: bool) -> bool:
+        # Lectura de banderas sin lock (GIL); quien decide desbordar lo confirma con _spill_lock
+        return self.spilling or not self.db_healthy.is_set() or over_high_water
+
+    def _any_over_high_water(self) -> bool:
+        return any(sh.q.qsize() >= sh.high_water for sh in self.shards)
+
+    def _start_spilling(self, reason: str):
+        # Llamar con _spill_lock tomado
+        if not self.spilling:
+            self.spilling = True
+            logging.warning("Desbordando mediciones a disco (%s).", reason)
+
+    def spill_rows(self, rows: List[Tuple[int, str, float]], reason: str) -> bool:
+        """Envía un lote al log en disco; devuelve False si no hay log configurado."""
+        if self.spill is None:
+            return False
+        with self._spill_lock:
+            self._start_spilling(reason)
+            self.spill.append(rows)
+        return True
+
+    def replay_loop(self):
+        """
+        Reenvía en bloque el log de desborde cuando la BD responde.
+        La entrega es al menos una vez: el cursor avanza solo tras un INSERT exitoso.
+        """
+        while not self.stop_event.is_set():
+            self.spill.flush()
+
+            if not self.db_healthy.is_set():
+                try:
+                    self.db.execute("SELECT 1")
+                    self.db_healthy.set()
+                    logging.info("BD disponible de nuevo. Reenviando %d mediciones desde disco.", self.spill.pending())
+                except Exception:
+                    self.stop_event.wait(self.s.SPILL_RETRY_SEC)
+                    continue
+
+            rows, token = self.spill.read(self.s.SPILL_REPLAY_BATCH)
+            if rows:
+                try:
+                    self.repo.insert_measurements(rows)
+                    self.spill.commit(token)
+                    logging.info("Replay: %d mediciones reenviadas desde disco.", len(rows))
+                except Exception as e:
+                    self.db_healthy.clear()
+                    logging.error("Replay: fallo al reenviar mediciones (%s). Reintentando en %ss.", e, self.s.SPILL_RETRY_SEC)
+                continue
+            if token != self.spill.cursor:
+                self.spill.commit(token)  # segmento agotado, pasar al siguiente
+                continue
+
+            with self._spill_lock:
+                if self.spilling and self.spill.is_empty():
+                    self.spilling = False
+                    logging.info("Log de desborde vacío. Volviendo a la cola en memoria.")
+            self.stop_event.wait(0.5)
+
+    def load_sensor_changes(self) -> bool:
+        """
+        Actualiza self.sensor_rows. Cada SYNC_FULL_RECONCILE_SEC relee todos los sensores
+        activos (cubre bajas físicas); entre tanto solo los editados desde la última marca
+        de updated_at. Devuelve True si cambió algo.
+        """
+        now = time.monotonic()
+        if self.sensors_watermark is None or now - self.last_full_sync >= self.s.SYNC_FULL_RECONCILE_SEC:
+            # La marca se lee antes que los datos: una edición concurrente quedará en el próximo delta
+            watermark = self.repo.sensors_watermark()
+            rows = {r.id: r for r in self.repo.list_active_sensors()}
+            changed = rows != self.sensor_rows
+            self.sensor_rows = rows
+            self.sensors_watermark = watermark
+            self.last_full_sync = now
+            return changed
+
+        changed = False
+        for row, active, updated_at in self.repo.list_sensors_changed_since(self.sensors_watermark):
+            if active and self.sensor_rows.get(row.id) != row:
+                self.sensor_rows[row.id] = row
+                changed = True
+            elif not active and self.sensor_rows.pop(row.id, None) is not None:
+                changed = True
+            if updated_at is not None and updated_at > self.sensors_watermark:
+                self.sensors_watermark = updated_at
+        return changed
+
+    def sync_mqtt_subscriptions(self, force: bool = False):
+        with self._sync_lock:
+            try:
+                if not self.load_sensor_changes() and not force:
+                    logging.debug("Sin cambios en sensores desde la última sincronización.")
+                    return
+                # El router se reemplaza de una vez: on_message siempre ve un mapa consistente
+                router = TopicRouter.build(self.sensor_rows.values(), self.s.BATCH_TOPIC_LEVEL)
+                self.router = router
+
+                if self.s.MQTT_WILDCARD_SUBSCRIPTIONS:
+                    new_topics = set(router.wildcard_subscriptions)
+                else:
+                    new_topics = set(router.exact_subscriptions)
             
-            to_subscribe = new_topics - self.subscribed_topics
-            to_unsubscribe = self.subscribed_topics - new_topics
+                to_subscribe = new_topics - self.subscribed_topics
+                to_unsubscribe = self.subscribed_topics - new_topics
 
-            if to_subscribe:
-                sub_list = [(topic, self.s.MQTT_QOS) for topic in to_subscribe]
-                self.mqtt_client.subscribe(sub_list)
-                logging.info("Suscrito a %d nuevos tópicos.", len(to_subscribe))
+                if to_subscribe:
+                    sub_list = [(topic, self.s.MQTT_QOS) for topic in to_subscribe]
+                    self.mqtt_client.subscribe(sub_list)
+                    logging.info("Suscrito a %d nuevos tópicos.", len(to_subscribe))
             
-            if to_unsubscribe:
-                self.mqtt_client.unsubscribe(list(to_unsubscribe))
-                logging.info("Desuscrito de %d tópicos obsoletos.", len(to_unsubscribe))
+                if to_unsubscribe:
+                    self.mqtt_client.unsubscribe(list(to_unsubscribe))
+                    logging.info("Desuscrito de %d tópicos obsoletos.", len(to_unsubscribe))
 
-            self.subscribed_topics = new_topics
-        except Exception as e:
-            logging.exception("Fallo al sincronizar suscripciones MQTT: %s", e)
+                self.subscribed_topics = new_topics
+                logging.info("Router: %d sensores, %d suscripciones.", len(router), len(new_topics))
+            except Exception as e:
+                logging.exception("Fallo al sincronizar suscripciones MQTT: %s", e)
 
     def sync_loop(self):
         while not self.stop_event.is_set():
@@ -119,16 +373,18 @@ class SubscriberService:
             self.sync_mqtt_subscriptions()
             self.stop_event.wait(self.s.SYNC_INTERVAL_SEC)
 
-    def writer_loop(self):
+    def writer_loop(self, shard: WriterShard):
         """
-        Toma mediciones de la cola y las escribe en la base de datos en lotes.
+        Toma mediciones de la cola del shard y las escribe en la base de datos en lotes.
+        Cada shard tiene sus propios temporizadores de lote/flush.
         """
         buf: List[Tuple[int, str, float]] = []
         last_flush = time.monotonic()
+        last_stats = last_flush
 
         while not self.stop_event.is_set():
             try:
-                item = self.measure_q.get(timeout=0.1)
+                item = shard.q.get(timeout=0.1)
                 buf.append(item)
             except queue.Empty:
                 pass # Continuar para revisar si se debe hacer flush
@@ -138,19 +394,50 @@ class SubscriberService:
                 (buf and (time.monotonic() - last_flush) * 1000 >= self.s.WRITE_FLUSH_MS)
             )
 
-            if should_flush:
+            if should_flush and not self.db_healthy.is_set() and self.spill_rows(buf, "BD no disponible"):
+                # BD caída: no insistir desde el escritor, el replay se encarga
+                shard.spilled += len(buf)
+                buf.clear()
+                last_flush = time.monotonic()
+            elif should_flush:
+                # Orden de inserción por measured_at (estable: conserva el orden por sensor en empates)
+                buf.sort(key=itemgetter(1))
+                t0 = time.monotonic()
                 try:
                     self.repo.insert_measurements(buf)
-                    logging.info("Lote de %d mediciones guardado en la BD.", len(buf))
+                    shard.written += len(buf)
+                    shard.last_flush_ms = (time.monotonic() - t0) * 1000
+                    logging.info("Lote de %d mediciones guardado en la BD (shard %d).", len(buf), shard.index)
                     buf.clear()
                     last_flush = time.monotonic()
                 except Exception as e:
+                    shard.failed_batches += 1
                     logging.exception("Fallo al escribir el lote de mediciones: %s", e)
+                    self.db_healthy.clear()
+                    if self.spill_rows(buf, "fallo de escritura en BD"):
+                        shard.spilled += len(buf)
+                        buf.clear()
+                        last_flush = time.monotonic()
+
+            if time.monotonic() - last_stats >= self.s.WRITE_STATS_INTERVAL_SEC:
+                shard.log_metrics()
+                if shard.index == 0:
+                    self.writer.stats.log_summary()
+                last_stats = time.monotonic()
         
         # Drenaje final de la cola al detener
+        while True:
+            try:
+                buf.append(shard.q.get_nowait())
+            except queue.Empty:
+                break
         if buf:
             try:
                 self.repo.insert_measurements(buf)
-                logging.debug("Drenaje final: insertadas %d mediciones.", len(buf))
+                shard.written += len(buf)
+                logging.debug("Drenaje final (shard %d): insertadas %d mediciones.", shard.index, len(buf))
             except Exception as e:
-                logging.exception("Fallo en el drenaje final de mediciones: %s", e)
\ No newline at end of file
+                logging.exception("Fallo en el drenaje final de mediciones: %s", e)
+                if self.spill_rows(buf, "drenaje final"):
+                    logging.warning("Drenaje final (shard %d): %d mediciones guardadas en disco.", shard.index, len(buf))
+        self.db.close_thread()
\ No newline at end of file
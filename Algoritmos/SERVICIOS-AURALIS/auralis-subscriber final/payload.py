@@ -0,0 +1,161 @@
+# /opt/auralis-subscriber/payload.py
+
+import json, struct, time
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+import pytz
+
+# Formato binario compacto: versión (1 byte), epoch en segundos (float64), valor (float64)
+BINARY = struct.Struct("<Bdd")
+BINARY_VERSION = 0x01
+
+TS_KEYS = ("ts", "timestamp", "t")
+DB_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class TimestampFormatter:
+    """
+    Convierte epoch -> 'YYYY-mm-dd HH:MM:SS' en la zona local de la BD.
+    Cachea el último segundo formateado: con muchos mensajes por segundo
+    solo se crea un datetime y un string por segundo, no por mensaje.
+    """
+    def __init__(self, tz: pytz.BaseTzInfo):
+        self.tz = tz
+        self._cached: Tuple[int, str] = (-1, "")
+
+    def format(self, epoch: float) -> str:
+        sec = int(epoch)
+        cached = self._cached
+        if cached[0] == sec:
+            return cached[1]
+        text = datetime.fromtimestamp(sec, self.tz).strftime(DB_TS_FORMAT)
+        self._cached = (sec, text)
+        return text
+
+    def now(self) -> str:
+        return self.format(time.time())
+
+
+def to_epoch(raw, tz: pytz.BaseTzInfo) -> Optional[float]:
+    """
+    Normaliza el timestamp del dispositivo a epoch (segundos).
+    Acepta epoch en segundos o milisegundos, o ISO 8601 (sin zona = hora local).
+    """
+    if raw is None or isinstance(raw, bool):
+        return None
+    if isinstance(raw, (int, float)):
+        ts = float(raw)
+        return ts / 1000.0 if ts > 1e11 else ts
+    if isinstance(raw, str):
+        try:
+            dt = datetime.fromisoformat(raw.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = tz.localize(dt)
+        return dt.timestamp()
+    return None
+
+
+def to_value(raw) -> float:
+    """Valor de una lectura JSON (número o texto numérico); ValueError con null, listas u objetos."""
+    if isinstance(raw, bool) or not isinstance(raw, (int, float, str)):
+        raise ValueError(f"Valor no numérico: {raw!r}")
+    return float(raw)
+
+
+def parse_payload(payload: bytes, tz: pytz.BaseTzInfo) -> Tuple[float, Optional[float]]:
+    """
+    Devuelve (valor, epoch_del_dispositivo | None). Acepta:
+      - binario: struct '<Bdd' (versión 0x01, epoch, valor)
+      - "123.45" / "123,45"
+      - JSON: 123.45 | {"value": 123.45, "ts": 1718000000.5 | 1718000000500 | "2025-06-10T12:00:00"}
+    Lanza ValueError / UnicodeDecodeError si no se puede interpretar.
+    """
+    if len(payload) == BINARY.size and payload[0] == BINARY_VERSION:
+        _, ts, value = BINARY.unpack(payload)
+        return value, ts
+
+    text = payload.decode("utf-8").strip()
+    if text[:1] == "{":
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(str(e))
+        if "value" not in obj:
+            raise ValueError("JSON sin campo 'value'")
+        raw_ts = next((obj[k] for k in TS_KEYS if k in obj), None)
+        return to_value(obj["value"]), to_epoch(raw_ts, tz)
+
+    return float(text.replace(",", ".")), None
+
+
+# ----------------------------------------------------------------------------
+# Lotes por estación: un mensaje con muchas lecturas (sensor_key, ts, valor)
+# en el tópico <prefijo de la estación>/<BATCH_TOPIC_LEVEL>/, p. ej. /Sacha53/_batch/
+# ----------------------------------------------------------------------------
+# Empaquetado: cabecera '<BH' (0xB1, cantidad) y por lectura:
+#   longitud de clave (1 byte) + nombre utf-8   | o 0 + '<I' id de sensor
+#   '<dd' (epoch, valor); epoch 0 = sin hora del dispositivo
+BATCH_MAGIC = 0xB1
+BATCH_HEADER = struct.Struct("<BH")
+BATCH_ID = struct.Struct("<I")
+BATCH_VALUES = struct.Struct("<dd")
+
+BatchItem = Tuple[Union[int, str], Optional[float], float]
+
+
+def parse_batch(payload: bytes, tz: pytz.BaseTzInfo) -> List[BatchItem]:
+    """
+    Decodifica un lote en una sola pasada. Acepta:
+      - empaquetado (ver arriba)
+      - JSON: [["Motor_Current", 1718000000.5, 21.3], [12, null, 4.0], ...]
+              o [{"sensor": "Motor_Current", "ts": ..., "value": 21.3}, ...]
+    La clave es el nombre del sensor dentro de la estación (str) o su id (int).
+    """
+    if payload[:1] == bytes((BATCH_MAGIC,)):
+        try:
+            _, count = BATCH_HEADER.unpack_from(payload, 0)
+            off = BATCH_HEADER.size
+            out: List[BatchItem] = []
+            for _ in range(count):
+                klen = payload[off]
+                off += 1
+                if klen:
+                    key: Union[int, str] = payload[off:off + klen].decode("utf-8")
+                    off += klen
+                else:
+                    key = BATCH_ID.unpack_from(payload, off)[0]
+                    off += BATCH_ID.size
+                ts, value = BATCH_VALUES.unpack_from(payload, off)
+                off += BATCH_VALUES.size
+                out.append((key, ts if ts > 0 else None, value))
+            return out
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Lote empaquetado truncado: {e}")
+
+    try:
+        data = json.loads(payload.decode("utf-8"))
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e))
+    if not isinstance(data, list):
+        raise ValueError("El lote JSON debe ser una lista")
+
+    out = []
+    for item in data:
+        if isinstance(item, dict):
+            key = item.get("sensor", item.get("id"))
+            raw_ts = next((item[k] for k in TS_KEYS if k in item), None)
+            value = item.get("value")
+        elif isinstance(item, (list, tuple)) and len(item) == 3:
+            key, raw_ts, value = item
+        else:
+            raise ValueError(f"Lectura de lote inválida: {item!r}")
+        if key is None or value is None:
+            raise ValueError(f"Lectura de lote incompleta: {item!r}")
+        if isinstance(key, bool) or not isinstance(key, (int, str)):
+            raise ValueError(f"Clave de sensor inválida: {item!r}")
+        out.append((key, to_epoch(raw_ts, tz), to_value(value)))
+    return out
+
@@ -0,0 +1,120 @@
+# /opt/auralis-subscriber/router.py
+
+from typing import Dict, Iterable, List, Optional, Set
+
+TOPIC_WILDCARDS = ("{}/#", "/{}/#")  # cubre las variantes con y sin slash inicial/final
+
+
+def normalize(topic: str) -> str:
+    """'/Sacha53/Motor_Current/' y 'Sacha53/Motor_Current' -> 'Sacha53/Motor_Current'"""
+    return topic.strip("/")
+
+
+def common_parent(norm_topics: List[str]) -> str:
+    """Prefijo de niveles común a los padres de todos los tópicos ('' si no hay)."""
+    parents = [t.split("/")[:-1] for t in norm_topics]
+    common = parents[0]
+    for levels in parents[1:]:
+        n = 0
+        for a, b in zip(common, levels):
+            if a != b:
+                break
+            n += 1
+        common = common[:n]
+        if not common:
+            break
+    return "/".join(common)
+
+
+def minimal_prefixes(prefixes: Iterable[str]) -> Set[str]:
+    """Descarta prefijos contenidos en otro más corto (evita suscripciones solapadas)."""
+    kept: Set[str] = set()
+    for p in sorted(prefixes, key=lambda x: x.count("/")):
+        levels = p.split("/")
+        if not any("/".join(levels[:i]) in kept for i in range(1, len(levels))):
+            kept.add(p)
+    return kept
+
+
+def batch_topic_for(sensor_topic: str, level: str) -> str:
+    """'/Sacha53/Motor_Current/' -> '/Sacha53/_batch/' (reemplaza el último nivel no vacío)."""
+    parts = sensor_topic.split("/")
+    for i in range(len(parts) - 1, -1, -1):
+        if parts[i]:
+            parts[i] = level
+            break
+    return "/".join(parts)
+
+
+class TopicRouter:
+    """
+    Resuelve tópicos entrantes -> sensor_id con un hash sobre el tópico normalizado
+    (sin '/' inicial ni final), y calcula las suscripciones por estación.
+
+    - Cada estación se cubre con dos comodines '<prefijo>/#' y '/<prefijo>/#', donde
+      el prefijo es el padre común de los tópicos de sus sensores (p. ej. 'Sacha53').
+      Station.mqtt_topic es el tópico de estado de la estación, así que el prefijo se
+      deriva de los sensores; el tópico de estado queda cubierto si cuelga del mismo prefijo.
+    - Los sensores de una estación sin padre común se suscriben de forma exacta.
+    - Con esto el costo de reconexión es O(estaciones), no O(sensores).
+    """
+    def __init__(self, batch_level: str = "_batch"):
+        self.batch_level = batch_level
+        self._by_topic: Dict[str, int] = {}
+        self.sensor_ids: Set[int] = set()
+        self.prefixes: Set[str] = set()
+        self.wildcard_subscriptions: Set[str] = set()
+        self.exact_subscriptions: Set[str] = set()
+
+    @classmethod
+    def build(cls, sensors, batch_level: str = "_batch") -> "TopicRouter":
+        """sensors: iterable con .id, .mqtt_topic y .station_id"""
+        router = cls(batch_level)
+        by_station: Dict[int, List[str]] = {}
+        raw_by_norm: Dict[str, str] = {}
+        for s in sensors:
+            norm = normalize(s.mqtt_topic or "")
+            if not norm:
+                continue
+            router._by_topic[norm] = s.id
+            router.sensor_ids.add(s.id)
+            raw_by_norm[norm] = s.mqtt_topic
+            by_station.setdefault(s.station_id, []).append(norm)
+
+        loose: List[str] = []
+        candidates: Set[str] = set()
+        for norm_topics in by_station.values():
+            prefix = common_parent(norm_topics)
+            if prefix:
+                candidates.add(prefix)
+            else:
+                loose.extend(norm_topics)
+
+        router.prefixes = minimal_prefixes(candidates)
+        for p in router.prefixes:
+            router.wildcard_subscriptions.update(w.format(p) for w in TOPIC_WILDCARDS)
+        for norm in loose:
+            router.wildcard_subscriptions.add(raw_by_norm[norm])
+            router.wildcard_subscriptions.add(batch_topic_for(raw_by_norm[norm], batch_level))
+
+        # Modo sin comodines: tópico exacto de cada sensor + un tópico de lote por prefijo
+        router.exact_subscriptions = set(raw_by_norm.values())
+        router.exact_subscriptions.update(batch_topic_for(t, batch_level) for t in raw_by_norm.values())
+        return router
+
+    def resolve(self, topic: str) -> Optional[int]:
+        return self._by_topic.get(normalize(topic))
+
+    def batch_parent(self, topic: str) -> Optional[str]:
+        """Si el tópico es de lote ('<padre>/_batch'), devuelve el padre normalizado."""
+        parent, _, level = normalize(topic).rpartition("/")
+        return parent if level == self.batch_level else None
+
+    def resolve_in_batch(self, parent: str, key) -> Optional[int]:
+        """Clave de un lote: id de sensor (int) o nombre del sensor bajo el mismo padre."""
+        if isinstance(key, int):
+            return key if key in self.sensor_ids else None
+        return self._by_topic.get(f"{parent}/{key}" if parent else str(key))
+
+    def __len__(self):
+        return len(self._by_topic)
@@ -0,0 +1,129 @@
+# /opt/auralis-subscriber/rule_queue.py
+
+import json, time, logging, threading
+from collections import deque
+from typing import Iterable, List, Tuple
+
+try:
+    import redis
+except ImportError:  # dependencia opcional: solo con RULE_FANOUT_ENABLED=true
+    redis = None
+
+# (sensor_id, valor, epoch, tópico)
+RuleItem = Tuple[int, float, float, str]
+
+
+class RuleQueueFanout:
+    """
+    Ingesta unificada: el subscriber decodifica cada mensaje una sola vez y, además de
+    persistirlo, lo reenvía a la cola del motor de reglas (Redis) en el mismo formato
+    JSON que publicaba TopicManager. Con esto TopicManager deja de ser necesario.
+
+    - offer()/offer_many() solo agregan a un buffer en memoria: el hilo de red de paho
+      nunca espera a Redis.
+    - El hilo FanoutThread vacía el buffer con un LPUSH multi-valor por bloque de
+      RULE_FANOUT_BATCH, o cada RULE_FANOUT_FLUSH_MS.
+    - Con RULE_TRANSPORT=stream se publica con XADD en RULE_STREAM_PARTITIONS streams
+      particionados por sensor_id (mismo esquema que QUEUE_TRANSPORT=stream del motor).
+    - Si Redis no responde, el buffer se limita a RULE_FANOUT_MAX_BUFFER y se descartan
+      las lecturas más antiguas (la evaluación de reglas es best-effort; la persistencia no).
+    """
+    def __init__(self, settings):
+        if redis is None:
+            raise RuntimeError("RULE_FANOUT_ENABLED=true requiere el paquete 'redis' (pip install redis)")
+        self.s = settings
+        self.client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+        self.queue_name = settings.RULE_QUEUE_NAME
+        self.batch_size = max(1, settings.RULE_FANOUT_BATCH)
+        self.use_streams = settings.RULE_TRANSPORT.lower() == "stream"
+        self.streams = ["%s:%d" % (settings.RULE_STREAM_PREFIX, p) for p in range(max(1, settings.RULE_STREAM_PARTITIONS))]
+        self._buf: "deque[RuleItem]" = deque(maxlen=max(self.batch_size, settings.RULE_FANOUT_MAX_BUFFER))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # Métricas
+        self.offered = 0
+        self.pushed = 0
+        self.dropped = 0
+        self.failed_pushes = 0
+
+    def offer(self, sensor_id: int, value: float, epoch: float, topic: str):
+        with self._lock:
+            if len(self._buf) == self._buf.maxlen:
+                self.dropped += 1
+            self._buf.append((sensor_id, value, epoch, topic))
+            self.offered += 1
+            full = len(self._buf) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def offer_many(self, items: Iterable[RuleItem]):
+        with self._lock:
+            for item in items:
+                if len(self._buf) == self._buf.maxlen:
+                    self.dropped += 1
+                self._buf.append(item)
+                self.offered += 1
+            full = len(self._buf) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    @staticmethod
+    def encode(item: RuleItem) -> str:
+        sensor_id, value, epoch, topic = item
+        return json.dumps({'sensor_id': sensor_id, 'value': value, 'topic': topic, 'timestamp': epoch})
+
+    def _take(self) -> List[RuleItem]:
+        with self._lock:
+            n = min(len(self._buf), self.batch_size)
+            return [self._buf.popleft() for _ in range(n)]
+
+    def _give_back(self, items: List[RuleItem]):
+        # Devolver al frente conservando el orden; si no cabe, se pierden los más antiguos
+        with self._lock:
+            room = self._buf.maxlen - len(self._buf)
+            if room < len(items):
+                self.dropped += len(items) - room
+                items = items[len(items) - room:]
+            self._buf.extendleft(reversed(items))
+
+    def flush(self) -> bool:
+        """Envía todo lo acumulado; devuelve False si Redis falló."""
+        while True:
+            items = self._take()
+            if not items:
+                return True
+            try:
+                if self.use_streams:
+                    pipe = self.client.pipeline(transaction=False)
+                    for it in items:
+                        pipe.xadd(self.streams[it[0] % len(self.streams)], {"d": self.encode(it)},
+                                  maxlen=self.s.RULE_STREAM_MAXLEN, approximate=True)
+                    pipe.execute()
+                else:
+                    self.client.lpush(self.queue_name, *[self.encode(it) for it in items])
+                self.pushed += len(items)
+            except Exception as e:
+                self.failed_pushes += 1
+                self._give_back(items)
+                logging.error("No se pudo encolar %d lecturas para el motor de reglas: %s", len(items), e)
+                return False
+
+    def log_metrics(self):
+        logging.info(
+            "Motor de reglas: buffer=%d, recibidas=%d, encoladas=%d, descartadas=%d, LPUSH fallidos=%d",
+            len(self._buf), self.offered, self.pushed, self.dropped, self.failed_pushes,
+        )
+
+    def run(self, stop_event: threading.Event):
+        """Bucle del hilo FanoutThread."""
+        interval = max(0.01, self.s.RULE_FANOUT_FLUSH_MS / 1000.0)
+        last_stats = time.monotonic()
+        while not stop_event.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if not self.flush():
+                stop_event.wait(self.s.SPILL_RETRY_SEC)
+            if time.monotonic() - last_stats >= self.s.WRITE_STATS_INTERVAL_SEC:
+                self.log_metrics()
+                last_stats = time.monotonic()
+        self.flush()
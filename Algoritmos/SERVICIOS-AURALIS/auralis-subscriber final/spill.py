@@ -0,0 +1,183 @@
+# /opt/auralis-subscriber/spill.py
+
+import os, mmap, struct, threading, logging
+from typing import List, Tuple, Optional
+
+Row = Tuple[int, str, float]
+
+# Registro de tamaño fijo: marca, sensor_id, valor, timestamp (texto, relleno con \0)
+RECORD = struct.Struct("<Bqd26s")
+MAGIC = 0xA5
+CURSOR = struct.Struct("<QQ")  # (segmento, índice de registro) del lector
+
+
+class SegmentLog:
+    """
+    Log de desborde append-only en disco, en segmentos de tamaño fijo mapeados en memoria.
+
+    - Cada segmento es un archivo preasignado (ceros) de `segment_bytes`; los registros
+      se escriben secuencialmente con pack_into sobre el mmap.
+    - Un registro es válido si empieza con MAGIC: al reabrir, la posición de escritura
+      se recupera buscando el primer hueco (los registros son contiguos).
+    - El lector avanza con read()/commit(); el cursor se persiste en 'cursor' y los
+      segmentos ya consumidos se borran.
+    """
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024):
+        self.dir = directory
+        os.makedirs(self.dir, exist_ok=True)
+        self.capacity = max(1, segment_bytes // RECORD.size)
+        self.segment_bytes = self.capacity * RECORD.size
+        self._lock = threading.Lock()
+
+        segs = self._list_segments()
+        self._read_seq, self._read_idx = self._load_cursor(segs[0] if segs else 0)
+        self._write_seq = segs[-1] if segs else self._read_seq
+        self._write_fd, self._write_mm = self._open_segment(self._write_seq, writable=True)
+        self._write_idx = self._recover_write_idx(self._write_mm)
+        self._read_mm: Optional[mmap.mmap] = None
+        self._read_mm_seq = -1
+        if self.pending():
+            logging.warning("Spill: %d mediciones pendientes de reenviar en %s.", self.pending(), self.dir)
+
+    # ---------------------------------------------------------------- archivos
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.dir, f"{seq:012d}.seg")
+
+    def _list_segments(self) -> List[int]:
+        out = []
+        for name in os.listdir(self.dir):
+            if name.endswith(".seg"):
+                try:
+                    out.append(int(name[:-4]))
+                except ValueError:
+                    pass
+        return sorted(out)
+
+    def _open_segment(self, seq: int, writable: bool):
+        path = self._path(seq)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY, 0o640)
+        if writable and os.fstat(fd).st_size < self.segment_bytes:
+            os.ftruncate(fd, self.segment_bytes)
+        size = os.fstat(fd).st_size
+        mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        return fd, mm
+
+    def _recover_write_idx(self, mm: mmap.mmap) -> int:
+        # Búsqueda binaria del primer registro sin MAGIC
+        lo, hi = 0, len(mm) // RECORD.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mm[mid * RECORD.size] == MAGIC:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _load_cursor(self, default_seq: int) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.dir, "cursor"), "rb") as fh:
+                return CURSOR.unpack(fh.read(CURSOR.size))
+        except (OSError, struct.error):
+            return default_seq, 0
+
+    def _save_cursor(self):
+        tmp = os.path.join(self.dir, "cursor.tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(CURSOR.pack(self._read_seq, self._read_idx))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, os.path.join(self.dir, "cursor"))
+
+    def _roll(self):
+        """Cierra el segmento lleno y abre el siguiente."""
+        self._write_mm.flush()
+        self._write_mm.close()
+        os.close(self._write_fd)
+        self._write_seq += 1
+        self._write_fd, self._write_mm = self._open_segment(self._write_seq, writable=True)
+        self._write_idx = 0
+
+    # ------------------------------------------------------------- escritura
+    def append(self, rows: List[Row]):
+        with self._lock:
+            for sid, ts, value in rows:
+                if self._write_idx >= self.capacity:
+                    self._roll()
+                RECORD.pack_into(self._write_mm, self._write_idx * RECORD.size,
+                                 MAGIC, sid, value, ts.encode("ascii"))
+                self._write_idx += 1
+
+    def flush(self):
+        """msync del segmento activo (lo llama periódicamente el hilo de replay)."""
+        with self._lock:
+            self._write_mm.flush()
+
+    # ---------------------------------------------------------------- lectura
+    def pending(self) -> int:
+        if self._read_seq == self._write_seq:
+            return max(0, self._write_idx - self._read_idx)
+        full = (self._write_seq - self._read_seq - 1) * self.capacity
+        return (self.capacity - self._read_idx) + full + self._write_idx
+
+    @property
+    def cursor(self) -> Tuple[int, int]:
+        return self._read_seq, self._read_idx
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self.pending() == 0
+
+    def read(self, max_rows: int) -> Tuple[List[Row], Tuple[int, int]]:
+        """
+        Lee hasta max_rows registros desde el cursor sin avanzarlo.
+        Devuelve (filas, token); pasar el token a commit() tras persistirlas.
+        """
+        with self._lock:
+            seq, idx = self._read_seq, self._read_idx
+            if seq == self._write_seq:
+                mm, limit = self._write_mm, self._write_idx
+            else:
+                if self._read_mm_seq != seq:
+                    if self._read_mm is not None:
+                        self._read_mm.close()
+                    fd, self._read_mm = self._open_segment(seq, writable=False)
+                    os.close(fd)
+                    self._read_mm_seq = seq
+                mm, limit = self._read_mm, self.capacity
+
+            end = min(limit, idx + max_rows)
+            rows: List[Row] = []
+            for i in range(idx, end):
+                magic, sid, value, ts = RECORD.unpack_from(mm, i * RECORD.size)
+                if magic != MAGIC:
+                    end = i
+                    break
+                rows.append((sid, ts.rstrip(b"\0").decode("ascii"), value))
+
+            if end >= self.capacity and seq < self._write_seq:
+                return rows, (seq + 1, 0)
+            return rows, (seq, end)
+
+    def commit(self, token: Tuple[int, int]):
+        """Avanza el cursor hasta token y borra los segmentos ya consumidos."""
+        with self._lock:
+            old_seq = self._read_seq
+            self._read_seq, self._read_idx = token
+            self._save_cursor()
+            for seq in range(old_seq, self._read_seq):
+                if seq == self._read_mm_seq and self._read_mm is not None:
+                    self._read_mm.close()
+                    self._read_mm, self._read_mm_seq = None, -1
+                try:
+                    os.remove(self._path(seq))
+                except OSError:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._write_mm.flush()
+            self._write_mm.close()
+            os.close(self._write_fd)
+            if self._read_mm is not None:
+                self._read_mm.close()
+                self._read_mm = None
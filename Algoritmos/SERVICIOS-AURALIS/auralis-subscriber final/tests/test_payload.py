@@ -0,0 +1,38 @@
+# Pruebas de decodificación de payloads (sin broker ni MySQL).
+# Desde /opt/auralis-subscriber: venv/bin/python -m unittest discover tests
+
+import json
+import unittest
+
+import pytz
+
+from payload import parse_batch, parse_payload
+
+TZ = pytz.timezone("America/Guayaquil")
+
+
+class ParsePayloadTests(unittest.TestCase):
+    def test_json_value(self):
+        self.assertEqual(parse_payload(b'{"value": "21.5", "ts": 1718000000}', TZ), (21.5, 1718000000.0))
+
+    def test_non_numeric_json_value_raises_value_error(self):
+        # on_message solo atrapa ValueError: un TypeError detendría el bucle de paho
+        for value in (None, [1], {}, True):
+            with self.assertRaises(ValueError):
+                parse_payload(json.dumps({"value": value}).encode(), TZ)
+
+
+class ParseBatchTests(unittest.TestCase):
+    def test_json_batch(self):
+        self.assertEqual(parse_batch(b'[["Motor_Current", null, 21.3], {"id": 12, "value": "4"}]', TZ),
+                         [("Motor_Current", None, 21.3), (12, None, 4.0)])
+
+    def test_bad_element_types_raise_value_error(self):
+        # Un lote mal formado se descarta entero (ValueError) sin detener el bucle de paho
+        for item in (["s", None, [1]], ["s", None, {}], [[1], None, 2.0], {"sensor": {}, "value": 1}, 7):
+            with self.assertRaises(ValueError):
+                parse_batch(json.dumps([item]).encode(), TZ)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+# /opt/auralis-subscriber/writers.py
+
+import os, io, time, logging, tempfile, threading
+from typing import Dict, List, Sequence, Tuple, Any
+
+from db import DB
+
+Row = Tuple[int, str, float]
+
+TABLE = "measurements_measurement"
+COLUMNS = "(sensor_id, measured_at, value)"
+
+
+class WriterStats:
+    """
+    Acumula filas, lotes y tiempo de escritura por estrategia,
+    para comparar filas/s entre estrategias sobre el mismo MySQL.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, List[float]] = {}  # nombre -> [filas, lotes, segundos]
+
+    def record(self, name: str, rows: int, seconds: float):
+        with self._lock:
+            acc = self._data.setdefault(name, [0, 0, 0.0])
+            acc[0] += rows
+            acc[1] += 1
+            acc[2] += seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {
+                    "rows": rows,
+                    "batches": batches,
+                    "seconds": secs,
+                    "rows_per_sec": (rows / secs) if secs > 0 else 0.0,
+                }
+                for name, (rows, batches, secs) in self._data.items()
+            }
+
+    def log_summary(self):
+        for name, st in self.snapshot().items():
+            logging.info(
+                "Escritura [%s]: %d filas en %d lotes, %.0f filas/s",
+                name, st["rows"], st["batches"], st["rows_per_sec"],
+            )
+
+
+class BulkWriter:
+    """Estrategia base: mide cada escritura y la registra en WriterStats."""
+    name = "base"
+
+    def __init__(self, db: DB, stats: WriterStats):
+        self.db = db
+        self.stats = stats
+
+    def write(self, rows: Sequence[Row]):
+        if not rows:
+            return
+        t0 = time.perf_counter()
+        self._write(rows)
+        self.stats.record(self.name, len(rows), time.perf_counter() - t0)
+
+    def _write(self, rows: Sequence[Row]):
+        raise NotImplementedError
+
+
+class ExecuteManyWriter(BulkWriter):
+    """Comportamiento original: delega en cursor.executemany de PyMySQL."""
+    name = "executemany"
+    SQL = f"INSERT INTO {TABLE} {COLUMNS} VALUES (%s, %s, %s)"
+
+    def _write(self, rows: Sequence[Row]):
+        self.db.executemany(self.SQL, rows)
+
+
+class MultiRowInsertWriter(BulkWriter):
+    """
+    Construye sentencias INSERT ... VALUES (...),(...) explícitas.
+    - Trocea el lote por bytes estimados (max_stmt_bytes, por debajo de
+      max_allowed_packet) y por número de filas (max_rows).
+    - Todos los trozos de un lote van en una única transacción.
+    """
+    name = "multirow"
+    PREFIX = f"INSERT INTO {TABLE} {COLUMNS} VALUES "
+    ROW_PH = "(%s,%s,%s)"
+    # Tamaño fijo aproximado de una fila ya escapada, sin contar el timestamp:
+    # paréntesis, comas, comillas, id y un float con repr completo.
+    ROW_OVERHEAD = 40
+
+    def __init__(self, db: DB, stats: WriterStats, max_stmt_bytes: int = 1_000_000, max_rows: int = 5000):
+        super().__init__(db, stats)
+        self.max_stmt_bytes = max(1024, max_stmt_bytes)
+        self.max_rows = max(1, max_rows)
+        self._sql_cache: Dict[int, str] = {}
+
+    def _sql_for(self, n: int) -> str:
+        sql = self._sql_cache.get(n)
+        if sql is None:
+            sql = self.PREFIX + ",".join([self.ROW_PH] * n)
+            if n == self.max_rows:  # solo cacheamos el tamaño habitual
+                self._sql_cache[n] = sql
+        return sql
+
+    def chunks(self, rows: Sequence[Row]):
+        """Genera trozos de filas que respetan los límites de bytes y filas."""
+        start = 0
+        size = len(self.PREFIX)
+        for i, row in enumerate(rows):
+            row_bytes = self.ROW_OVERHEAD + len(row[1])
+            if i > start and (i - start >= self.max_rows or size + row_bytes > self.max_stmt_bytes):
+                yield rows[start:i]
+                start = i
+                size = len(self.PREFIX)
+            size += row_bytes
+        if start < len(rows):
+            yield rows[start:]
+
+    def _write(self, rows: Sequence[Row]):
+        statements: List[Tuple[str, Tuple[Any, ...]]] = []
+        for chunk in self.chunks(rows):
+            params: List[Any] = []
+            for r in chunk:
+                params.extend(r)
+            statements.append((self._sql_for(len(chunk)), tuple(params)))
+        self.db.execute_batch(statements)
+
+
+class LoadDataWriter(BulkWriter):
+    """
+    Carga el lote con LOAD DATA LOCAL INFILE desde un buffer en memoria.
+    - En Linux usa memfd (el "archivo" vive solo en RAM y se expone como
+      /proc/self/fd/N); si no está disponible, usa un temporal en /dev/shm.
+    - Requiere local_infile=1 en el servidor y en la conexión (DB(local_infile=True)).
+    """
+    name = "loaddata"
+    SQL = (
+        "LOAD DATA LOCAL INFILE %s INTO TABLE " + TABLE + " "
+        "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' " + COLUMNS
+    )
+
+    @staticmethod
+    def encode(rows: Sequence[Row]) -> bytes:
+        buf = io.StringIO()
+        for sid, ts, value in rows:
+            buf.write(f"{int(sid)}\t{ts}\t{float(value)!r}\n")
+        return buf.getvalue().encode("utf-8")
+
+    def _write(self, rows: Sequence[Row]):
+        data = self.encode(rows)
+        if hasattr(os, "memfd_create"):
+            fd = os.memfd_create("auralis-load", 0)
+            try:
+                os.write(fd, data)
+                self.db.execute_batch([(self.SQL, (f"/proc/self/fd/{fd}",))])
+            finally:
+                os.close(fd)
+            return
+
+        tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, prefix="auralis-load-", suffix=".tsv") as fh:
+            fh.write(data)
+            fh.flush()
+            self.db.execute_batch([(self.SQL, (fh.name,))])
+
+
+class AdaptiveWriter(BulkWriter):
+    """
+    Usa INSERT multi-fila por defecto y LOAD DATA para lotes muy grandes.
+    Si LOAD DATA falla, el lote se reintenta con INSERT multi-fila. Solo se desactiva para
+    siempre si el servidor o el cliente rechazan LOCAL INFILE; un error transitorio
+    (deadlock, conexión perdida, timeout) afecta únicamente a ese lote.
+    """
+    name = "adaptive"
+    # ER_NOT_ALLOWED_COMMAND, CR_LOAD_DATA_LOCAL_INFILE_REJECTED, ER_CLIENT_LOCAL_FILES_DISABLED
+    LOCAL_INFILE_REJECTED = (1148, 2068, 3948)
+
+    def __init__(self, db: DB, stats: WriterStats, multirow: MultiRowInsertWriter,
+                 loaddata: "LoadDataWriter | None", load_data_min_rows: int):
+        super().__init__(db, stats)
+        self.multirow = multirow
+        self.loaddata = loaddata
+        self.load_data_min_rows = load_data_min_rows
+
+    def write(self, rows: Sequence[Row]):
+        # Cada sub-estrategia registra sus propias métricas.
+        if not rows:
+            return
+        if self.loaddata is not None and len(rows) >= self.load_data_min_rows:
+            try:
+                self.loaddata.write(rows)
+                return
+            except Exception as e:
+                if self.local_infile_rejected(e):
+                    logging.warning("LOAD DATA deshabilitado tras error (%s). Usando INSERT multi-fila.", e)
+                    self.loaddata = None
+                else:
+                    logging.warning("LOAD DATA falló (%s). Lote de %d filas con INSERT multi-fila.", e, len(rows))
+        self.multirow.write(rows)
+
+    @classmethod
+    def local_infile_rejected(cls, exc: Exception) -> bool:
+        code = exc.args[0] if exc.args else None
+        if code in cls.LOCAL_INFILE_REJECTED:
+            return True
+        # PyMySQL sin local_infile en la conexión no recibe un código del servidor
+        return isinstance(exc, RuntimeError) and "local_infile" in str(exc)
+
+
+class LatestValueWriter(BulkWriter):
+    """
+    Mantiene measurements_sensorlatest (último valor por sensor) para el dashboard y el mapa.
+    - Reduce el lote a la lectura más reciente de cada sensor (measured_at tiene formato
+      fijo 'YYYY-mm-dd HH:MM:SS', así que la comparación de texto es cronológica).
+    - Upsert multi-fila: solo reemplaza si la lectura no es más vieja que la guardada, así un
+      replay del log de desborde no hace retroceder el valor.
+    - Filas ordenadas por sensor_id: los hilos escritores y el replay toman los bloqueos de
+      fila en el mismo orden y no se bloquean mutuamente (deadlock).
+    - Usa el alias de fila (AS new, MySQL >= 8.0.19) en lugar de VALUES(), obsoleto desde 8.0.20.
+    """
+    name = "latest"
+    TABLE = "measurements_sensorlatest"
+    PREFIX = f"INSERT INTO {TABLE} (sensor_id, measured_at, value) VALUES "
+    # MySQL aplica las asignaciones en orden: value se decide antes de mover measured_at
+    SUFFIX = (
+        " AS new ON DUPLICATE KEY UPDATE"
+        " value = IF(new.measured_at >= measured_at, new.value, value),"
+        " measured_at = GREATEST(measured_at, new.measured_at)"
+    )
+    ROW_PH = "(%s,%s,%s)"
+
+    def __init__(self, db: DB, stats: WriterStats, max_rows: int = 1000):
+        super().__init__(db, stats)
+        self.max_rows = max(1, max_rows)
+
+    @staticmethod
+    def latest(rows: Sequence[Row]) -> List[Row]:
+        last: Dict[int, Row] = {}
+        for row in rows:
+            prev = last.get(row[0])
+            if prev is None or row[1] >= prev[1]:
+                last[row[0]] = row
+        return [last[sid] for sid in sorted(last)]
+
+    def write(self, rows: Sequence[Row]):
+        super().write(self.latest(rows))
+
+    def _write(self, rows: Sequence[Row]):
+        statements: List[Tuple[str, Tuple[Any, ...]]] = []
+        for i in range(0, len(rows), self.max_rows):
+            chunk = rows[i:i + self.max_rows]
+            params: List[Any] = []
+            for r in chunk:
+                params.extend(r)
+            statements.append((self.PREFIX + ",".join([self.ROW_PH] * len(chunk)) + self.SUFFIX, tuple(params)))
+        self.db.execute_batch(statements)
+
+
+def make_writer(settings, db: DB, stats: "WriterStats | None" = None) -> BulkWriter:
+    """Construye la estrategia de escritura configurada en WRITE_STRATEGY."""
+    stats = stats or WriterStats()
+    strategy = (settings.WRITE_STRATEGY or "multirow").lower()
+
+    if strategy == "executemany":
+        return ExecuteManyWriter(db, stats)
+
+    multirow = MultiRowInsertWriter(db, stats, settings.WRITE_MAX_STMT_BYTES, settings.WRITE_MAX_ROWS_PER_STMT)
+    if strategy == "loaddata":
+        return AdaptiveWriter(db, stats, multirow, LoadDataWriter(db, stats), load_data_min_rows=1)
+    if strategy != "multirow":
+        logging.warning("WRITE_STRATEGY desconocida '%s'. Usando 'multirow'.", strategy)
+    if settings.LOAD_DATA_ENABLED:
+        return AdaptiveWriter(db, stats, multirow, LoadDataWriter(db, stats), settings.LOAD_DATA_MIN_ROWS)
+    return multirow
@@ -126,6 +126,7 @@ def main():
     # topic normalizado -> (sensor_id, mn, mx)  (mn/mx por si luego validas)
     topic_to_sid: Dict[str, Tuple[int, Optional[float], Optional[float]]] = {}
     subs: list[str] = []
+    stations: set[str] = set()
 
     # Normalizador de tópico para lookup
     def norm(t: str) -> str:
@@ -136,24 +137,20 @@ def main():
         sensor  = r["sensor_name"].strip()
         sid, mn, mx = db.map[(station.lower(), sensor.lower())]
 
-        # Suscribir a TODAS las variantes para evitar misses:
-        variants = [
-            f"{station}/{sensor}",
-            f"{station}/{sensor}/",
-            f"/{station}/{sensor}",
-            f"/{station}/{sensor}/",
-        ]
-        for vt in variants:
-            key = norm(vt)
-            topic_to_sid[key] = (sid, mn, mx)
-            subs.append(vt)
+        # Lookup por tópico normalizado: cubre las variantes con/sin slash inicial y final
+        topic_to_sid[norm(f"{station}/{sensor}")] = (sid, mn, mx)
+        stations.add(station)
+
+    # Dos comodines por estación en vez de cuatro variantes por sensor
+    for station in sorted(stations):
+        subs.extend([f"{station}/#", f"/{station}/#"])
 
     client = MqttClient(client_id=f"ingestor_local_now_{os.getpid()}", transport="websockets")
     client.ws_set_options(path=MQTT_WS_PATH)
 
     def on_connect(cli, userdata, flags, rc):
         if rc == 0:
-            # Suscribir todas las variantes (duplicados no dañan; el broker lo maneja)
+            # Suscribir los comodines por estación (sin duplicados)
             uniq = []
             seen = set()
             for t in subs:
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import time
+import json
+import struct
 import random
 from collections import OrderedDict
 from datetime import datetime
@@ -29,6 +31,13 @@ def make_topic(station: str, sensor: str) -> str:
     """Devuelve /<station>/<sensor>/ con slash inicial y final."""
     return f"/{station}/{sensor}/"
 
+# Modo de publicación:
+#   "single"       -> un mensaje por sensor en /<station>/<sensor>/ (texto)
+#   "batch-json"   -> un mensaje por ciclo en /<station>/_batch/ con [[sensor, ts, valor], ...]
+#   "batch-packed" -> igual, pero empaquetado binario (ver encode_batch_packed)
+PUBLISH_MODE = "single"
+BATCH_LEVEL = "_batch"
+
 # ========================
 # Generadores de valores
 # ========================
@@ -98,6 +107,21 @@ RETAIN = False
 def ts() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+def encode_batch_json(readings) -> str:
+    """[(sensor, epoch, valor), ...] -> JSON [[sensor, epoch, valor], ...]"""
+    return json.dumps([[name, round(epoch, 3), value] for name, epoch, value in readings])
+
+def encode_batch_packed(readings) -> bytes:
+    """
+    Cabecera '<BH' (0xB1, cantidad) y por lectura: len(nombre) + nombre utf-8 + '<dd' (epoch, valor).
+    Mismo formato que decodifica auralis-subscriber / rule-engine (parse_batch).
+    """
+    out = bytearray(struct.pack("<BH", 0xB1, len(readings)))
+    for name, epoch, value in readings:
+        key = name.encode("utf-8")
+        out += struct.pack("<B", len(key)) + key + struct.pack("<dd", epoch, value)
+    return bytes(out)
+
 # ========================
 # Callbacks
 # ========================
@@ -143,7 +167,23 @@ def main():
         for name in SENSORS:
             print(f"  - {make_topic(STATION, name)}")
 
+        if PUBLISH_MODE != "single":
+            print(f"  (modo {PUBLISH_MODE}: todo en {make_topic(STATION, BATCH_LEVEL)})")
+
         while True:
+            if PUBLISH_MODE != "single":
+                now = time.time()
+                readings = [(name, now, float(gen_func())) for name, gen_func in SENSORS.items()]
+                if PUBLISH_MODE == "batch-packed":
+                    payload = encode_batch_packed(readings)
+                else:
+                    payload = encode_batch_json(readings)
+                topic = make_topic(STATION, BATCH_LEVEL)
+                client.publish(topic, payload, qos=QOS, retain=RETAIN)
+                print(f"[{ts()}] TX  {topic} -> {len(readings)} lecturas ({len(payload)} bytes)")
+                time.sleep(PUBLISH_INTERVAL_SEC)
+                continue
+
             for sensor_name, gen_func in SENSORS.items():
                 value = gen_func()
                 topic = make_topic(STATION, sensor_name)
@@ -135,6 +135,16 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.file'
 #SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 #SESSION_COOKIE_AGE = 1209600  # 2 semanas en segundos
 
+# Caché compartida entre procesos (mapa: CoreApps/main/map_cache.py). Sin REDIS_HOST se usa
+# la caché local de cada proceso.
+if os.getenv('REDIS_HOST'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f"redis://{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT', 6379)}/{os.getenv('CACHE_REDIS_DB', 1)}",
+        }
+    }
+
 ## Configuración adicional recomendada
 #CONN_MAX_AGE = 60  # Persistencia de conexiones en segundos
 
@@ -213,4 +223,39 @@ REST_FRAMEWORK = {
 
 # --- CLAVE SECRETA PARA EL SERVICIO DE PREDICCIÓN ---
 # Cambia esto por una cadena de texto larga, aleatoria y secreta
-PREDICTION_SERVICE_API_KEY = "tu-clave-super-secreta-y-larga-aqui"
\ No newline at end of file
+PREDICTION_SERVICE_API_KEY = "tu-clave-super-secreta-y-larga-aqui"
+
+# --- CHANGE-FEED DE CONFIGURACIÓN (Redis pub/sub) ---
+# Los cambios de Sensor, AlertPolicy, Rule, Condition y RuleNode se publican en este canal
+# para que el motor de reglas y los servicios MQTT apliquen solo el delta.
+# Sin REDIS_HOST (o sin el paquete redis) no se publica nada.
+CONFIG_CHANGES_REDIS_HOST = os.getenv('REDIS_HOST')
+CONFIG_CHANGES_REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+CONFIG_CHANGES_REDIS_DB = int(os.getenv('REDIS_DB', 0))
+CONFIG_CHANGES_CHANNEL = os.getenv('CONFIG_CHANGES_CHANNEL', 'auralis:config_changes')
+
+# --- PARTICIONADO DE MEDICIONES (manage.py manage_partitions) ---
+# Particiones semanales de measurements_measurement creadas con esta antelación.
+MEASUREMENT_PARTITION_WEEKS_AHEAD = int(os.getenv('MEASUREMENT_PARTITION_WEEKS_AHEAD', 4))
+# 0 = conservar todo; si no, se eliminan (o archivan) las particiones más antiguas que esto
+MEASUREMENT_RETENTION_DAYS = int(os.getenv('MEASUREMENT_RETENTION_DAYS', 0))
+MEASUREMENT_RETENTION_ARCHIVE = os.getenv('MEASUREMENT_RETENTION_ARCHIVE', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+# --- AGREGADOS DE MEDICIONES 1m/5m/1h (manage.py compact_rollups) ---
+# Margen para lecturas tardías: cada pasada recalcula desde la última cubeta de 1m menos esto
+MEASUREMENT_ROLLUP_LATENESS_SECONDS = int(os.getenv('MEASUREMENT_ROLLUP_LATENESS_SECONDS', 300))
+# Días a rellenar cuando la tabla de agregados está vacía
+MEASUREMENT_ROLLUP_BACKFILL_DAYS = int(os.getenv('MEASUREMENT_ROLLUP_BACKFILL_DAYS', 7))
+MEASUREMENT_ROLLUP_CHUNK_SIZE = int(os.getenv('MEASUREMENT_ROLLUP_CHUNK_SIZE', 5000))
+# Puntos por serie con ?resolution=auto sin ?points=
+MEASUREMENT_ROLLUP_DEFAULT_POINTS = int(os.getenv('MEASUREMENT_ROLLUP_DEFAULT_POINTS', 500))
+# Con resolution=auto, si la última cubeta de 1m es más vieja que esto se sirven lecturas crudas
+MEASUREMENT_ROLLUP_MAX_LAG_SECONDS = int(os.getenv('MEASUREMENT_ROLLUP_MAX_LAG_SECONDS', 600))
+# Lecturas por página en las exportaciones NDJSON/CSV de get_station_data (?format=)
+MEASUREMENT_EXPORT_CHUNK_SIZE = int(os.getenv('MEASUREMENT_EXPORT_CHUNK_SIZE', 5000))
+
+# --- MAPA DE ESTACIONES (/api/map/stations/) ---
+# Parte estática (estaciones y sensores) por ámbito de usuario; se invalida al editar
+MAP_STATIC_CACHE_SECONDS = int(os.getenv('MAP_STATIC_CACHE_SECONDS', 300))
+# Respuesta completa con últimos valores: los sondeos dentro de este lapso no consultan la BD
+MAP_LATEST_CACHE_SECONDS = int(os.getenv('MAP_LATEST_CACHE_SECONDS', 5))
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'CoreApps.main'
+
+    def ready(self):
+        # Invalidación de la caché del mapa
+        from . import signals  # noqa: F401
@@ -0,0 +1,64 @@
+# CoreApps/main/dashboard.py
+
+"""
+Datos del dashboard principal (DashboardView) en un número fijo de consultas, sin importar
+cuántas estaciones o sensores tenga el usuario:
+
+1. estaciones del usuario,
+2. sus sensores (prefetch_related),
+3. último valor de cada sensor (measurements_sensorlatest),
+4. advertencias sin reconocer agrupadas por sensor,
+5. alarmas activas agrupadas por sensor.
+"""
+
+from django.db.models import Count, Prefetch
+
+from CoreApps.events.models import Alarm, Warning
+from CoreApps.measurements.latest import get_latest
+from CoreApps.sensorhub.models import Sensor, Station
+
+
+def _counts_by_sensor(queryset, sensor_ids):
+    return dict(queryset.filter(sensor_id__in=sensor_ids)
+                .values_list('sensor_id').annotate(n=Count('id')).order_by())
+
+
+def load_dashboard(user):
+    """Contexto de main_dashboard.html: stations, active_count, warning_count, alarm_count, station_data."""
+    stations = list(
+        Station.objects.filter(related_users=user)
+        .prefetch_related(Prefetch('sensors', queryset=Sensor.objects.only('id', 'name', 'station_id')))
+    )
+    sensor_ids = [sensor.id for station in stations for sensor in station.sensors.all()]
+
+    last_values = get_latest(sensor_ids)
+    warnings = _counts_by_sensor(Warning.objects.filter(acknowledged=False), sensor_ids)
+    alarms = _counts_by_sensor(Alarm.objects.filter(is_active=True), sensor_ids)
+
+    station_data = []
+    for station in stations:
+        sensors_list = []
+        for sensor in station.sensors.all():
+            last_value, last_timestamp = last_values.get(sensor.id, (None, None))
+            sensors_list.append({
+                'id': sensor.id,
+                'name': sensor.name,
+                'last_value': last_value,
+                'last_timestamp': last_timestamp,
+            })
+        station_data.append({
+            'id': station.id,
+            'name': station.name,
+            'is_active': station.is_active,
+            'sensors': sensors_list,
+            'warning_count': sum(warnings.get(s['id'], 0) for s in sensors_list),
+            'alarm_count': sum(alarms.get(s['id'], 0) for s in sensors_list),
+        })
+
+    return {
+        'stations': stations,
+        'active_count': sum(1 for station in stations if station.is_active),
+        'warning_count': sum(warnings.values()),
+        'alarm_count': sum(alarms.values()),
+        'station_data': station_data,
+    }
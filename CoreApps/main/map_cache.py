@@ -0,0 +1,161 @@
+# CoreApps/main/map_cache.py
+
+"""
+Caché del endpoint del mapa (StationLocationsView, /api/map/stations/).
+
+- La parte estática (coordenadas de estaciones y metadatos de sensores) se guarda por ámbito
+  de usuario bajo la versión de ese ámbito: global + empresa + usuario (o global + 'all' para
+  un superusuario). signals.py cambia solo las versiones afectadas al guardar o borrar
+  Station/Sensor/Company (su empresa, los usuarios vinculados a la estación y 'all') o al
+  cambiar los usuarios de una estación; SensorType cambia la global. Las entradas anteriores
+  quedan huérfanas (y vencen solas por TTL) y el resto de los usuarios conserva su ETag.
+- Los últimos valores se mezclan desde measurements_sensorlatest (una consulta por clave
+  primaria) y la respuesta completa se guarda MAP_LATEST_CACHE_SECONDS segundos, con su ETag
+  (hash del cuerpo) y Last-Modified. Un sondeo con If-None-Match dentro de ese lapso se
+  responde 304 desde la caché, sin consultas a la BD más allá de la autenticación.
+
+Con varios procesos (gunicorn) la caché debe ser compartida (CACHES con Redis); con la caché
+local por proceso, la invalidación solo alcanza al proceso que guardó el cambio y el resto
+espera al vencimiento de MAP_STATIC_CACHE_SECONDS.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.http import quote_etag
+
+from CoreApps.measurements.latest import get_latest
+from CoreApps.sensorhub.models import Sensor, Station
+
+VERSION_KEY = 'map:stations:version'
+ALL_SCOPE = 'all'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def version_keys(user):
+    """Claves de versión de las que depende el mapa del usuario."""
+    if user.is_superuser:
+        return [VERSION_KEY, f'{VERSION_KEY}:{ALL_SCOPE}']
+    return [VERSION_KEY, f'{VERSION_KEY}:c{user.company_id}', f'{VERSION_KEY}:u{user.pk}']
+
+
+def static_version(user):
+    """
+    (versión, instante en ns del último cambio) del ámbito del usuario. Cada clave guarda el
+    instante de su último cambio; las que la caché no tiene se crean con el instante actual.
+    """
+    keys = version_keys(user)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = cache.get_or_set(key, time.time_ns(), None)
+    return '-'.join(str(versions[key]) for key in keys), max(versions.values())
+
+
+def invalidate(company_ids=(), user_ids=(), everything=False):
+    """
+    Cambia las versiones de las empresas y usuarios indicados (y siempre la de los
+    superusuarios); con `everything`, la global. Un instante nuevo (en lugar de incr)
+    también es seguro si la clave fue desalojada.
+    """
+    now = time.time_ns()
+    keys = [f'{VERSION_KEY}:{ALL_SCOPE}']
+    keys += [f'{VERSION_KEY}:c{pk}' for pk in company_ids if pk is not None]
+    keys += [f'{VERSION_KEY}:u{pk}' for pk in user_ids]
+    if everything:
+        keys.append(VERSION_KEY)
+    cache.set_many({key: now for key in keys}, None)
+
+
+def scope_key(user):
+    return ALL_SCOPE if user.is_superuser else f'u{user.pk}-c{user.company_id}'
+
+
+def stations_for(user):
+    qs = Station.objects.filter(is_active=True, latitude__isnull=False, longitude__isnull=False)
+    if not user.is_superuser:
+        # Subconsulta en lugar de OR sobre el JOIN M2M: sin filas duplicadas ni .distinct()
+        qs = qs.filter(Q(company_id=user.company_id) | Q(id__in=user.stations.values('id')))
+    return qs
+
+
+def build_static(user):
+    """Estaciones con sus sensores, sin últimos valores. Dos consultas."""
+    stations = list(stations_for(user).select_related('company'))
+    sensors_by_station = {}
+    sensors = (Sensor.objects.filter(station__in=[st.id for st in stations])
+               .values('id', 'name', 'is_active', 'station_id', 'sensor_type__unit'))
+    for s in sensors:
+        sensors_by_station.setdefault(s['station_id'], []).append({
+            "id": s['id'],
+            "name": s['name'],
+            "unit": s['sensor_type__unit'] or "",
+            "is_active": s['is_active'],
+        })
+
+    out = []
+    for st in stations:
+        sensor_list = sensors_by_station.get(st.id, [])
+        out.append({
+            "id": st.id,
+            "name": st.name,
+            "description": st.description or "",
+            "lat": float(st.latitude),
+            "lng": float(st.longitude),
+            "company": st.company.name,
+            "is_active": st.is_active,
+            "sensor_count": len(sensor_list),
+            "sensor_active_count": sum(1 for s in sensor_list if s["is_active"]),
+            "sensors": sensor_list,
+        })
+    return out
+
+
+def _merge(stations, last_values):
+    merged = []
+    for st in stations:
+        sensors = []
+        for s in st["sensors"]:
+            value, measured_at = last_values.get(s["id"], (None, None))
+            sensors.append({
+                **s,
+                "last_value": None if value is None else float(value),
+                "last_ts": measured_at.isoformat() if measured_at else None,
+            })
+        merged.append({**st, "sensors": sensors})
+    return merged
+
+
+def get_response_entry(user):
+    """{'body': bytes, 'etag': str, 'last_modified': epoch int} del mapa para el usuario."""
+    version, changed_ns = static_version(user)
+    scope = scope_key(user)
+    entry_key = f'map:stations:response:{version}:{scope}'
+    entry = cache.get(entry_key)
+    if entry is not None:
+        return entry
+
+    static_key = f'map:stations:static:{version}:{scope}'
+    stations = cache.get(static_key)
+    if stations is None:
+        stations = build_static(user)
+        cache.set(static_key, stations, _setting('MAP_STATIC_CACHE_SECONDS', 300))
+
+    last_values = get_latest(s["id"] for st in stations for s in st["sensors"])
+    body = json.dumps({"stations": _merge(stations, last_values)}, cls=DjangoJSONEncoder).encode()
+    last_modified = max([changed_ns / 1e9] + [measured_at.timestamp() for _, measured_at in last_values.values()])
+    entry = {
+        'body': body,
+        'etag': quote_etag(hashlib.sha1(body).hexdigest()),
+        'last_modified': int(last_modified),
+    }
+    cache.set(entry_key, entry, _setting('MAP_LATEST_CACHE_SECONDS', 5))
+    return entry
@@ -0,0 +1,88 @@
+# CoreApps/main/signals.py
+
+"""
+Invalida la caché del mapa (map_cache) cuando cambian estaciones, sensores o sus usuarios.
+Solo cambia la versión de los ámbitos que ven el objeto: la empresa de la estación y los
+usuarios vinculados a ella. Los borrados se atienden en pre_delete, mientras la estación
+todavía conserva sus usuarios, y pre_save recuerda la empresa (o estación) anterior para
+invalidar también el ámbito del que sale el objeto.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from CoreApps.sensorhub.models import Sensor, SensorType, Station
+from CoreApps.users.models import Company, User
+
+from . import map_cache
+
+
+def _invalidate_on_commit(**scope):
+    # Tras el commit: si se invalidara antes, otra petición podría cachear los datos viejos
+    transaction.on_commit(lambda: map_cache.invalidate(**scope))
+
+
+def _station_scope(station_id, company_id):
+    user_ids = list(User.objects.filter(stations=station_id).values_list('id', flat=True))
+    return {'company_ids': [company_id], 'user_ids': user_ids}
+
+
+@receiver(pre_save, sender=Station, dispatch_uid='map_cache_previous_station')
+def remember_station_company(sender, instance, **kwargs):
+    if instance.pk:
+        instance._map_previous_company_id = (
+            Station.objects.filter(pk=instance.pk).values_list('company_id', flat=True).first())
+
+
+@receiver(post_save, sender=Station, dispatch_uid='map_cache_save_station')
+@receiver(pre_delete, sender=Station, dispatch_uid='map_cache_delete_station')
+def station_changed(sender, instance, **kwargs):
+    scope = _station_scope(instance.pk, instance.company_id)
+    previous = getattr(instance, '_map_previous_company_id', None)
+    if previous is not None and previous != instance.company_id:
+        scope['company_ids'].append(previous)
+    _invalidate_on_commit(**scope)
+
+
+@receiver(pre_save, sender=Sensor, dispatch_uid='map_cache_previous_sensor')
+def remember_sensor_station(sender, instance, **kwargs):
+    if instance.pk:
+        instance._map_previous_station_id = (
+            Sensor.objects.filter(pk=instance.pk).values_list('station_id', flat=True).first())
+
+
+@receiver(post_save, sender=Sensor, dispatch_uid='map_cache_save_sensor')
+@receiver(pre_delete, sender=Sensor, dispatch_uid='map_cache_delete_sensor')
+def sensor_changed(sender, instance, **kwargs):
+    station_ids = {instance.station_id, getattr(instance, '_map_previous_station_id', None)} - {None}
+    for station_id, company_id in Station.objects.filter(pk__in=station_ids).values_list('id', 'company_id'):
+        _invalidate_on_commit(**_station_scope(station_id, company_id))
+
+
+@receiver(post_save, sender=Company, dispatch_uid='map_cache_save_company')
+@receiver(pre_delete, sender=Company, dispatch_uid='map_cache_delete_company')
+def company_changed(sender, instance, **kwargs):
+    # El nombre de la empresa también lo ven los usuarios vinculados a sus estaciones
+    user_ids = list(User.objects.filter(stations__company=instance.pk).values_list('id', flat=True).distinct())
+    _invalidate_on_commit(company_ids=[instance.pk], user_ids=user_ids)
+
+
+@receiver(post_save, sender=SensorType, dispatch_uid='map_cache_save_sensortype')
+@receiver(pre_delete, sender=SensorType, dispatch_uid='map_cache_delete_sensortype')
+def sensor_type_changed(sender, instance, **kwargs):
+    # La unidad aparece en todos los mapas
+    _invalidate_on_commit(everything=True)
+
+
+@receiver(m2m_changed, sender=Station.related_users.through, dispatch_uid='map_cache_station_users')
+def station_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if reverse:
+        # user.stations.add(...): instance es el usuario
+        _invalidate_on_commit(user_ids=[instance.pk])
+    elif action == 'pre_clear':
+        _invalidate_on_commit(**_station_scope(instance.pk, instance.company_id))
+    else:
+        _invalidate_on_commit(user_ids=list(pk_set or ()))
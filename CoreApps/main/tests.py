@@ -1,3 +1,233 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from CoreApps.events.models import Alarm, Warning
+from CoreApps.main import map_cache
+from CoreApps.main.dashboard import load_dashboard
+from CoreApps.measurements.models import Measurement, SensorLatest
+from CoreApps.sensorhub.models import Sensor, SensorType, Station
+from CoreApps.users.models import Company, User
+
+
+class StationDataQueryCountTests(TestCase):
+    """get_station_data debe usar un número fijo de consultas, no 3 por sensor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Empresa')
+        cls.sensor_type = SensorType.objects.create(name='Temperatura', unit='C')
+        cls.user = User.objects.create_user(email='operador@example.com', password='clave',
+                                            identification_number='1234567890', company=cls.company)
+        cls.end = datetime(2025, 1, 1, 12, 0)
+        cls.start = cls.end - timedelta(hours=1)
+
+    def make_station(self, n_sensors, readings=10):
+        station = Station.objects.create(name=f'Estación {n_sensors}', company=self.company)
+        station.related_users.add(self.user)
+        sensors = [Sensor.objects.create(name=f'S{i}', station=station, sensor_type=self.sensor_type)
+                   for i in range(n_sensors)]
+        Measurement.objects.bulk_create([
+            Measurement(sensor=s, measured_at=self.end - timedelta(minutes=i), value=float((i * 7 + s.id) % 11))
+            for s in sensors for i in range(readings)
+        ])
+        for s in sensors[:2]:
+            Alarm.objects.create(sensor=s, triggering_value=1.0)
+            Warning.objects.create(sensor=s, triggering_value=1.0)
+        Alarm.objects.update(started_at=self.end - timedelta(minutes=5))
+        Warning.objects.update(started_at=self.end - timedelta(minutes=5))
+        return station, sensors
+
+    def get(self, station):
+        return self.client.get(reverse('get_station_data'), {
+            'station_id': station.id,
+            'start_date': self.start.isoformat(),
+            'end_date': self.end.isoformat(),
+        })
+
+    def count_queries(self, station):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(station)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_query_count_does_not_depend_on_sensor_count(self):
+        self.client.force_login(self.user)
+        small, _ = self.make_station(2)
+        large, _ = self.make_station(25)
+        self.assertEqual(self.count_queries(small), self.count_queries(large))
+
+        # usuario de la sesión, estación, sensores, 2 conteos de eventos, resumen agrupado, extremos, lecturas
+        with self.assertNumQueries(8):
+            self.get(large)
+
+    def test_summary_matches_readings(self):
+        self.client.force_login(self.user)
+        station, sensors = self.make_station(3)
+        data = self.get(station).json()
+
+        for item in data['sensors']:
+            readings = list(Measurement.objects.filter(sensor_id=item['sensor_id'])
+                            .order_by('measured_at').values_list('measured_at', 'value'))
+            values = [v for _, v in readings]
+            summary = item['summary']
+            self.assertEqual(len(item['readings']), len(readings))
+            self.assertEqual(summary['max_value'], max(values))
+            self.assertEqual(summary['min_value'], min(values))
+            self.assertAlmostEqual(summary['avg_value'], sum(values) / len(values))
+            # Ante empates, el instante más temprano
+            self.assertEqual(summary['max_timestamp'], next(t for t, v in readings if v == max(values)).isoformat())
+            self.assertEqual(summary['min_timestamp'], next(t for t, v in readings if v == min(values)).isoformat())
+
+        counts = {item['sensor_id']: (item['summary']['total_alarms'], item['summary']['total_warnings'])
+                  for item in data['sensors']}
+        self.assertEqual(counts, {sensors[0].id: (1, 1), sensors[1].id: (1, 1), sensors[2].id: (0, 0)})
+
+
+class StationHistoryTests(TestCase):
+    """El histórico crudo pagina por (measured_at, id) sin perder lecturas de la ventana."""
+
+    @override_settings(MEASUREMENT_EXPORT_CHUNK_SIZE=1)
+    def test_raw_history_pages_every_reading(self):
+        company = Company.objects.create(name='Empresa')
+        user = User.objects.create_user(email='operador@example.com', password='clave',
+                                        identification_number='1234567890', company=company)
+        station = Station.objects.create(name='Norte', company=company)
+        station.related_users.add(user)
+        sensor_type = SensorType.objects.create(name='Temperatura', unit='C')
+        a, b = [Sensor.objects.create(name=n, station=station, sensor_type=sensor_type) for n in ('A', 'B')]
+        now = datetime.now().replace(microsecond=0)
+        same = now - timedelta(minutes=2)
+        Measurement.objects.bulk_create([
+            Measurement(sensor=a, measured_at=now - timedelta(minutes=10), value=0.0),  # fuera de 5m
+            Measurement(sensor=a, measured_at=same, value=1.0),
+            Measurement(sensor=a, measured_at=same, value=2.0),
+            Measurement(sensor=a, measured_at=now + timedelta(seconds=30), value=3.0),  # reloj adelantado
+            Measurement(sensor=b, measured_at=same, value=4.0),
+        ])
+
+        self.client.force_login(user)
+        response = self.client.get(reverse('get_station_history', args=[station.id]), {'timescale': '5m'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([value for _, value in data[str(a.id)]], [1.0, 2.0, 3.0])
+        self.assertEqual([value for _, value in data[str(b.id)]], [4.0])
+
+
+class DashboardQueryCountTests(TestCase):
+    """El dashboard carga estaciones, sensores, últimos valores y conteos en consultas fijas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Empresa')
+        sensor_type = SensorType.objects.create(name='Presión', unit='psi')
+        cls.user = User.objects.create_user(email='supervisor@example.com', password='clave',
+                                            identification_number='0987654321', company=company)
+        cls.measured_at = datetime(2025, 1, 1, 12, 0)
+        sensors = []
+        for i in range(100):
+            station = Station.objects.create(name=f'Estación {i:03}', company=company, is_active=i % 10 != 0)
+            station.related_users.add(cls.user)
+            sensors += [Sensor(name=f'S{i}-{j}', station=station, sensor_type=sensor_type) for j in range(3)]
+        Sensor.objects.bulk_create(sensors)
+        sensors = list(Sensor.objects.order_by('id'))
+        SensorLatest.objects.bulk_create([
+            SensorLatest(sensor=s, value=float(s.id), measured_at=cls.measured_at) for s in sensors[::2]
+        ])
+        for s in sensors[:5]:
+            Alarm.objects.create(sensor=s, triggering_value=1.0)
+            Warning.objects.create(sensor=s, triggering_value=1.0)
+        Alarm.objects.create(sensor=sensors[5], triggering_value=1.0, is_active=False)
+        Warning.objects.create(sensor=sensors[6], triggering_value=1.0, acknowledged=True)
+        cls.sensors = sensors
+
+    def test_loader_uses_fixed_query_count(self):
+        # estaciones, sensores (prefetch), últimos valores, advertencias, alarmas
+        with self.assertNumQueries(5):
+            data = load_dashboard(self.user)
+
+        self.assertEqual(len(data['station_data']), 100)
+        self.assertEqual(data['active_count'], 90)
+        self.assertEqual(data['alarm_count'], 5)
+        self.assertEqual(data['warning_count'], 5)
+
+        sensors = {s['id']: s for station in data['station_data'] for s in station['sensors']}
+        self.assertEqual(len(sensors), 300)
+        with_value, without_value = self.sensors[0], self.sensors[1]
+        self.assertEqual(sensors[with_value.id]['last_value'], float(with_value.id))
+        self.assertEqual(sensors[with_value.id]['last_timestamp'], self.measured_at)
+        self.assertIsNone(sensors[without_value.id]['last_value'])
+
+    def test_view_query_count_is_constant(self):
+        self.client.force_login(self.user)
+        # usuario de la sesión (sesiones en archivo) y las 5 del loader
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['station_data']), 100)
+
+
+class StationMapCacheTests(TestCase):
+    """El mapa responde 304 sin consultas (salvo la autenticación) mientras nada cambie."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Empresa')
+        sensor_type = SensorType.objects.create(name='Caudal', unit='bpd')
+        cls.user = User.objects.create_user(email='mapa@example.com', password='clave',
+                                            identification_number='1122334455', company=cls.company)
+        cls.station = Station.objects.create(name='Norte', company=cls.company, latitude=-0.2, longitude=-78.5)
+        cls.sensor = Sensor.objects.create(name='Q1', station=cls.station, sensor_type=sensor_type)
+        SensorLatest.objects.create(sensor=cls.sensor, value=12.5, measured_at=datetime(2025, 1, 1, 12, 0))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_unchanged_poll_returns_304_from_cache(self):
+        first = self.client.get(reverse('api-map-stations'))
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('Last-Modified'))
+        sensor = first.json()['stations'][0]['sensors'][0]
+        self.assertEqual((sensor['last_value'], sensor['last_ts']), (12.5, '2025-01-01T12:00:00'))
+
+        # Solo el usuario de la sesión
+        with self.assertNumQueries(1):
+            again = self.client.get(reverse('api-map-stations'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_station_save_invalidates_static_part(self):
+        first = self.client.get(reverse('api-map-stations'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.station.name = 'Norte 2'
+            self.station.save()
+
+        changed = self.client.get(reverse('api-map-stations'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.json()['stations'][0]['name'], 'Norte 2')
+
+    def test_station_save_keeps_other_companies_cached(self):
+        other_company = Company.objects.create(name='Otra', ruc='0999999999001')
+        other = User.objects.create_user(email='otra@example.com', password='clave',
+                                         identification_number='5544332211', company=other_company)
+        Station.objects.create(name='Sur', company=other_company, latitude=-2.1, longitude=-79.9)
+        own_version = map_cache.static_version(self.user)[0]
+        self.client.force_login(other)
+        first = self.client.get(reverse('api-map-stations'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.station.name = 'Norte 3'
+            self.station.save()
+
+        self.assertNotEqual(map_cache.static_version(self.user)[0], own_version)
+        # La versión de la otra empresa no cambió: su respuesta sigue en caché
+        with self.assertNumQueries(1):
+            again = self.client.get(reverse('api-map-stations'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
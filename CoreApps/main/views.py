@@ -10,11 +10,15 @@ from django.views.generic import TemplateView
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from CoreApps.sensorhub.models import Sensor, Station, AlertPolicy, SensorType
+from CoreApps.sensorhub.policy_resolver import get_effective_thresholds
 from CoreApps.users.models import User
 from CoreApps.measurements.models import Measurement
+from CoreApps.measurements import downsampling, exports, rollups, summaries
 from CoreApps.events.models import Alarm, Warning
 # Añadir esta importación para JsonResponse
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.db import models
 
 from django.conf import settings
@@ -23,7 +27,7 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 
 from django.views import View
-from django.db.models import Q, OuterRef, Subquery
+from django.db.models import Q, Count
 
 import json
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden
@@ -34,6 +38,8 @@ from django.db import transaction
 
 from CoreApps.users.models import Company
 from .models import SettingAuditLog
+from .dashboard import load_dashboard
+from . import map_cache
 
 class CustomLoginView(LoginView):
     template_name = 'main/login.html'
@@ -74,36 +80,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        stations = Station.objects.filter(related_users=user)
-        context['stations'] = stations
-        context['active_count'] = stations.filter(is_active=True).count()
-
-        sensor_ids = []
-        for station in stations:
-            sensor_ids.extend(list(station.sensors.values_list('id', flat=True)))
-
-        context['warning_count'] = Warning.objects.filter(sensor_id__in=sensor_ids, acknowledged=False).count()
-        context['alarm_count'] = Alarm.objects.filter(sensor_id__in=sensor_ids, is_active=True).count()
-
-        station_data = []
-        for station in stations:
-            sensors_list = []
-            for sensor in station.sensors.all():
-                last_measurement = sensor.measurements.order_by('-measured_at').first()
-                sensors_list.append({
-                    'id': sensor.id,
-                    'name': sensor.name,
-                    'last_value': last_measurement.value if last_measurement else None,
-                    'last_timestamp': last_measurement.measured_at if last_measurement else None,
-                })
-            station_data.append({
-                'id': station.id,
-                'name': station.name,
-                'is_active': station.is_active,
-                'sensors': sensors_list,
-            })
-
-        context['station_data'] = station_data
+        # Estaciones, sensores, últimos valores y conteos de eventos en consultas fijas
+        context.update(load_dashboard(user))
         context['title'] = "Dashboard"
         context['subtitle'] = "Dashboard"
         context['user'] = user
@@ -120,60 +98,23 @@ class DashboardMapView(LoginRequiredMixin, TemplateView):
         return context
 
 class StationLocationsView(LoginRequiredMixin, View):
+    """
+    Estaciones y sensores para el mapa. La respuesta sale de map_cache (parte estática por
+    ámbito de usuario + últimos valores) con ETag/Last-Modified: un sondeo sin cambios recibe 304.
+    """
     login_url = 'login'
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-
-        qs = Station.objects.filter(is_active=True)
-        if not user.is_superuser:
-            qs = qs.filter(Q(company=user.company) | Q(related_users=user)).distinct()
-
-        qs = qs.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
-
-        sensors_qs = Sensor.objects.select_related('sensor_type', 'station') \
-                                   .filter(station__in=qs)
-
-        from CoreApps.measurements.models import Measurement
-        last_meas = Measurement.objects.filter(sensor=OuterRef('pk')).order_by('-measured_at')
-        sensors_qs = sensors_qs.annotate(
-            last_value=Subquery(last_meas.values('value')[:1]),
-            last_ts=Subquery(last_meas.values('measured_at')[:1])
-        )
-
-        sensors_by_station = {}
-        for s in sensors_qs:
-            sensors_by_station.setdefault(s.station_id, []).append(s)
-
-        stations_data = []
-        for st in qs.select_related('company'):
-            sensor_list = sensors_by_station.get(st.id, [])
-            total_sensors = len(sensor_list)
-            active_sensors = sum(1 for s in sensor_list if s.is_active)
-
-            stations_data.append({
-                "id": st.id,
-                "name": st.name,
-                "description": st.description or "",
-                "lat": float(st.latitude),
-                "lng": float(st.longitude),
-                "company": st.company.name,
-                "is_active": st.is_active,
-                "sensor_count": total_sensors,
-                "sensor_active_count": active_sensors,
-                "sensors": [
-                    {
-                        "id": s.id,
-                        "name": s.name,
-                        "unit": s.sensor_type.unit if s.sensor_type else "",
-                        "is_active": s.is_active,
-                        "last_value": None if s.last_value is None else float(s.last_value),
-                        "last_ts": s.last_ts.isoformat() if s.last_ts else None
-                    } for s in sensor_list
-                ]
-            })
-
-        return JsonResponse({"stations": stations_data})
+        entry = map_cache.get_response_entry(request.user)
+
+        response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+        if response is None:
+            response = HttpResponse(entry['body'], content_type='application/json')
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        # Siempre revalidar: el navegador reenvía If-None-Match y recibe 304 si nada cambió
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 class DashboardDataView(LoginRequiredMixin, TemplateView):
@@ -311,25 +252,37 @@ def get_station_history(request, station_id):
         start_time = now - timedelta(minutes=5)
 
     try:
-        station = Station.objects.get(id=station_id, related_users=request.user)
-
-        from CoreApps.measurements.models import Measurement
-        measurements = (
-            Measurement.objects
-            .filter(sensor__station=station, measured_at__gte=start_time)
-            .order_by('measured_at')
-            .values('sensor_id', 'measured_at', 'value')
-        )
+        resolution = rollups.resolve_resolution(request.GET.get('resolution'), request.GET.get('points'), start_time, now)
+        # Presupuesto de puntos por sensor (LTTB o min/max); sin ?points= se devuelve todo
+        points = downsampling.parse_points(request.GET.get('points'))
+        method = downsampling.parse_method(request.GET.get('downsample'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-        history_data = {}
-        for m in measurements:
-            sid = m['sensor_id']
-            history_data.setdefault(sid, []).append([
-                m['measured_at'].isoformat(),
-                float(m['value']),
-            ])
+    try:
+        station = Station.objects.get(id=station_id, related_users=request.user)
 
-        return JsonResponse(history_data)
+        if resolution != rollups.RAW:
+            # Promedio por cubeta del agregado elegido; mismo formato [iso, valor]
+            sensor_ids = station.sensors.values_list('id', flat=True)
+            series = {}
+            for sid, buckets in rollups.load(sensor_ids, resolution, start_time).items():
+                series[sid] = downsampling.Series(start_time)
+                for bucket_start, b in buckets:
+                    series[sid].append(bucket_start, b.avg)
+        else:
+            # Paginación por (measured_at, id): cada página es una consulta corta e indexada
+            sensor_ids = station.sensors.values_list('id', flat=True)
+            readings = exports.iter_readings(sensor_ids, start_time,
+                                             chunk_size=getattr(settings, 'MEASUREMENT_EXPORT_CHUNK_SIZE', 5000))
+            series = downsampling.collect(readings, base=start_time)
+
+        history_data = {sid: s.points(points, method) for sid, s in series.items()}
+        response = JsonResponse(history_data)
+        response['X-Resolution'] = resolution
+        if points is not None:
+            response['X-Downsample'] = method
+        return response
 
     except Station.DoesNotExist:
         return JsonResponse({'error': 'Estación no encontrada'}, status=404)
@@ -382,65 +335,95 @@ def get_station_data(request):
     except ValueError:
         return JsonResponse({'error': 'Formato de fecha/hora inválido. Use YYYY-MM-DDTHH:MM'}, status=400)
 
+    export_format = request.GET.get('format')
+    if export_format and export_format not in exports.FORMATS:
+        return JsonResponse({'error': f"format debe ser una de {', '.join(exports.FORMATS)}"}, status=400)
+
+    try:
+        resolution = rollups.resolve_resolution(request.GET.get('resolution'), request.GET.get('points'), start_dt, end_dt)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
     try:
         station = Station.objects.get(id=station_id, related_users=request.user)
     except Station.DoesNotExist:
         return JsonResponse({'error': 'Estación no encontrada'}, status=404)
 
-    sensor_data = []
-    from CoreApps.events.models import Alarm, Warning
-
-    for sensor in station.sensors.all():
-        qs = sensor.measurements.filter(measured_at__range=[start_dt, end_dt]).order_by('measured_at')
-        raw = list(qs.values('measured_at', 'value'))
-
+    if export_format:
+        return _station_data_export(station, start_dt, end_dt, export_format)
+
+    # Consultas constantes sin importar la cantidad de sensores: lecturas de toda la estación,
+    # resumen agrupado por sensor (o desde los agregados) y un conteo agrupado por tabla de eventos
+    sensors = list(station.sensors.all())
+    sensor_ids = [s.id for s in sensors]
+    event_counts = _event_counts(sensor_ids, start_dt, end_dt)
+
+    readings_by_sensor = {}
+    if resolution != rollups.RAW:
+        # Lecturas = promedio por cubeta; el resumen combina las cubetas (min/max con su instante exacto)
+        rollup_data = rollups.load(sensor_ids, resolution, start_dt, end_dt)
+        sensor_summaries = {sid: rollups.summarize(buckets) for sid, buckets in rollup_data.items()}
+        for sid, buckets in rollup_data.items():
+            readings_by_sensor[sid] = [{'timestamp': bucket_start, 'value': b.avg} for bucket_start, b in buckets]
+    else:
+        sensor_summaries = summaries.range_summaries(sensor_ids, start_dt, end_dt)
+        raw = (Measurement.objects
+               .filter(sensor_id__in=sensor_ids, measured_at__range=[start_dt, end_dt])
+               .order_by('sensor_id', 'measured_at')
+               .values_list('sensor_id', 'measured_at', 'value'))
         # Aliasing para compatibilidad: devolver 'timestamp'
-        readings = []
-        for r in raw:
-            readings.append({
-                'timestamp': r['measured_at'],
-                'value': r['value'],
-            })
-
-        summary = {}
-        if readings:
-            values = [r['value'] for r in readings]
-            max_val = max(values); min_val = min(values); avg_val = sum(values) / len(values)
-            max_reading = next(r for r in readings if r['value'] == max_val)
-            min_reading = next(r for r in readings if r['value'] == min_val)
-            summary.update({
-                'max_value': max_val,
-                'min_value': min_val,
-                'avg_value': avg_val,
-                'max_timestamp': max_reading['timestamp'],
-                'min_timestamp': min_reading['timestamp'],
-            })
-        else:
-            summary.update({
-                'max_value': None, 'min_value': None, 'avg_value': None,
-                'max_timestamp': None, 'min_timestamp': None,
-            })
-
-        # --- INICIO DE LA CORRECCIÓN ---
-        # Cambiamos 'timestamp__range' por 'started_at__range'
-        alarm_count = Alarm.objects.filter(sensor=sensor, started_at__range=[start_dt, end_dt]).count()
-        warning_count = Warning.objects.filter(sensor=sensor, started_at__range=[start_dt, end_dt]).count()
-        # --- FIN DE LA CORRECCIÓN ---
-        
-        summary['total_alarms'] = alarm_count
-        summary['total_warnings'] = warning_count
+        for sid, measured_at, value in raw:
+            readings_by_sensor.setdefault(sid, []).append({'timestamp': measured_at, 'value': value})
 
+    sensor_data = []
+    for sensor in sensors:
+        summary = rollups.summary_of(None)
+        summary.update({k: v for k, v in sensor_summaries.get(sensor.id, {}).items() if k in summary})
+        summary['total_alarms'], summary['total_warnings'] = event_counts.get(sensor.id, (0, 0))
         sensor_data.append({
             'sensor_id': sensor.id,
             'sensor_name': sensor.name,
-            'readings': readings,
+            'readings': readings_by_sensor.get(sensor.id, []),
             'summary': summary,
         })
 
-    return JsonResponse({
+    response = JsonResponse({
         'station_name': station.name,
+        'resolution': resolution,
         'sensors': sensor_data
     })
+    response['X-Resolution'] = resolution
+    return response
+
+def _event_counts(sensor_ids, start_dt, end_dt):
+    """{sensor_id: (alarmas, advertencias)} iniciadas en el rango: un COUNT agrupado por tabla."""
+    counts = {}
+    for i, model in enumerate((Alarm, Warning)):
+        rows = (model.objects.filter(sensor_id__in=sensor_ids, started_at__range=[start_dt, end_dt])
+                .values_list('sensor_id').annotate(n=Count('id')).order_by())
+        for sid, n in rows:
+            counts.setdefault(sid, [0, 0])[i] = n
+    return {sid: tuple(pair) for sid, pair in counts.items()}
+
+def _station_data_export(station, start_dt, end_dt, export_format):
+    """
+    get_station_data en streaming (NDJSON/CSV): lecturas crudas de todos los sensores en orden
+    y resumen por sensor calculado al vuelo; la memoria no crece con el rango pedido.
+    """
+    sensors = list(station.sensors.order_by('id').values_list('id', 'name'))
+    sensor_ids = [sid for sid, _ in sensors]
+
+    event_counts = _event_counts(sensor_ids, start_dt, end_dt)
+
+    rows = exports.iter_readings(sensor_ids, start_dt, end_dt,
+                                 chunk_size=getattr(settings, 'MEASUREMENT_EXPORT_CHUNK_SIZE', 5000))
+    header = {'station_id': station.id, 'station_name': station.name, 'start': start_dt, 'end': end_dt}
+    response = StreamingHttpResponse(exports.stream(rows, sensors, event_counts, export_format, header),
+                                     content_type=exports.CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="station_{station.id}_{start_dt:%Y%m%d%H%M}_{end_dt:%Y%m%d%H%M}.{export_format}"'
+    )
+    return response
 
 class DataHistoryView(LoginRequiredMixin, TemplateView):
     template_name = 'main/dashboard/data_history.html'
@@ -719,6 +702,8 @@ def api_settings_policy_by_sensor(request, sensor_id):
             'sensor_min': sensor.min_value,
             'sensor_max': sensor.max_value,
             'exists': bool(policy),
+            # Umbrales que realmente aplican (precedencia SENSOR > STATION > ... > GLOBAL)
+            'effective': get_effective_thresholds(sensor.id),
         }
         if policy:
             data.update({
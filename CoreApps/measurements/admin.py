@@ -1,6 +1,6 @@
 # CoreApps/measurements/admin.py
 from django.contrib import admin
-from .models import Measurement
+from .models import Measurement, MeasurementRollup
 
 @admin.register(Measurement)
 class MeasurementAdmin(admin.ModelAdmin):
@@ -18,3 +18,20 @@ class MeasurementAdmin(admin.ModelAdmin):
 
     # Optimiza las consultas en la lista
     list_select_related = ('sensor', 'sensor__station', 'sensor__sensor_type')
+
+
+@admin.register(MeasurementRollup)
+class MeasurementRollupAdmin(admin.ModelAdmin):
+    # Solo lectura: la tabla la mantiene `manage.py compact_rollups`
+    list_display = ('bucket_start', 'resolution', 'sensor', 'count', 'min', 'max', 'last_value')
+    ordering = ('-bucket_start',)
+    date_hierarchy = 'bucket_start'
+    list_filter = ('resolution', 'sensor__station')
+    search_fields = ('sensor__name', 'sensor__station__name')
+    list_select_related = ('sensor', 'sensor__station')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,178 @@
+# CoreApps/measurements/downsampling.py
+
+"""
+Reducción de series a un presupuesto de puntos (?points= de get_station_history).
+
+- LTTB (Largest-Triangle-Three-Buckets): conserva la forma visual de la serie; siempre
+  incluye el primer y el último punto.
+- minmax: por cubeta, el mínimo y el máximo (en orden temporal); no pierde picos.
+
+Ambos devuelven a lo sumo `threshold` puntos.
+
+Las lecturas se acumulan en una sola pasada sobre el queryset en dos array('d') por sensor
+(segundos desde `base` y valor, 16 bytes por lectura), y solo los puntos elegidos se
+convierten a [isoformat, valor]. Con NumPy instalado, el trabajo por cubeta se vectoriza;
+sin NumPy se usa la misma lógica en Python puro.
+"""
+
+from array import array
+from datetime import timedelta
+
+try:
+    import numpy as np
+except ImportError:  # opcional
+    np = None
+
+LTTB = 'lttb'
+MINMAX = 'minmax'
+METHODS = (LTTB, MINMAX)
+
+
+def parse_points(value):
+    """Entero positivo de ?points=, o None si no se pidió. Lanza ValueError si es inválido."""
+    if value in (None, ''):
+        return None
+    try:
+        points = int(value)
+    except ValueError:
+        raise ValueError("points debe ser un entero") from None
+    if points <= 0:
+        raise ValueError("points debe ser mayor que 0")
+    return points
+
+
+def parse_method(value):
+    method = (value or LTTB).lower()
+    if method not in METHODS:
+        raise ValueError(f"downsample debe ser una de {', '.join(METHODS)}")
+    return method
+
+
+def _bucket_edges(start, stop, buckets):
+    """Bordes [start, stop) repartidos en `buckets` tramos de tamaño casi igual."""
+    size = (stop - start) / buckets
+    return [start + int(i * size) for i in range(buckets)] + [stop]
+
+
+def lttb(xs, ys, threshold):
+    """Índices elegidos por LTTB (ordenados) para reducir la serie a `threshold` puntos."""
+    n = len(xs)
+    if threshold >= n or n <= 2:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    if np is not None:
+        return _lttb_numpy(np.frombuffer(xs, dtype=float), np.frombuffer(ys, dtype=float), threshold)
+
+    edges = _bucket_edges(1, n - 1, threshold - 2)
+    selected = [0]
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Tercer vértice: promedio de la cubeta siguiente (o el último punto)
+        nlo, nhi = (edges[b + 1], edges[b + 2]) if b + 2 < len(edges) else (n - 1, n)
+        cx = sum(xs[nlo:nhi]) / (nhi - nlo)
+        cy = sum(ys[nlo:nhi]) / (nhi - nlo)
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for i in range(lo, hi):
+            area = abs((ax - cx) * (ys[i] - ay) - (ax - xs[i]) * (cy - ay))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def _lttb_numpy(xs, ys, threshold):
+    n = len(xs)
+    edges = _bucket_edges(1, n - 1, threshold - 2)
+    selected = [0]
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nlo, nhi = (edges[b + 1], edges[b + 2]) if b + 2 < len(edges) else (n - 1, n)
+        cx = xs[nlo:nhi].mean()
+        cy = ys[nlo:nhi].mean()
+        ax, ay = xs[a], ys[a]
+        areas = np.abs((ax - cx) * (ys[lo:hi] - ay) - (ax - xs[lo:hi]) * (cy - ay))
+        a = lo + int(areas.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def minmax(ys, threshold):
+    """
+    Índices del mínimo y el máximo de cada cubeta, en orden, sin pasar de `threshold`:
+    threshold // 2 cubetas de dos puntos y, si el presupuesto es impar (o 1), una última
+    cubeta que aporta solo el extremo más alejado de su promedio.
+    """
+    n = len(ys)
+    if threshold >= n:
+        return list(range(n))
+    pairs, single = divmod(threshold, 2)
+    buckets = pairs + single
+    edges = _bucket_edges(0, n, buckets)
+    values = np.frombuffer(ys, dtype=float) if np is not None else ys
+    selected = []
+    for b in range(buckets):
+        lo, hi = edges[b], edges[b + 1]
+        if hi <= lo:
+            continue
+        if np is not None:
+            chunk = values[lo:hi]
+            i, j = lo + int(chunk.argmin()), lo + int(chunk.argmax())
+        else:
+            i = j = lo
+            for k in range(lo + 1, hi):
+                if values[k] < values[i]:
+                    i = k
+                elif values[k] > values[j]:
+                    j = k
+        if single and b == buckets - 1:
+            mean = float(chunk.mean()) if np is not None else sum(values[lo:hi]) / (hi - lo)
+            selected.append(i if mean - values[i] > values[j] - mean else j)
+        else:
+            selected.extend(sorted({i, j}))
+    return selected
+
+
+class Series:
+    """Serie de un sensor acumulada en arrays compactos (segundos desde `base`, valor)."""
+    __slots__ = ('base', 'xs', 'ys')
+
+    def __init__(self, base):
+        self.base = base
+        self.xs = array('d')
+        self.ys = array('d')
+
+    def __len__(self):
+        return len(self.ys)
+
+    def append(self, ts, value):
+        self.xs.append((ts - self.base).total_seconds())
+        self.ys.append(value)
+
+    def points(self, threshold=None, method=LTTB):
+        """[[isoformat, valor], ...] con a lo sumo `threshold` puntos (todos si es None)."""
+        if threshold is None:
+            indices = range(len(self.ys))
+        elif method == MINMAX:
+            indices = minmax(self.ys, threshold)
+        else:
+            indices = lttb(self.xs, self.ys, threshold)
+        base, xs, ys = self.base, self.xs, self.ys
+        return [[(base + timedelta(seconds=xs[i])).isoformat(), ys[i]] for i in indices]
+
+
+def collect(rows, base):
+    """{sensor_id: Series} desde tuplas (sensor_id, measured_at, valor) en orden temporal."""
+    series = {}
+    for sid, ts, value in rows:
+        s = series.get(sid)
+        if s is None:
+            s = series[sid] = Series(base)
+        s.append(ts, float(value))
+    return series
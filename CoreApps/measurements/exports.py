@@ -0,0 +1,130 @@
+# CoreApps/measurements/exports.py
+
+"""
+Exportación en streaming de lecturas (get_station_data?format=ndjson|csv).
+
+Las lecturas se leen en orden (sensor_id, measured_at, id) por páginas de `chunk_size` con
+paginación por clave (keyset) sobre el índice (sensor_id, measured_at): con MySQL,
+QuerySet.iterator() no usa cursores del lado del servidor y el driver cargaría el rango
+completo en memoria. Cada lectura se emite en cuanto llega y el resumen de cada sensor
+(rollups.Bucket) se calcula en la misma pasada, así la memoria no depende del rango pedido.
+
+NDJSON: una línea {"type": "station", ...}, luego {"type": "reading", ...} por lectura y un
+{"type": "summary", ...} al terminar cada sensor (también para sensores sin lecturas).
+CSV: columna `record` = reading | summary; las filas de resumen usan las columnas de la derecha.
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Measurement
+from .rollups import Bucket, summary_of
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {NDJSON: 'application/x-ndjson', CSV: 'text/csv; charset=utf-8'}
+
+CSV_COLUMNS = ('record', 'sensor_id', 'sensor_name', 'timestamp', 'value',
+               'count', 'min_value', 'min_timestamp', 'max_value', 'max_timestamp', 'avg_value',
+               'total_alarms', 'total_warnings')
+
+# Líneas por trozo enviado al cliente (evita un yield por lectura)
+_LINES_PER_CHUNK = 500
+
+
+def iter_readings(sensor_ids, start, end=None, chunk_size=5000):
+    """
+    (sensor_id, measured_at, value) en orden (sensor, tiempo), una página por consulta.
+    Sin `end` el rango queda abierto (incluye lecturas con hora de dispositivo adelantada).
+    """
+    for sid in sorted(sensor_ids):
+        after = None
+        while True:
+            qs = Measurement.objects.filter(sensor_id=sid, measured_at__gte=start)
+            if end is not None:
+                qs = qs.filter(measured_at__lte=end)
+            if after is not None:
+                ts, pk = after
+                qs = qs.filter(Q(measured_at__gt=ts) | Q(measured_at=ts, id__gt=pk))
+            page = list(qs.order_by('measured_at', 'id').values_list('id', 'measured_at', 'value')[:chunk_size])
+            for pk, ts, value in page:
+                yield sid, ts, value
+            if len(page) < chunk_size:
+                break
+            after = page[-1][1], page[-1][0]
+
+
+class _Echo:
+    """Buffer de escritura mínimo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+def _dumps(obj):
+    return json.dumps(obj, cls=DjangoJSONEncoder)
+
+
+def stream(rows, sensors, event_counts, fmt, header=None):
+    """
+    Genera el cuerpo de la respuesta en trozos de texto.
+
+    rows: (sensor_id, measured_at, value) ordenadas por sensor y tiempo (iter_readings).
+    sensors: [(id, nombre)]; event_counts: {sensor_id: (alarmas, advertencias)}.
+    """
+    names = dict(sensors)
+    writer = csv.writer(_Echo())
+    lines = []
+
+    if fmt == CSV:
+        lines.append(writer.writerow(CSV_COLUMNS))
+    else:
+        lines.append(_dumps({'type': 'station', **(header or {})}) + '\n')
+
+    def summary_line(sid, bucket):
+        alarms, warnings = event_counts.get(sid, (0, 0))
+        summary = summary_of(bucket)
+        if fmt == CSV:
+            return writer.writerow((
+                'summary', sid, names[sid], '', '', bucket.count if bucket else 0,
+                summary['min_value'], summary['min_timestamp'] and summary['min_timestamp'].isoformat(),
+                summary['max_value'], summary['max_timestamp'] and summary['max_timestamp'].isoformat(),
+                summary['avg_value'], alarms, warnings,
+            ))
+        return _dumps({'type': 'summary', 'sensor_id': sid, 'sensor_name': names[sid],
+                       'count': bucket.count if bucket else 0, **summary,
+                       'total_alarms': alarms, 'total_warnings': warnings}) + '\n'
+
+    pending = sorted(names)  # sensores aún sin resumen emitido
+    current, acc = None, None
+    for sid, ts, value in rows:
+        if sid != current:
+            if current is not None:
+                lines.append(summary_line(current, acc))
+            while pending and pending[0] <= sid:
+                skipped = pending.pop(0)
+                if skipped != sid:
+                    lines.append(summary_line(skipped, None))
+            current, acc = sid, None
+        if acc is None:
+            acc = Bucket(ts, value)
+        else:
+            acc.add(ts, value)
+
+        if fmt == CSV:
+            lines.append(writer.writerow(('reading', sid, names[sid], ts.isoformat(), value)))
+        else:
+            lines.append(_dumps({'type': 'reading', 'sensor_id': sid, 'timestamp': ts, 'value': value}) + '\n')
+        if len(lines) >= _LINES_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+
+    if current is not None:
+        lines.append(summary_line(current, acc))
+    for sid in pending:
+        if sid != current:
+            lines.append(summary_line(sid, None))
+    yield ''.join(lines)
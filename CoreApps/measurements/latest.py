@@ -0,0 +1,44 @@
+# CoreApps/measurements/latest.py
+
+"""
+Último valor por sensor (SensorLatest).
+
+El subscriber actualiza la tabla tras cada lote, así que "valor actual" es una búsqueda por
+clave primaria en lugar de un ORDER BY measured_at DESC por sensor sobre measurements_measurement.
+`manage.py rebuild_sensor_latest` la rellena desde el histórico (al desplegar, o si el
+subscriber corrió con LATEST_VALUES_ENABLED=false).
+"""
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from CoreApps.sensorhub.models import Sensor
+
+from .models import Measurement, SensorLatest
+
+
+def get_latest(sensor_ids):
+    """{sensor_id: (valor, measured_at)} de los sensores con lecturas, en una consulta."""
+    rows = SensorLatest.objects.filter(sensor_id__in=list(sensor_ids)).values_list('sensor_id', 'value', 'measured_at')
+    return {sid: (value, measured_at) for sid, value, measured_at in rows}
+
+
+def rebuild(sensor_ids=None):
+    """Recalcula las filas desde measurements_measurement. Devuelve la cantidad escrita."""
+    sensors = Sensor.objects.all()
+    if sensor_ids is not None:
+        sensors = sensors.filter(id__in=list(sensor_ids))
+    last = Measurement.objects.filter(sensor=OuterRef('pk')).order_by('-measured_at')
+    sensors = sensors.annotate(
+        last_value=Subquery(last.values('value')[:1]),
+        last_ts=Subquery(last.values('measured_at')[:1]),
+    ).filter(last_ts__isnull=False)
+    rows = [SensorLatest(sensor_id=s.id, value=s.last_value, measured_at=s.last_ts) for s in sensors]
+
+    with transaction.atomic():
+        existing = SensorLatest.objects.all()
+        if sensor_ids is not None:
+            existing = existing.filter(sensor_id__in=list(sensor_ids))
+        existing.delete()
+        SensorLatest.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
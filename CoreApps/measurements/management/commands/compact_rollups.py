@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from CoreApps.measurements import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Mantiene los agregados 1m/5m/1h de measurements_measurement (MeasurementRollup). "
+        "Cada pasada recalcula la cola reciente; dejarlo corriendo con --loop (p. ej. cada 60 s) "
+        "o programarlo con un timer de systemd / cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', metavar='YYYY-MM-DDTHH:MM',
+                            help="Recalcular desde esta fecha (reconstrucción/backfill) en lugar de la cola reciente.")
+        parser.add_argument('--loop', type=int, default=0, metavar='SEGUNDOS',
+                            help="Repetir cada N segundos (modo servicio).")
+
+    def handle(self, *args, **opts):
+        since = None
+        if opts['since']:
+            try:
+                since = datetime.fromisoformat(opts['since'])
+            except ValueError:
+                raise CommandError("--since inválido. Use YYYY-MM-DDTHH:MM") from None
+        while True:
+            totals = rollups.compact(since=since)
+            self.stdout.write("Agregados escritos: " + ", ".join(f"{res}={n}" for res, n in totals.items()))
+            if not opts['loop']:
+                break
+            since = None  # tras la primera pasada, solo la cola reciente
+            connection.close()
+            time.sleep(opts['loop'])
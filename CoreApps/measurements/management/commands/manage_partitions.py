@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from CoreApps.measurements import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Mantiene el particionado semanal de measurements_measurement: crea particiones futuras, "
+        "aplica la retención (DROP/archivo de particiones) y verifica el esquema. "
+        "Programarlo a diario (timer de systemd / cron) o dejarlo corriendo con --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--init', action='store_true',
+                            help="Convierte la tabla a particionada (una vez; reescribe la tabla).")
+        parser.add_argument('--weeks-back', type=int, default=8,
+                            help="Con --init: semanas pasadas con partición propia (lo anterior queda en la primera).")
+        parser.add_argument('--weeks-ahead', type=int,
+                            default=getattr(settings, 'MEASUREMENT_PARTITION_WEEKS_AHEAD', 4))
+        parser.add_argument('--retention-days', type=int,
+                            default=getattr(settings, 'MEASUREMENT_RETENTION_DAYS', 0),
+                            help="0 = sin retención (no se eliminan particiones).")
+        parser.add_argument('--archive', action='store_true',
+                            default=getattr(settings, 'MEASUREMENT_RETENTION_ARCHIVE', False),
+                            help="Archivar cada partición vencida en su propia tabla antes de eliminarla.")
+        parser.add_argument('--verify-only', action='store_true')
+        parser.add_argument('--loop', type=int, default=0, metavar='SEGUNDOS',
+                            help="Repetir cada N segundos (modo servicio).")
+
+    def handle(self, *args, **opts):
+        if not partitions.is_supported():
+            raise CommandError(f"El particionado nativo requiere MySQL (motor actual: {connection.vendor}).")
+        while True:
+            problems = self.run_once(opts)
+            if not opts['loop']:
+                break
+            connection.close()
+            time.sleep(opts['loop'])
+        if problems:
+            raise CommandError("Particionado con problemas:\n- " + "\n- ".join(problems))
+
+    def run_once(self, opts):
+        with connection.cursor() as cursor:
+            if opts['init']:
+                if partitions.partitioning_info(cursor):
+                    self.stdout.write("La tabla ya está particionada; se omite --init.")
+                else:
+                    created = partitions.init_partitioning(cursor, opts['weeks_back'], opts['weeks_ahead'])
+                    self.stdout.write(self.style.SUCCESS(f"Tabla particionada en {len(created)} semanas + p_future."))
+                opts['init'] = False
+
+            if not opts['verify_only'] and partitions.partitioning_info(cursor):
+                created = partitions.ensure_future(cursor, opts['weeks_ahead'])
+                expired = partitions.expire(cursor, opts['retention_days'], archive=opts['archive'])
+                self.stdout.write(f"Particiones creadas: {len(created)}; vencidas {'archivadas y ' if opts['archive'] and expired else ''}eliminadas: {len(expired)}.")
+
+            problems = partitions.verify(cursor, opts['weeks_ahead'])
+        for problem in problems:
+            self.stderr.write(self.style.ERROR(problem))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("Esquema de particiones verificado."))
+        return problems
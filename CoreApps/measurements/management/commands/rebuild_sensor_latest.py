@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from CoreApps.measurements import latest
+
+
+class Command(BaseCommand):
+    help = "Rellena measurements_sensorlatest (último valor por sensor) desde el histórico de mediciones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('sensor_ids', nargs='*', type=int, help="IDs de sensor (por defecto, todos).")
+
+    def handle(self, *args, sensor_ids=None, **options):
+        written = latest.rebuild(sensor_ids or None)
+        self.stdout.write(self.style.SUCCESS(f"Último valor actualizado para {written} sensores."))
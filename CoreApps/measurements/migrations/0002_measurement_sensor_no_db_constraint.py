@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 21:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensorhub', '0010_sensoreffectivepolicy'),
+        ('measurements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='measurement',
+            name='sensor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='measurements', to='sensorhub.sensor'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-17 21:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensorhub', '0010_sensoreffectivepolicy'),
+        ('measurements', '0002_measurement_sensor_no_db_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minuto'), ('5m', '5 minutos'), ('1h', '1 hora')], max_length=3, verbose_name='resolución')),
+                ('bucket_start', models.DateTimeField(verbose_name='inicio de la cubeta')),
+                ('count', models.PositiveIntegerField(verbose_name='lecturas')),
+                ('sum', models.FloatField(verbose_name='suma')),
+                ('min', models.FloatField(verbose_name='mínimo')),
+                ('min_at', models.DateTimeField()),
+                ('max', models.FloatField(verbose_name='máximo')),
+                ('max_at', models.DateTimeField()),
+                ('first_value', models.FloatField(verbose_name='primer valor')),
+                ('first_at', models.DateTimeField()),
+                ('last_value', models.FloatField(verbose_name='último valor')),
+                ('last_at', models.DateTimeField()),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='sensorhub.sensor')),
+            ],
+            options={
+                'verbose_name': 'agregado de mediciones',
+                'verbose_name_plural': 'agregados de mediciones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='measurementrollup',
+            index=models.Index(fields=['resolution', 'bucket_start'], name='measurement_resolut_dd320e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='measurementrollup',
+            constraint=models.UniqueConstraint(fields=('sensor', 'resolution', 'bucket_start'), name='uniq_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 21:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensorhub', '0010_sensoreffectivepolicy'),
+        ('measurements', '0003_measurementrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorLatest',
+            fields=[
+                ('sensor', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest', serialize=False, to='sensorhub.sensor')),
+                ('measured_at', models.DateTimeField(verbose_name='fecha y hora')),
+                ('value', models.FloatField(verbose_name='valor')),
+            ],
+            options={
+                'verbose_name': 'último valor',
+                'verbose_name_plural': 'últimos valores',
+                'db_table': 'measurements_sensorlatest',
+            },
+        ),
+    ]
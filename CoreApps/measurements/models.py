@@ -4,7 +4,9 @@ from CoreApps.sensorhub.models import Sensor
 
 
 class Measurement(models.Model):
-    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='measurements', db_index=True)
+    # Sin FK física: MySQL no admite claves foráneas en tablas particionadas (ver partitions.py)
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='measurements', db_index=True,
+                               db_constraint=False)
     measured_at = models.DateTimeField(_('fecha y hora'), db_index=True)   # nombre físico será measured_at
     value = models.FloatField(_('valor'))
 
@@ -17,3 +19,60 @@ class Measurement(models.Model):
             models.Index(fields=['sensor', 'measured_at']),
             models.Index(fields=['measured_at']),
         ]
+
+
+class SensorLatest(models.Model):
+    """
+    Última lectura de cada sensor. La mantiene el subscriber con un upsert por lote
+    (writers.LatestValueWriter); latest.get_latest() la lee en una sola consulta.
+    """
+    # Sin FK física, igual que Measurement: el subscriber escribe aquí en el mismo flujo
+    sensor = models.OneToOneField(Sensor, on_delete=models.CASCADE, primary_key=True, related_name='latest',
+                                  db_constraint=False)
+    measured_at = models.DateTimeField(_('fecha y hora'))
+    value = models.FloatField(_('valor'))
+
+    class Meta:
+        verbose_name = _('último valor')
+        verbose_name_plural = _('últimos valores')
+        db_table = 'measurements_sensorlatest'
+
+
+class MeasurementRollup(models.Model):
+    """
+    Agregado por sensor y cubeta de tiempo (1m / 5m / 1h), mantenido por rollups.compact()
+    (comando compact_rollups). Guarda suma y conteo para combinar promedios exactos, y
+    mínimo/máximo con su instante para los resúmenes de reporte.
+    """
+    class Resolution(models.TextChoices):
+        MINUTE = '1m', _('1 minuto')
+        FIVE_MINUTES = '5m', _('5 minutos')
+        HOUR = '1h', _('1 hora')
+
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.CharField(_('resolución'), max_length=3, choices=Resolution.choices)
+    bucket_start = models.DateTimeField(_('inicio de la cubeta'))
+    count = models.PositiveIntegerField(_('lecturas'))
+    sum = models.FloatField(_('suma'))
+    min = models.FloatField(_('mínimo'))
+    min_at = models.DateTimeField()
+    max = models.FloatField(_('máximo'))
+    max_at = models.DateTimeField()
+    first_value = models.FloatField(_('primer valor'))
+    first_at = models.DateTimeField()
+    last_value = models.FloatField(_('último valor'))
+    last_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = _('agregado de mediciones')
+        verbose_name_plural = _('agregados de mediciones')
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'resolution', 'bucket_start'], name='uniq_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket_start']),
+        ]
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
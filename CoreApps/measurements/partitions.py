@@ -0,0 +1,210 @@
+# CoreApps/measurements/partitions.py
+
+"""
+Particionado semanal nativo (MySQL) de measurements_measurement.
+
+Esquema: PARTITION BY RANGE (TO_DAYS(measured_at)), una partición por semana (lunes a lunes)
+llamada p_week_YYYYMMDD por su primer día, más p_future (MAXVALUE) como red de seguridad.
+Las consultas por rango de measured_at (get_station_history, get_station_data) solo leen las
+particiones de ese rango, y la retención se aplica con DROP PARTITION en lugar de DELETE.
+
+Reemplaza al procedimiento/evento manual de Creat_partition_db.txt; lo ejecuta
+`manage.py manage_partitions` (ver el comando para --init, --loop y el timer de systemd).
+Los límites se leen de INFORMATION_SCHEMA (PARTITION_DESCRIPTION = TO_DAYS del límite), así
+también se respetan particiones creadas con el esquema anterior (p_week_2025_10, ...).
+"""
+
+import logging
+from datetime import date, timedelta
+
+from django.db import connection
+
+from .models import Measurement
+
+logger = logging.getLogger(__name__)
+
+TABLE = Measurement._meta.db_table
+FUTURE = 'p_future'
+EXPECTED_EXPRESSION = 'to_days(`measured_at`)'
+# TO_DAYS() de MySQL cuenta desde el año 0: TO_DAYS(d) = d.toordinal() + 365
+_TO_DAYS_OFFSET = 365
+
+
+def to_days(day):
+    return day.toordinal() + _TO_DAYS_OFFSET
+
+
+def from_days(n):
+    return date.fromordinal(int(n) - _TO_DAYS_OFFSET)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def partition_name(start):
+    return f"p_week_{start:%Y%m%d}"
+
+
+def is_supported():
+    return connection.vendor == 'mysql'
+
+
+def list_partitions(cursor):
+    """[(nombre, límite superior exclusivo como date o None para MAXVALUE, filas aprox.)] en orden."""
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+        FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """,
+        [TABLE],
+    )
+    out = []
+    for name, description, rows in cursor.fetchall():
+        bound = None if description in (None, 'MAXVALUE') else from_days(description)
+        out.append((name, bound, rows or 0))
+    return out
+
+
+def partitioning_info(cursor):
+    cursor.execute(
+        """
+        SELECT PARTITION_METHOD, PARTITION_EXPRESSION
+        FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        LIMIT 1
+        """,
+        [TABLE],
+    )
+    return cursor.fetchone()
+
+
+def _partition_clause(bounds):
+    parts = [f"PARTITION {partition_name(b - timedelta(days=7))} VALUES LESS THAN ({to_days(b)})" for b in bounds]
+    parts.append(f"PARTITION {FUTURE} VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+
+def init_partitioning(cursor, weeks_back, weeks_ahead, today=None):
+    """
+    Convierte la tabla a particionada (una sola vez; reescribe la tabla completa).
+    MySQL exige que la clave de partición esté en la PK y no admite FKs en tablas
+    particionadas: la PK pasa a (id, measured_at) y sensor_id queda sin constraint
+    (la migración 0002 ya lo declara con db_constraint=False).
+    Las filas anteriores a `weeks_back` semanas quedan en la primera partición.
+    """
+    today = today or date.today()
+    first = week_start(today) - timedelta(weeks=weeks_back)
+    bounds = [first + timedelta(weeks=i) for i in range(1, weeks_back + weeks_ahead + 2)]
+    cursor.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, measured_at)")
+    cursor.execute(f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(measured_at)) ({_partition_clause(bounds)})")
+    logger.info("Tabla %s particionada: %d semanas + %s", TABLE, len(bounds), FUTURE)
+    return [partition_name(b - timedelta(days=7)) for b in bounds]
+
+
+def ensure_future(cursor, weeks_ahead, today=None):
+    """Crea las particiones semanales que falten hasta `weeks_ahead` semanas después de hoy."""
+    today = today or date.today()
+    partitions = list_partitions(cursor)
+    bounded = [bound for _, bound, _ in partitions if bound is not None]
+    if not bounded:
+        return []
+    last = max(bounded)
+    horizon = week_start(today) + timedelta(weeks=weeks_ahead + 1)
+    bounds = []
+    while last < horizon:
+        last = week_start(last) + timedelta(weeks=1) if last.weekday() else last + timedelta(weeks=1)
+        bounds.append(last)
+    if not bounds:
+        return []
+    future_rows = next((rows for name, bound, rows in partitions if bound is None), 0)
+    if future_rows:
+        # p_future debería estar vacía; si no, REORGANIZE mueve esas filas (más lento, pero correcto)
+        logger.warning("%s contiene ~%d filas: se redistribuyen al crear particiones", FUTURE, future_rows)
+    cursor.execute(f"ALTER TABLE {TABLE} REORGANIZE PARTITION {FUTURE} INTO ({_partition_clause(bounds)})")
+    created = [partition_name(b - timedelta(days=7)) for b in bounds]
+    logger.info("Particiones creadas: %s", ", ".join(created))
+    return created
+
+
+def _has_rows(cursor, sql):
+    cursor.execute(f"SELECT EXISTS({sql} LIMIT 1)")
+    return bool(cursor.fetchone()[0])
+
+
+def _is_partitioned(cursor, table):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        """,
+        [table],
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def archive_partition(cursor, name):
+    """
+    Mueve la partición a measurements_measurement_<partición> con EXCHANGE PARTITION.
+    Cada paso se puede repetir tras una corrida interrumpida (el DDL de MySQL no es
+    transaccional): la tabla de archivo se crea solo si falta, se le quita el particionado
+    solo si lo tiene, y si ya tiene filas con la partición vacía el EXCHANGE ya se hizo.
+    Devuelve False si ambas tienen filas (la partición no se debe eliminar).
+    """
+    archive_table = f"{TABLE}_{name}"
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive_table} LIKE {TABLE}")
+    if _is_partitioned(cursor, archive_table):
+        cursor.execute(f"ALTER TABLE {archive_table} REMOVE PARTITIONING")
+    if _has_rows(cursor, f"SELECT 1 FROM {archive_table}"):
+        if _has_rows(cursor, f"SELECT 1 FROM {TABLE} PARTITION ({name})"):
+            logger.error("%s y la partición %s tienen filas: no se archiva ni se elimina", archive_table, name)
+            return False
+        logger.info("Partición %s ya estaba archivada en %s", name, archive_table)
+        return True
+    cursor.execute(f"ALTER TABLE {TABLE} EXCHANGE PARTITION {name} WITH TABLE {archive_table}")
+    logger.info("Partición %s archivada en %s", name, archive_table)
+    return True
+
+
+def expire(cursor, retention_days, archive=False, today=None):
+    """
+    Elimina (o archiva con EXCHANGE PARTITION en measurements_measurement_<partición>) las
+    particiones cuyo límite superior ya quedó fuera de la retención. Nunca toca la última
+    partición acotada ni p_future. Con `archive`, una corrida interrumpida se retoma en la
+    siguiente (ver archive_partition).
+    """
+    if retention_days <= 0:
+        return []
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    partitions = list_partitions(cursor)
+    bounded = [(name, bound) for name, bound, _ in partitions if bound is not None]
+    expired = []
+    for name in [name for name, bound in bounded[:-1] if bound <= cutoff]:
+        if archive and not archive_partition(cursor, name):
+            continue
+        cursor.execute(f"ALTER TABLE {TABLE} DROP PARTITION {name}")
+        logger.info("Partición %s eliminada (retención %d días)", name, retention_days)
+        expired.append(name)
+    return expired
+
+
+def verify(cursor, weeks_ahead, today=None):
+    """Lista de problemas (vacía si el esquema es el esperado y cubre el horizonte)."""
+    info = partitioning_info(cursor)
+    if not info:
+        return [f"{TABLE} no está particionada (ejecutar manage_partitions --init)"]
+    problems = []
+    method, expression = info
+    if method != 'RANGE' or (expression or '').replace(' ', '').lower() != EXPECTED_EXPRESSION:
+        problems.append(f"Clave de partición inesperada: {method} ({expression}); se espera RANGE ({EXPECTED_EXPRESSION})")
+    partitions = list_partitions(cursor)
+    if not partitions or partitions[-1][1] is not None:
+        problems.append(f"Falta la partición {FUTURE} (MAXVALUE)")
+    bounded = [bound for _, bound, _ in partitions if bound is not None]
+    horizon = week_start(today or date.today()) + timedelta(weeks=weeks_ahead)
+    if not bounded or max(bounded) < horizon:
+        problems.append(f"Particiones futuras insuficientes: la última termina en {max(bounded) if bounded else '—'}, "
+                        f"se esperan {weeks_ahead} semanas (hasta {horizon})")
+    return problems
@@ -0,0 +1,252 @@
+# CoreApps/measurements/rollups.py
+
+"""
+Agregados (rollups) de measurements_measurement por sensor a 1m, 5m y 1h.
+
+Cada cubeta guarda count/sum/min/max/first/last (con sus instantes), así un nivel se obtiene
+combinando exactamente las cubetas del nivel inferior: 1m se calcula desde las lecturas,
+5m desde 1m y 1h desde 5m. `manage.py compact_rollups` recalcula periódicamente la cola
+reciente (la última cubeta de 1m menos MEASUREMENT_ROLLUP_LATENESS_SECONDS, para absorber
+lecturas que llegan tarde); la primera vez rellena MEASUREMENT_ROLLUP_BACKFILL_DAYS días.
+
+get_station_history y get_station_data usan choose_resolution() para servir la resolución
+más gruesa que todavía entrega `points` puntos en el rango pedido (o las lecturas crudas si
+ningún agregado alcanza).
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from CoreApps.sensorhub.models import Sensor
+
+from .models import Measurement, MeasurementRollup
+
+logger = logging.getLogger(__name__)
+
+RAW = 'raw'
+AUTO = 'auto'
+# De la más fina a la más gruesa; cada nivel se calcula desde el anterior
+RESOLUTIONS = (('1m', 60), ('5m', 300), ('1h', 3600))
+SECONDS = dict(RESOLUTIONS)
+
+_EPOCH = datetime(1970, 1, 1)
+_ROW_FIELDS = ('sensor_id', 'bucket_start', 'count', 'sum', 'min', 'min_at', 'max', 'max_at',
+               'first_value', 'first_at', 'last_value', 'last_at')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def bucket_floor(dt, seconds):
+    """Inicio de la cubeta de `seconds` segundos que contiene a dt (alineada a la época)."""
+    epoch = _EPOCH.replace(tzinfo=dt.tzinfo)
+    elapsed = int((dt - epoch).total_seconds())
+    return epoch + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+class Bucket:
+    __slots__ = ('count', 'sum', 'min', 'min_at', 'max', 'max_at', 'first_value', 'first_at', 'last_value', 'last_at')
+
+    def __init__(self, ts, value):
+        self.count = 1
+        self.sum = value
+        self.min = self.max = self.first_value = self.last_value = value
+        self.min_at = self.max_at = self.first_at = self.last_at = ts
+
+    @classmethod
+    def from_row(cls, row):
+        """Desde una tupla de _ROW_FIELDS sin las dos primeras columnas."""
+        b = cls.__new__(cls)
+        (b.count, b.sum, b.min, b.min_at, b.max, b.max_at,
+         b.first_value, b.first_at, b.last_value, b.last_at) = row
+        return b
+
+    @property
+    def avg(self):
+        return self.sum / self.count
+
+    def add(self, ts, value):
+        self.count += 1
+        self.sum += value
+        # Ante empates gana el instante más temprano (mismo criterio que el reporte original)
+        if value < self.min or (value == self.min and ts < self.min_at):
+            self.min, self.min_at = value, ts
+        if value > self.max or (value == self.max and ts < self.max_at):
+            self.max, self.max_at = value, ts
+        if ts < self.first_at:
+            self.first_value, self.first_at = value, ts
+        if ts >= self.last_at:
+            self.last_value, self.last_at = value, ts
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        if other.min < self.min or (other.min == self.min and other.min_at < self.min_at):
+            self.min, self.min_at = other.min, other.min_at
+        if other.max > self.max or (other.max == self.max and other.max_at < self.max_at):
+            self.max, self.max_at = other.max, other.max_at
+        if other.first_at < self.first_at:
+            self.first_value, self.first_at = other.first_value, other.first_at
+        if other.last_at >= self.last_at:
+            self.last_value, self.last_at = other.last_value, other.last_at
+
+    def to_model(self, sensor_id, resolution, bucket_start):
+        return MeasurementRollup(sensor_id=sensor_id, resolution=resolution, bucket_start=bucket_start,
+                                 **{f: getattr(self, f) for f in self.__slots__})
+
+
+def _range(qs, field, start, end):
+    qs = qs.filter(**{f'{field}__gte': start})
+    return qs.filter(**{f'{field}__lt': end}) if end is not None else qs
+
+
+def _replace(resolution, start, end, buckets, sensor_ids):
+    rows = [b.to_model(sid, resolution, bucket_start)
+            for (sid, bucket_start), b in buckets.items() if sid in sensor_ids]
+    with transaction.atomic():
+        _range(MeasurementRollup.objects.filter(resolution=resolution), 'bucket_start', start, end).delete()
+        MeasurementRollup.objects.bulk_create(rows, batch_size=_setting('MEASUREMENT_ROLLUP_BATCH_SIZE', 2000))
+    return len(rows)
+
+
+def compact_range(start, end=None):
+    """
+    Recalcula los tres niveles para las cubetas desde `start` (hasta `end` exclusivo, que debe
+    estar alineado a la hora, o sin límite). Devuelve {resolución: filas escritas}.
+    """
+    chunk_size = _setting('MEASUREMENT_ROLLUP_CHUNK_SIZE', 5000)
+    # Measurement.sensor no tiene FK física (particionado); el agregado sí
+    sensor_ids = set(Sensor.objects.values_list('id', flat=True))
+
+    level_start = bucket_floor(start, SECONDS['1m'])
+    buckets = {}
+    raw = _range(Measurement.objects.all(), 'measured_at', level_start, end)
+    for sid, ts, value in raw.values_list('sensor_id', 'measured_at', 'value').iterator(chunk_size=chunk_size):
+        key = (sid, bucket_floor(ts, 60))
+        b = buckets.get(key)
+        if b is None:
+            buckets[key] = Bucket(ts, value)
+        else:
+            b.add(ts, value)
+    written = {'1m': _replace('1m', level_start, end, buckets, sensor_ids)}
+
+    for (lower, _), (resolution, seconds) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+        level_start = bucket_floor(level_start, seconds)
+        buckets = {}
+        rows = _range(MeasurementRollup.objects.filter(resolution=lower), 'bucket_start', level_start, end)
+        for row in rows.values_list(*_ROW_FIELDS).iterator(chunk_size=chunk_size):
+            key = (row[0], bucket_floor(row[1], seconds))
+            b = buckets.get(key)
+            if b is None:
+                buckets[key] = Bucket.from_row(row[2:])
+            else:
+                b.merge(Bucket.from_row(row[2:]))
+        written[resolution] = _replace(resolution, level_start, end, buckets, sensor_ids)
+    return written
+
+
+def compact(since=None, now=None):
+    """
+    Mantiene los agregados al día. Sin `since`, parte de la última cubeta de 1m menos el margen
+    de lecturas tardías (o rellena los últimos días si la tabla está vacía). Los rangos largos
+    se procesan por días para acotar la memoria. Devuelve {resolución: filas escritas}.
+    """
+    now = now or timezone.now()
+    if since is None:
+        latest = MeasurementRollup.objects.filter(resolution='1m').aggregate(m=Max('bucket_start'))['m']
+        if latest is not None:
+            since = latest - timedelta(seconds=_setting('MEASUREMENT_ROLLUP_LATENESS_SECONDS', 300))
+        else:
+            since = now - timedelta(days=_setting('MEASUREMENT_ROLLUP_BACKFILL_DAYS', 7))
+
+    # Solo se releen las lecturas desde `since`; los niveles superiores se rearman desde el inferior
+    start = bucket_floor(since, SECONDS['1m'])
+    totals = {resolution: 0 for resolution, _ in RESOLUTIONS}
+    while True:
+        end = bucket_floor(start, SECONDS['1h']) + timedelta(days=1)
+        last = end > now
+        for resolution, count in compact_range(start, None if last else end).items():
+            totals[resolution] += count
+        if last:
+            break
+        start = end
+    logger.info("Agregados recalculados desde %s: %s", since, totals)
+    return totals
+
+
+def choose_resolution(start, end, points):
+    """Resolución más gruesa con al menos `points` cubetas en [start, end]; RAW si ninguna alcanza."""
+    span = (end - start).total_seconds()
+    for resolution, seconds in reversed(RESOLUTIONS):
+        if span / seconds >= points:
+            return resolution
+    return RAW
+
+
+def resolve_resolution(resolution, points, start, end):
+    """
+    Interpreta los parámetros ?resolution= y ?points= de las vistas. Sin ninguno se usan las
+    lecturas crudas (comportamiento original); `auto` también vuelve a las crudas si los
+    agregados están atrasados. Lanza ValueError si son inválidos.
+    """
+    resolution = (resolution or (AUTO if points else RAW)).lower()
+    if resolution in SECONDS or resolution == RAW:
+        return resolution
+    if resolution != AUTO:
+        raise ValueError(f"resolution debe ser {RAW}, {AUTO} o una de {', '.join(SECONDS)}")
+    try:
+        points = int(points or _setting('MEASUREMENT_ROLLUP_DEFAULT_POINTS', 500))
+    except ValueError:
+        raise ValueError("points debe ser un entero") from None
+    if points <= 0:
+        raise ValueError("points debe ser mayor que 0")
+    resolution = choose_resolution(start, end, points)
+    if resolution != RAW and not is_current(end):
+        # Sin compactador al día, las lecturas crudas son la única fuente completa
+        return RAW
+    return resolution
+
+
+def is_current(end):
+    """True si los agregados cubren hasta `end` (menos MEASUREMENT_ROLLUP_MAX_LAG_SECONDS)."""
+    latest = MeasurementRollup.objects.filter(resolution='1m').aggregate(m=Max('bucket_start'))['m']
+    max_lag = timedelta(seconds=_setting('MEASUREMENT_ROLLUP_MAX_LAG_SECONDS', 600))
+    return latest is not None and latest >= end - max_lag
+
+
+def load(sensor_ids, resolution, start, end=None):
+    """{sensor_id: [(bucket_start, Bucket), ...]} en orden temporal."""
+    rows = MeasurementRollup.objects.filter(sensor_id__in=list(sensor_ids), resolution=resolution,
+                                            bucket_start__gte=bucket_floor(start, SECONDS[resolution]))
+    if end is not None:
+        rows = rows.filter(bucket_start__lte=end)
+    out = {}
+    for row in rows.order_by('bucket_start').values_list(*_ROW_FIELDS):
+        b = Bucket.from_row(row[2:])
+        out.setdefault(row[0], []).append((row[1], b))
+    return out
+
+
+def summary_of(bucket):
+    """Resumen max/min/avg con instantes (formato de get_station_data) de una cubeta o None."""
+    if bucket is None:
+        return {'max_value': None, 'min_value': None, 'avg_value': None,
+                'max_timestamp': None, 'min_timestamp': None}
+    return {'max_value': bucket.max, 'min_value': bucket.min, 'avg_value': bucket.avg,
+            'max_timestamp': bucket.max_at, 'min_timestamp': bucket.min_at}
+
+
+def summarize(buckets):
+    """summary_of() combinando las cubetas [(bucket_start, Bucket), ...]."""
+    if not buckets:
+        return summary_of(None)
+    total = Bucket.from_row([getattr(buckets[0][1], f) for f in Bucket.__slots__])
+    for _, b in buckets[1:]:
+        total.merge(b)
+    return summary_of(total)
@@ -0,0 +1,52 @@
+# CoreApps/measurements/summaries.py
+
+"""
+Resumen por sensor de un rango de lecturas crudas (max/min/avg con instantes) en dos consultas
+para toda la estación, sin traer las lecturas a Python:
+
+- un GROUP BY sensor_id con Min/Max/Avg/Count,
+- un ROW_NUMBER() por sensor ordenado por valor para ubicar el instante del máximo y del
+  mínimo (ante empates, el más temprano, igual que el reporte original).
+
+Las funciones de ventana requieren MySQL 8.0+ (o SQLite 3.25+ en desarrollo).
+"""
+
+from django.db.models import Avg, Count, F, Max, Min, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Measurement
+from .rollups import summary_of
+
+
+def range_summaries(sensor_ids, start, end):
+    """{sensor_id: resumen (formato rollups.summary_of) + 'count'} de los sensores con lecturas."""
+    readings = Measurement.objects.filter(sensor_id__in=list(sensor_ids), measured_at__range=[start, end])
+
+    totals = (readings.values('sensor_id')
+              .annotate(count=Count('id'), min_value=Min('value'), max_value=Max('value'), avg_value=Avg('value'))
+              .order_by())
+
+    by_sensor = [F('sensor_id')]
+    extremes = (readings
+                .annotate(max_rank=Window(RowNumber(), partition_by=by_sensor,
+                                          order_by=[F('value').desc(), F('measured_at').asc()]),
+                          min_rank=Window(RowNumber(), partition_by=by_sensor,
+                                          order_by=[F('value').asc(), F('measured_at').asc()]))
+                .filter(Q(max_rank=1) | Q(min_rank=1))
+                .values_list('sensor_id', 'measured_at', 'max_rank', 'min_rank'))
+    max_at, min_at = {}, {}
+    for sid, ts, max_rank, min_rank in extremes:
+        if max_rank == 1:
+            max_at[sid] = ts
+        if min_rank == 1:
+            min_at[sid] = ts
+
+    out = {}
+    for row in totals:
+        sid = row['sensor_id']
+        summary = summary_of(None)
+        summary.update(max_value=row['max_value'], min_value=row['min_value'], avg_value=row['avg_value'],
+                       max_timestamp=max_at.get(sid), min_timestamp=min_at.get(sid))
+        summary['count'] = row['count']
+        out[sid] = summary
+    return out
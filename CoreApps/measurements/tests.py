@@ -1,3 +1,168 @@
-from django.test import TestCase
+import random
+from array import array
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from CoreApps.measurements import downsampling, exports, rollups
+from CoreApps.measurements.models import Measurement, MeasurementRollup
+from CoreApps.sensorhub.models import Sensor, SensorType, Station
+from CoreApps.users.models import Company
+
+
+def make_series(n, seed=7):
+    rnd = random.Random(seed)
+    xs = array('d', (i * 5.0 for i in range(n)))
+    ys = array('d', (rnd.gauss(50, 10) for _ in range(n)))
+    return xs, ys
+
+
+class DownsamplingTests(SimpleTestCase):
+    """LTTB y minmax no pasan del presupuesto de puntos y dan lo mismo con o sin NumPy."""
+
+    BUDGETS = (1, 2, 3, 4, 7, 10, 99, 100, 101, 999, 1000, 5000)
+
+    def test_lttb_respects_budget_and_keeps_endpoints(self):
+        xs, ys = make_series(1000)
+        for threshold in self.BUDGETS:
+            indices = downsampling.lttb(xs, ys, threshold)
+            self.assertLessEqual(len(indices), threshold)
+            self.assertEqual(indices, sorted(set(indices)))
+            if threshold >= 2:
+                self.assertEqual((indices[0], indices[-1]), (0, len(ys) - 1))
+
+    def test_minmax_respects_budget_and_keeps_extremes(self):
+        xs, ys = make_series(1000)
+        lowest, highest = ys.index(min(ys)), ys.index(max(ys))
+        for threshold in self.BUDGETS:
+            indices = downsampling.minmax(ys, threshold)
+            self.assertLessEqual(len(indices), threshold)
+            self.assertEqual(indices, sorted(set(indices)))
+            if threshold % 2 == 0:
+                self.assertIn(lowest, indices)
+                self.assertIn(highest, indices)
+        # Presupuesto impar: la última cubeta aporta un punto, no se pierde
+        self.assertEqual(len(downsampling.minmax(ys, 11)), 11)
+        self.assertEqual(len(downsampling.minmax(ys, 1)), 1)
+
+    def test_series_points_respect_budget(self):
+        base = datetime(2025, 1, 1)
+        _, ys = make_series(300)
+        series = downsampling.collect(((1, base + timedelta(seconds=5 * i), y) for i, y in enumerate(ys)), base)[1]
+        for method in downsampling.METHODS:
+            for threshold in self.BUDGETS:
+                points = series.points(threshold, method)
+                self.assertLessEqual(len(points), threshold)
+        self.assertEqual(series.points(2)[-1], [(base + timedelta(seconds=5 * 299)).isoformat(), ys[-1]])
+
+    @skipUnless(downsampling.np is not None, "NumPy no instalado")
+    def test_numpy_and_pure_python_agree(self):
+        xs, ys = make_series(1000)
+        for threshold in self.BUDGETS:
+            with_numpy = (downsampling.lttb(xs, ys, threshold), downsampling.minmax(ys, threshold))
+            with mock.patch.object(downsampling, 'np', None):
+                pure = (downsampling.lttb(xs, ys, threshold), downsampling.minmax(ys, threshold))
+            self.assertEqual(with_numpy, pure)
+
+
+class RollupTests(TestCase):
+    """Cubetas alineadas a la época: una lectura en el borde abre la cubeta siguiente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Empresa')
+        station = Station.objects.create(name='Norte', company=company)
+        cls.sensor = Sensor.objects.create(name='P1', station=station,
+                                           sensor_type=SensorType.objects.create(name='Presión', unit='psi'))
+        cls.day = datetime(2025, 1, 6)
+
+    def reading(self, hh, mm, ss, value):
+        return Measurement(sensor=self.sensor, measured_at=self.day.replace(hour=hh, minute=mm, second=ss), value=value)
+
+    def buckets(self, resolution):
+        return {row.bucket_start.time().isoformat(): (row.count, row.sum, row.min, row.max)
+                for row in MeasurementRollup.objects.filter(resolution=resolution)}
+
+    def test_bucket_boundaries(self):
+        Measurement.objects.bulk_create([
+            self.reading(10, 0, 0, 1.0),
+            self.reading(10, 0, 59, 2.0),    # último segundo del minuto 10:00
+            self.reading(10, 1, 0, 3.0),     # abre 10:01
+            self.reading(10, 4, 59, 4.0),    # último segundo de la cubeta 10:00-10:05
+            self.reading(10, 5, 0, 5.0),     # abre la cubeta de 5m de 10:05
+            self.reading(10, 59, 59, 6.0),   # último segundo de la hora 10
+            self.reading(11, 0, 0, 7.0),     # `end` exclusivo: no entra
+        ])
+        written = rollups.compact_range(self.day.replace(hour=10), self.day.replace(hour=11))
+
+        self.assertEqual(self.buckets('1m'), {
+            '10:00:00': (2, 3.0, 1.0, 2.0), '10:01:00': (1, 3.0, 3.0, 3.0), '10:04:00': (1, 4.0, 4.0, 4.0),
+            '10:05:00': (1, 5.0, 5.0, 5.0), '10:59:00': (1, 6.0, 6.0, 6.0),
+        })
+        self.assertEqual(self.buckets('5m'), {
+            '10:00:00': (4, 10.0, 1.0, 4.0), '10:05:00': (1, 5.0, 5.0, 5.0), '10:55:00': (1, 6.0, 6.0, 6.0),
+        })
+        self.assertEqual(self.buckets('1h'), {'10:00:00': (6, 21.0, 1.0, 6.0)})
+        self.assertEqual(written, {'1m': 5, '5m': 3, '1h': 1})
+
+    def test_recompaction_absorbs_late_readings_without_duplicates(self):
+        Measurement.objects.bulk_create([self.reading(10, 0, 10, 1.0), self.reading(10, 0, 20, 2.0)])
+        rollups.compact_range(self.day.replace(hour=10), self.day.replace(hour=11))
+        Measurement.objects.bulk_create([self.reading(10, 0, 5, 9.0)])  # llega tarde, mismo minuto
+        rollups.compact_range(self.day.replace(hour=10), self.day.replace(hour=11))
+
+        row = MeasurementRollup.objects.get(resolution='1m')
+        self.assertEqual((row.count, row.sum, row.max, row.first_value, row.last_value), (3, 12.0, 9.0, 9.0, 2.0))
+        self.assertEqual(MeasurementRollup.objects.filter(resolution='1h').get().count, 3)
+
+    @override_settings(MEASUREMENT_ROLLUP_MAX_LAG_SECONDS=600)
+    def test_resolve_resolution(self):
+        start, end = self.day, self.day + timedelta(days=1)
+        self.assertEqual(rollups.resolve_resolution(None, None, start, end), rollups.RAW)
+        self.assertEqual(rollups.resolve_resolution('5M', None, start, end), '5m')
+        # Sin agregados al día, auto vuelve a las lecturas crudas
+        self.assertEqual(rollups.resolve_resolution('auto', 20, start, end), rollups.RAW)
+
+        MeasurementRollup.objects.create(sensor=self.sensor, resolution='1m', bucket_start=end - timedelta(minutes=5),
+                                         count=1, sum=1.0, min=1.0, min_at=end, max=1.0, max_at=end,
+                                         first_value=1.0, first_at=end, last_value=1.0, last_at=end)
+        # La más gruesa que todavía da `points` cubetas en un día (24 h, 288 de 5m, 1440 de 1m)
+        self.assertEqual(rollups.resolve_resolution(None, 24, start, end), '1h')
+        self.assertEqual(rollups.resolve_resolution('auto', 25, start, end), '5m')
+        self.assertEqual(rollups.resolve_resolution('auto', 1440, start, end), '1m')
+        self.assertEqual(rollups.resolve_resolution('auto', 1441, start, end), rollups.RAW)
+        for resolution, points in (('2m', None), ('auto', 'x'), ('auto', -1)):
+            with self.assertRaises(ValueError):
+                rollups.resolve_resolution(resolution, points, start, end)
+
+
+class ExportPaginationTests(TestCase):
+    """iter_readings pagina por (measured_at, id): los empates no se repiten ni se pierden."""
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Empresa')
+        station = Station.objects.create(name='Norte', company=company)
+        sensor_type = SensorType.objects.create(name='Caudal', unit='bpd')
+        cls.sensors = [Sensor.objects.create(name=f'Q{i}', station=station, sensor_type=sensor_type) for i in range(2)]
+        cls.start = datetime(2025, 1, 1, 12, 0)
+        cls.end = cls.start + timedelta(minutes=10)
+        same = cls.start + timedelta(minutes=1)
+        # Siete lecturas con el mismo instante: cruzan varias páginas de 2
+        times = [cls.start] + [same] * 7 + [cls.start + timedelta(minutes=2), cls.end, cls.end + timedelta(seconds=1)]
+        Measurement.objects.bulk_create([
+            Measurement(sensor=sensor, measured_at=ts, value=float(n * 100 + i))
+            for n, sensor in enumerate(reversed(cls.sensors)) for i, ts in enumerate(times)
+        ])
+
+    def expected(self):
+        return list(Measurement.objects.filter(sensor__in=self.sensors, measured_at__range=[self.start, self.end])
+                    .order_by('sensor_id', 'measured_at', 'id').values_list('sensor_id', 'measured_at', 'value'))
+
+    def test_pages_across_equal_timestamps(self):
+        expected = self.expected()
+        self.assertEqual(len(expected), 20)  # rango inclusivo: sin la lectura posterior a `end`
+        for chunk_size in (1, 2, 3, 7, 8, 100):
+            rows = list(exports.iter_readings([s.id for s in self.sensors], self.start, self.end, chunk_size))
+            self.assertEqual(rows, expected, f"chunk_size={chunk_size}")
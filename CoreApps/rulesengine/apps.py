@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RulesengineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'CoreApps.rulesengine'
+
+    def ready(self):
+        # Registra los receptores del change-feed de configuración
+        from . import signals  # noqa: F401
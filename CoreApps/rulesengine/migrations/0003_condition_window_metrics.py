@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rulesengine', '0002_condition_linked_policy_condition_threshold_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='condition',
+            name='metric_to_evaluate',
+            field=models.CharField(choices=[('VALUE', 'Valor Actual'), ('ROC', 'Ritmo de Cambio (valor/tiempo)'), ('AVG', 'Promedio móvil (ventana)'), ('MIN', 'Mínimo de la ventana'), ('MAX', 'Máximo de la ventana')], default='VALUE', max_length=10, verbose_name='métrica a evaluar'),
+        ),
+        migrations.AlterField(
+            model_name='condition',
+            name='threshold_config',
+            field=models.JSONField(blank=True, default=dict, help_text="Usar solo si el tipo de umbral es 'Estático'. Ej: {'value': 30}; BETWEEN/NOT_BETWEEN: {'min': 10, 'max': 30}; métricas de ventana: {'window_seconds': 60}", verbose_name='configuración de umbral estático'),
+        ),
+    ]
@@ -71,6 +71,9 @@ class Condition(models.Model):
     class MetricChoices(models.TextChoices):
         CURRENT_VALUE = "VALUE", _("Valor Actual")
         RATE_OF_CHANGE = "ROC", _("Ritmo de Cambio (valor/tiempo)")
+        MOVING_AVERAGE = "AVG", _("Promedio móvil (ventana)")
+        WINDOW_MIN = "MIN", _("Mínimo de la ventana")
+        WINDOW_MAX = "MAX", _("Máximo de la ventana")
 
     class OperatorChoices(models.TextChoices):
         GREATER_THAN = ">", _("Mayor que")
@@ -116,7 +119,8 @@ class Condition(models.Model):
         _('configuración de umbral estático'),
         default=dict,
         blank=True, # Lo hacemos opcional
-        help_text=_("Usar solo si el tipo de umbral es 'Estático'. Ej: {'value': 30}")
+        help_text=_("Usar solo si el tipo de umbral es 'Estático'. Ej: {'value': 30}; "
+                    "BETWEEN/NOT_BETWEEN: {'min': 10, 'max': 30}; métricas de ventana: {'window_seconds': 60}")
     )
 
     # --- AÑADIMOS ESTE CAMPO (EL "PUENTE") ---
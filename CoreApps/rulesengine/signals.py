@@ -0,0 +1,109 @@
+# CoreApps/rulesengine/signals.py
+
+"""
+Change-feed de configuración hacia los servicios externos (motor de reglas,
+TopicManager, subscriber).
+
+Cada alta/edición/baja de Sensor, AlertPolicy, Rule, Condition o RuleNode publica,
+después del COMMIT, un mensaje JSON en el canal Redis CONFIG_CHANGES_CHANNEL:
+
+    {"model": "rule", "id": 12, "op": "save", "rule_ids": [12]}
+
+Cuando cambia la política efectiva de uno o más sensores (policy_resolver) se publica
+{"model": "sensoreffectivepolicy", "id": null, "op": "rebuild", "rule_ids": [], "sensor_ids": [...]}.
+
+Los workers aplican solo ese delta en lugar de recargar todas las tablas.
+Si Redis no está configurado (CONFIG_CHANGES_REDIS_HOST) o el paquete redis no está
+instalado, no se publica nada y los servicios siguen con su sincronización periódica.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from CoreApps.sensorhub.models import AlertPolicy, Sensor, SensorEffectivePolicy
+from CoreApps.sensorhub.policy_resolver import effective_policies_changed
+from .models import Condition, Rule, RuleNode
+
+try:
+    import redis
+except ImportError:  # dependencia opcional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def _get_client():
+    global _client
+    host = getattr(settings, 'CONFIG_CHANGES_REDIS_HOST', None)
+    if redis is None or not host:
+        return None
+    if _client is None:
+        _client = redis.Redis(
+            host=host,
+            port=getattr(settings, 'CONFIG_CHANGES_REDIS_PORT', 6379),
+            db=getattr(settings, 'CONFIG_CHANGES_REDIS_DB', 0),
+            socket_timeout=1,
+            socket_connect_timeout=1,
+        )
+    return _client
+
+
+def publish_change(model, pk, op, rule_ids=(), **extra):
+    """Publica el cambio al confirmarse la transacción (los workers leen datos ya visibles)."""
+    client = _get_client()
+    if client is None:
+        return
+    payload = json.dumps({'model': model, 'id': pk, 'op': op, 'rule_ids': sorted(set(rule_ids)), **extra})
+    channel = getattr(settings, 'CONFIG_CHANGES_CHANNEL', 'auralis:config_changes')
+
+    def _send():
+        try:
+            client.publish(channel, payload)
+        except Exception as e:
+            # Nunca romper la edición por Redis: los servicios lo recuperan en su sincronización periódica
+            logger.warning("No se pudo publicar el cambio de configuración %s: %s", payload, e)
+
+    transaction.on_commit(_send)
+
+
+def _rule_ids_for(instance):
+    if isinstance(instance, Rule):
+        return [instance.pk]
+    if isinstance(instance, RuleNode):
+        return [instance.rule_id]
+    if isinstance(instance, Condition):
+        return list(RuleNode.objects.filter(condition_id=instance.pk).values_list('rule_id', flat=True))
+    return []
+
+
+@receiver(post_save, sender=Sensor, dispatch_uid='config_change_sensor_save')
+@receiver(post_save, sender=AlertPolicy, dispatch_uid='config_change_policy_save')
+@receiver(post_save, sender=Rule, dispatch_uid='config_change_rule_save')
+@receiver(post_save, sender=Condition, dispatch_uid='config_change_condition_save')
+@receiver(post_save, sender=RuleNode, dispatch_uid='config_change_rulenode_save')
+def config_saved(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return  # loaddata
+    publish_change(sender._meta.model_name, instance.pk, 'save', _rule_ids_for(instance))
+
+
+@receiver(post_delete, sender=Sensor, dispatch_uid='config_change_sensor_delete')
+@receiver(post_delete, sender=AlertPolicy, dispatch_uid='config_change_policy_delete')
+@receiver(post_delete, sender=Rule, dispatch_uid='config_change_rule_delete')
+@receiver(post_delete, sender=Condition, dispatch_uid='config_change_condition_delete')
+@receiver(post_delete, sender=RuleNode, dispatch_uid='config_change_rulenode_delete')
+def config_deleted(sender, instance, **kwargs):
+    rule_ids = [] if isinstance(instance, Condition) else _rule_ids_for(instance)
+    publish_change(sender._meta.model_name, instance.pk, 'delete', rule_ids)
+
+
+@receiver(effective_policies_changed, sender=SensorEffectivePolicy, dispatch_uid='config_change_effective_policy')
+def effective_policies_rebuilt(sender, sensor_ids, **kwargs):
+    publish_change(sender._meta.model_name, None, 'rebuild', sensor_ids=list(sensor_ids))
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _  # Añadimos esta importación
-from .models import Station, SensorType, Sensor, SensorMaintenanceLog, SensorSystem, DataSource, AlertPolicy
+from .models import Station, SensorType, Sensor, SensorMaintenanceLog, SensorSystem, DataSource, AlertPolicy, SensorEffectivePolicy
 from django.utils.html import format_html
 from django import forms
 
@@ -125,4 +125,18 @@ class AlertPolicyAdmin(admin.ModelAdmin):
 
     def target_display(self, obj):
         return obj.sensor or obj.station or obj.sensor_type or obj.company or "GLOBAL"
-    target_display.short_description = "Objetivo"
\ No newline at end of file
+    target_display.short_description = "Objetivo"
+
+
+@admin.register(SensorEffectivePolicy)
+class SensorEffectivePolicyAdmin(admin.ModelAdmin):
+    """Solo lectura: la calcula policy_resolver (manage.py rebuild_effective_policies)."""
+    list_display = ("sensor", "scope", "policy", "warn_high", "alert_high", "updated_at")
+    list_filter = ("scope",)
+    search_fields = ("sensor__name",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SensorhubConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'CoreApps.sensorhub'
+
+    def ready(self):
+        # Mantenimiento incremental de SensorEffectivePolicy
+        from . import signals  # noqa: F401
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from CoreApps.sensorhub import policy_resolver
+
+
+class Command(BaseCommand):
+    help = "Recalcula la política efectiva (precedencia de AlertPolicy) de todos los sensores o de los indicados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('sensor_ids', nargs='*', type=int, help="IDs de sensor (por defecto, todos).")
+
+    def handle(self, *args, sensor_ids=None, **options):
+        changed = policy_resolver.rebuild(sensor_ids or None)
+        self.stdout.write(self.style.SUCCESS(f"Políticas efectivas actualizadas: {len(changed)} sensores."))
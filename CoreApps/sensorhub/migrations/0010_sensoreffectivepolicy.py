@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-17 21:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensorhub', '0009_sensor_ip_address_sensor_mqtt_topic_sensor_port_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alertpolicy',
+            name='scope',
+            field=models.CharField(choices=[('GLOBAL', 'Global'), ('COMPANY', 'Company'), ('SENSOR_TYPE', 'Sensor Type'), ('STATION', 'Station'), ('SENSOR', 'Sensor')], db_index=True, default='SENSOR', help_text='Ámbito al que aplica esta política. Precedencia: SENSOR > STATION > SENSOR_TYPE > COMPANY > GLOBAL (ver policy_resolver / SensorEffectivePolicy).', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SensorEffectivePolicy',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='effective_policy', serialize=False, to='sensorhub.sensor')),
+                ('scope', models.CharField(choices=[('GLOBAL', 'Global'), ('COMPANY', 'Company'), ('SENSOR_TYPE', 'Sensor Type'), ('STATION', 'Station'), ('SENSOR', 'Sensor')], max_length=20)),
+                ('alert_mode', models.CharField(choices=[('ABS', 'Absoluto'), ('REL', 'Relativo al rango')], help_text='Modo de la política de origen (los valores ya son absolutos).', max_length=3)),
+                ('warn_low', models.FloatField(blank=True, null=True)),
+                ('alert_low', models.FloatField(blank=True, null=True)),
+                ('warn_high', models.FloatField(blank=True, null=True)),
+                ('alert_high', models.FloatField(blank=True, null=True)),
+                ('enable_low_thresholds', models.BooleanField(default=False)),
+                ('hysteresis', models.FloatField(blank=True, null=True)),
+                ('persistence_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('color_warn', models.CharField(blank=True, max_length=9)),
+                ('color_alert', models.CharField(blank=True, max_length=9)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sensorhub.alertpolicy')),
+            ],
+            options={
+                'verbose_name': 'política efectiva de sensor',
+                'verbose_name_plural': 'políticas efectivas de sensores',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sensoreffectivepolicy',
+            index=models.Index(fields=['policy'], name='sensorhub_s_policy__41b015_idx'),
+        ),
+    ]
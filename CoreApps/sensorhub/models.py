@@ -356,7 +356,8 @@ class AlertPolicy(models.Model):
         choices=Scope.choices,
         default=Scope.SENSOR,
         db_index=True,
-        help_text=_("Ámbito al que aplica esta política (la precedencia la decides en tu servicio externo)."),
+        help_text=_("Ámbito al que aplica esta política. Precedencia: SENSOR > STATION > SENSOR_TYPE > COMPANY > GLOBAL "
+                    "(ver policy_resolver / SensorEffectivePolicy)."),
     )
 
     # FKs opcionales: usa las que necesites según tu flujo
@@ -441,6 +442,7 @@ class AlertPolicy(models.Model):
         - Si alert_mode=REL: convierte usando el rango [min_value, max_value].
         - Si no se pasa 'sensor' y scope=SENSOR, usa self.sensor.
         - Si no hay rango, usa [0, 1] para evitar errores.
+        - La histéresis es un margen: en REL se escala por el ancho del rango (sin sumar min_value).
         """
         s = sensor or self.sensor
         smin = float(getattr(s, "min_value", 0.0) or 0.0)
@@ -457,9 +459,61 @@ class AlertPolicy(models.Model):
             "alert_low":  conv(self.alert_low),
             "warn_high":  conv(self.warn_high),
             "alert_high": conv(self.alert_high),
-            "hysteresis": conv(self.hysteresis) if self.hysteresis is not None else None,
+            "hysteresis": (float(self.hysteresis) if self.alert_mode == self.Mode.ABS else float(self.hysteresis) * span)
+                          if self.hysteresis is not None else None,
             "bands_active": self.bands_active,
             "color_warn":  self.color_warn or "#FFC107",
             "color_alert": self.color_alert or "#DC3545",
             "mode": self.alert_mode,
         }
+
+
+# =============================================================================
+# POLÍTICA EFECTIVA POR SENSOR (caché de precedencia)
+# -----------------------------------------------------------------------------
+# Una fila por sensor con la política que le aplica según la precedencia
+# SENSOR > STATION > SENSOR_TYPE > COMPANY > GLOBAL (solo políticas con bands_active)
+# y sus umbrales ya convertidos a ABSOLUTOS con get_absolute_thresholds().
+# La mantiene CoreApps/sensorhub/policy_resolver.py de forma incremental (señales
+# de AlertPolicy, Sensor y Station); el dashboard y el motor de reglas solo la leen.
+# Sensor sin fila = ninguna política aplica.
+# =============================================================================
+class SensorEffectivePolicy(models.Model):
+    sensor = models.OneToOneField(
+        Sensor, on_delete=models.CASCADE, primary_key=True, related_name="effective_policy",
+    )
+    policy = models.ForeignKey(AlertPolicy, on_delete=models.CASCADE, related_name="+")
+    scope = models.CharField(max_length=20, choices=AlertPolicy.Scope.choices)
+    alert_mode = models.CharField(max_length=3, choices=AlertPolicy.Mode.choices,
+                                  help_text=_("Modo de la política de origen (los valores ya son absolutos)."))
+
+    warn_low = models.FloatField(null=True, blank=True)
+    alert_low = models.FloatField(null=True, blank=True)
+    warn_high = models.FloatField(null=True, blank=True)
+    alert_high = models.FloatField(null=True, blank=True)
+    enable_low_thresholds = models.BooleanField(default=False)
+    hysteresis = models.FloatField(null=True, blank=True)
+    persistence_seconds = models.PositiveIntegerField(null=True, blank=True)
+    color_warn = models.CharField(max_length=9, blank=True)
+    color_alert = models.CharField(max_length=9, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("política efectiva de sensor")
+        verbose_name_plural = _("políticas efectivas de sensores")
+        indexes = [models.Index(fields=["policy"])]
+
+    def __str__(self):
+        return f"{self.sensor_id} ← {self.scope} #{self.policy_id}"
+
+    def as_thresholds(self):
+        """Mismo formato que AlertPolicy.get_absolute_thresholds()."""
+        return {
+            "warn_low": self.warn_low, "alert_low": self.alert_low,
+            "warn_high": self.warn_high, "alert_high": self.alert_high,
+            "hysteresis": self.hysteresis,
+            "bands_active": True,
+            "color_warn": self.color_warn, "color_alert": self.color_alert,
+            "mode": self.alert_mode,
+        }
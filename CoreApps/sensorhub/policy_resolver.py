@@ -0,0 +1,145 @@
+# CoreApps/sensorhub/policy_resolver.py
+
+"""
+Resolución de precedencia de AlertPolicy, precalculada por sensor.
+
+Para cada sensor, la política efectiva es la primera que exista (con bands_active) en el orden
+SENSOR > STATION > SENSOR_TYPE > COMPANY > GLOBAL; dentro de un mismo ámbito gana la editada
+más recientemente. El resultado se guarda en SensorEffectivePolicy con los umbrales ya en
+unidades absolutas (AlertPolicy.get_absolute_thresholds), así el dashboard y el motor de
+reglas obtienen los umbrales de un sensor con una sola lectura por clave primaria.
+
+La tabla se mantiene de forma incremental (ver signals.py): solo se recalculan los sensores
+alcanzados por la política, sensor o estación que cambió. `manage.py rebuild_effective_policies`
+la reconstruye completa.
+"""
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import AlertPolicy, Sensor, SensorEffectivePolicy
+
+Scope = AlertPolicy.Scope
+
+SCOPE_PRECEDENCE = (Scope.SENSOR, Scope.STATION, Scope.SENSOR_TYPE, Scope.COMPANY, Scope.GLOBAL)
+
+# Enviada con sensor_ids=[...] tras recalcular (p. ej. el motor de reglas la reenvía a Redis)
+effective_policies_changed = Signal()
+
+_TARGET_FIELD = {
+    Scope.SENSOR: "sensor_id",
+    Scope.STATION: "station_id",
+    Scope.SENSOR_TYPE: "sensor_type_id",
+    Scope.COMPANY: "company_id",
+}
+
+_THRESHOLD_FIELDS = ("warn_low", "alert_low", "warn_high", "alert_high", "hysteresis")
+
+
+def build_policy_index(policies):
+    """{(scope, id del objetivo): política}; GLOBAL usa None como objetivo."""
+    index = {}
+    for policy in sorted(policies, key=lambda p: p.updated_at):
+        field = _TARGET_FIELD.get(policy.scope)
+        target = getattr(policy, field) if field else None
+        if field and target is None:
+            continue  # ámbito sin su FK: no aplica a nadie
+        index[(policy.scope, target)] = policy  # la más reciente sobrescribe
+    return index
+
+
+def resolve_policy(sensor, index):
+    """Política efectiva del sensor (necesita sensor.station cargado) o None."""
+    targets = {
+        Scope.SENSOR: sensor.id,
+        Scope.STATION: sensor.station_id,
+        Scope.SENSOR_TYPE: sensor.sensor_type_id,
+        Scope.COMPANY: sensor.station.company_id,
+        Scope.GLOBAL: None,
+    }
+    for scope in SCOPE_PRECEDENCE:
+        policy = index.get((scope, targets[scope]))
+        if policy is not None:
+            return policy
+    return None
+
+
+def effective_row(sensor, policy):
+    thresholds = policy.get_absolute_thresholds(sensor=sensor)
+    return SensorEffectivePolicy(
+        sensor=sensor,
+        policy=policy,
+        scope=policy.scope,
+        alert_mode=policy.alert_mode,
+        enable_low_thresholds=policy.enable_low_thresholds,
+        persistence_seconds=policy.persistence_seconds,
+        color_warn=thresholds["color_warn"],
+        color_alert=thresholds["color_alert"],
+        **{f: thresholds[f] for f in _THRESHOLD_FIELDS},
+    )
+
+
+def sensors_for_policy(policy):
+    """Queryset de ids de sensores a los que la política podría aplicar según su ámbito."""
+    qs = Sensor.objects.all()
+    if policy.scope == Scope.SENSOR:
+        qs = qs.filter(id=policy.sensor_id)
+    elif policy.scope == Scope.STATION:
+        qs = qs.filter(station_id=policy.station_id)
+    elif policy.scope == Scope.SENSOR_TYPE:
+        qs = qs.filter(sensor_type_id=policy.sensor_type_id)
+    elif policy.scope == Scope.COMPANY:
+        qs = qs.filter(station__company_id=policy.company_id)
+    return qs.values_list("id", flat=True)
+
+
+def rebuild(sensor_ids=None):
+    """
+    Recalcula las filas de los sensores indicados (todos si sensor_ids es None).
+    Devuelve la lista de sensores cuya política efectiva cambió.
+    """
+    sensors = Sensor.objects.select_related("station")
+    if sensor_ids is not None:
+        sensor_ids = set(sensor_ids)
+        if not sensor_ids:
+            return []
+        sensors = sensors.filter(id__in=sensor_ids)
+    index = build_policy_index(AlertPolicy.objects.filter(bands_active=True))
+
+    rows = {}
+    for sensor in sensors:
+        policy = resolve_policy(sensor, index)
+        if policy is not None:
+            rows[sensor.id] = effective_row(sensor, policy)
+
+    existing = SensorEffectivePolicy.objects.all()
+    if sensor_ids is not None:
+        existing = existing.filter(sensor_id__in=sensor_ids)
+    current = {row.sensor_id: row for row in existing}
+
+    fields = ("policy_id", "scope", "alert_mode", "enable_low_thresholds", "persistence_seconds",
+              "color_warn", "color_alert") + _THRESHOLD_FIELDS
+    changed = [sid for sid in current.keys() - rows.keys()]
+    changed += [sid for sid, row in rows.items()
+                if sid not in current or any(getattr(row, f) != getattr(current[sid], f) for f in fields)]
+    if not changed:
+        return []
+
+    with transaction.atomic():
+        SensorEffectivePolicy.objects.filter(sensor_id__in=changed).delete()
+        SensorEffectivePolicy.objects.bulk_create([rows[sid] for sid in changed if sid in rows])
+    effective_policies_changed.send(sender=SensorEffectivePolicy, sensor_ids=sorted(changed))
+    return changed
+
+
+def rebuild_for_policy(policy):
+    """Sensores alcanzados por el ámbito actual de la política y los que la usaban antes."""
+    ids = set(sensors_for_policy(policy))
+    ids.update(SensorEffectivePolicy.objects.filter(policy_id=policy.pk).values_list("sensor_id", flat=True))
+    return rebuild(ids)
+
+
+def get_effective_thresholds(sensor_id):
+    """Umbrales absolutos efectivos de un sensor (formato get_absolute_thresholds) o None."""
+    row = SensorEffectivePolicy.objects.filter(sensor_id=sensor_id).first()
+    return row.as_thresholds() if row else None
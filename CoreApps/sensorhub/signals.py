@@ -0,0 +1,38 @@
+# CoreApps/sensorhub/signals.py
+
+"""Mantiene SensorEffectivePolicy al día: solo se recalculan los sensores afectados."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import policy_resolver
+from .models import AlertPolicy, Sensor, Station
+
+
+@receiver(post_save, sender=AlertPolicy, dispatch_uid='effective_policy_policy_save')
+def policy_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: usar rebuild_effective_policies
+    policy_resolver.rebuild_for_policy(instance)
+
+
+@receiver(post_delete, sender=AlertPolicy, dispatch_uid='effective_policy_policy_delete')
+def policy_deleted(sender, instance, **kwargs):
+    # Sus filas ya se borraron en cascada: se recalculan con la siguiente política en precedencia
+    policy_resolver.rebuild(policy_resolver.sensors_for_policy(instance))
+
+
+@receiver(post_save, sender=Sensor, dispatch_uid='effective_policy_sensor_save')
+def sensor_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Rango (REL), estación o tipo pueden haber cambiado
+    policy_resolver.rebuild([instance.pk])
+
+
+@receiver(post_save, sender=Station, dispatch_uid='effective_policy_station_save')
+def station_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    # La empresa de la estación define las políticas COMPANY de sus sensores
+    policy_resolver.rebuild(instance.sensors.values_list('id', flat=True))
@@ -220,7 +220,10 @@
 
 
   async function fetchHistory(stationId, range){
-    const url = API_HISTORY.replace("{station_id}", String(stationId)) + `?timescale=${encodeURIComponent(range)}`;
+    // Presupuesto de puntos ~ ancho del gráfico: el servidor reduce cada serie (LTTB)
+    const el = document.getElementById("multiscale-chart");
+    const points = Math.max(200, Math.round(((el && el.clientWidth) || 800) * (window.devicePixelRatio || 1)));
+    const url = API_HISTORY.replace("{station_id}", String(stationId)) + `?timescale=${encodeURIComponent(range)}&points=${points}`;
     const res = await fetch(url, { credentials: 'same-origin' });
     if(!res.ok) throw new Error("fetchHistory failed");
     return await res.json(); // { sensorId: [ [iso,value], ... ], ... }